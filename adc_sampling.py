@@ -0,0 +1,107 @@
+"""
+Suréchantillonnage de l'ADS1115
+En mode conversion continue, une rafale d'échantillons est lue à la cadence
+du convertisseur puis réduite (médiane ou moyenne tronquée, vectorisées) avec
+une estimation du bruit : une mesure isolée et bruitée ne décide plus seule
+du démarrage de la pompe
+"""
+
+import numpy as np
+
+from clock import clock
+
+# Cadences de conversion acceptées par l'ADS1115 (échantillons par seconde)
+ADS1115_DATA_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+REDUCERS = ('median', 'trimmed_mean')
+
+# Réglages par défaut, surchargés par la clé "soil_sampling" de data.json
+DEFAULT_SAMPLING = {
+    'mode': 'continuous',      # 'continuous' ou 'single' (une conversion par lecture)
+    'data_rate': 860,
+    'burst_size': 16,
+    'reducer': 'median',
+    'trim': 0.2                # proportion retirée de chaque côté pour 'trimmed_mean'
+}
+# Durée maximale d'une rafale (secondes), pour rester sous le délai de lecture du capteur
+MAX_BURST_SECONDS = 0.3
+
+
+def sampling_settings(config):
+    """Réglages de suréchantillonnage validés depuis la configuration (data.json)"""
+    settings = dict(DEFAULT_SAMPLING)
+    settings.update((config or {}).get('soil_sampling', {}))
+    if settings['mode'] not in ('continuous', 'single'):
+        print(f"Mode d'acquisition inconnu '{settings['mode']}', mode continu utilisé")
+        settings['mode'] = 'continuous'
+    if settings['data_rate'] not in ADS1115_DATA_RATES:
+        # Cadence la plus proche acceptée par le convertisseur
+        settings['data_rate'] = min(ADS1115_DATA_RATES, key=lambda rate: abs(rate - settings['data_rate']))
+    if settings['reducer'] not in REDUCERS:
+        print(f"Réduction inconnue '{settings['reducer']}', médiane utilisée")
+        settings['reducer'] = 'median'
+    settings['trim'] = min(max(float(settings['trim']), 0.0), 0.45)
+    max_burst = max(1, int(MAX_BURST_SECONDS * settings['data_rate']))
+    settings['burst_size'] = min(max(int(settings['burst_size']), 1), max_burst)
+    return settings
+
+
+def reduce_burst(samples, reducer='median', trim=0.2):
+    """Réduit une rafale en une valeur et une estimation du bruit
+
+    Le bruit est l'écart absolu médian mis à l'échelle d'un écart-type
+    (1.4826 x MAD), peu sensible aux valeurs aberrantes.
+
+    Returns:
+        tuple: (valeur, bruit), (None, None) si aucun échantillon valide
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    samples = samples[np.isfinite(samples)]
+    if samples.size == 0:
+        return None, None
+    median = np.median(samples)
+    if reducer == 'trimmed_mean':
+        cut = int(samples.size * trim)
+        ordered = np.sort(samples)
+        value = ordered[cut:samples.size - cut].mean() if samples.size > 2 * cut else median
+    else:
+        value = median
+    noise = 1.4826 * np.median(np.abs(samples - median))
+    return float(value), float(noise)
+
+
+class BurstSampler:
+    """Lecture en rafale d'une entrée de l'ADS1115"""
+
+    def __init__(self, ads, channel, settings=None):
+        self.ads = ads
+        self.channel = channel
+        self.settings = settings or sampling_settings({})
+
+    def configure(self, modes):
+        """Applique le mode de conversion et la cadence au convertisseur
+
+        Args:
+            modes: valeurs de mode du pilote, {'continuous': ..., 'single': ...}
+        """
+        try:
+            self.ads.mode = modes['continuous'] if self.settings['mode'] == 'continuous' else modes['single']
+            self.ads.data_rate = self.settings['data_rate']
+            print(f"ADS1115 : mode {self.settings['mode']}, {self.settings['data_rate']} éch./s, "
+                  f"rafales de {self.settings['burst_size']} ({self.settings['reducer']})")
+        except Exception as e:
+            print(f"Erreur lors de la configuration de l'ADS1115 : {e}")
+
+    def read_burst(self):
+        """Lit une rafale de tensions, espacées d'une période de conversion"""
+        period = 1.0 / self.settings['data_rate']
+        samples = np.empty(self.settings['burst_size'])
+        for i in range(samples.size):
+            samples[i] = self.channel.voltage
+            if self.settings['mode'] == 'continuous' and i + 1 < samples.size:
+                # En continu, le registre n'est rafraîchi qu'à chaque conversion
+                clock.sleep(period)
+        return samples
+
+    def read(self):
+        """Retourne (tension, bruit en volts) réduits sur une rafale"""
+        return reduce_burst(self.read_burst(), self.settings['reducer'], self.settings['trim'])
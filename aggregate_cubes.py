@@ -0,0 +1,199 @@
+"""
+Cubes d'agrégats matérialisés par heure de la semaine et par jour de l'année
+Pour chaque source (hub, nœud) et métrique : nombre, somme, somme des carrés,
+min et max par case, mis à jour à chaque enregistrement et sauvegardés. Les
+cartes de chaleur sur plusieurs années se lisent directement, sans export
+"""
+import os
+import json
+import datetime
+import threading
+
+import numpy as np
+
+from clock import clock
+
+# Dimensions des cubes : 7 jours x 24 heures (lundi 0h = case 0), 366 jours
+CUBE_BINS = {
+    'hour_of_week': 7 * 24,
+    'day_of_year': 366,
+}
+# Vitesse de variation de l'humidité du sol (points de % par heure), calculée
+# entre deux mesures consécutives séparées d'au plus RATE_MAX_GAP secondes
+RATE_METRICS = {'soil_moisture': 'soil_moisture_rate'}
+RATE_MAX_GAP = 2 * 3600
+
+
+def cube_bin(kind, timestamp):
+    """Case d'un timestamp (datetime local) dans un cube"""
+    if kind == 'hour_of_week':
+        return timestamp.weekday() * 24 + timestamp.hour
+    return timestamp.timetuple().tm_yday - 1
+
+
+class AggregateCube:
+    """Nombre, somme, somme des carrés, min et max pour chaque case"""
+
+    def __init__(self, n_bins):
+        self.count = np.zeros(n_bins, dtype=np.int64)
+        self.sum = np.zeros(n_bins)
+        self.sumsq = np.zeros(n_bins)
+        self.min = np.full(n_bins, np.inf)
+        self.max = np.full(n_bins, -np.inf)
+
+    def add(self, index, value):
+        self.count[index] += 1
+        self.sum[index] += value
+        self.sumsq[index] += value * value
+        if value < self.min[index]:
+            self.min[index] = value
+        if value > self.max[index]:
+            self.max[index] = value
+
+    def summary(self):
+        """Moyenne, écart-type, min et max par case (None pour une case vide)"""
+        empty = self.count == 0
+        count = np.where(empty, 1, self.count)
+        mean = self.sum / count
+        std = np.sqrt(np.maximum(self.sumsq / count - mean * mean, 0.0))
+
+        def to_list(values):
+            return [None if is_empty else round(value, 2) for value, is_empty in zip(values.tolist(), empty.tolist())]
+
+        return {
+            'count': self.count.tolist(),
+            'mean': to_list(mean),
+            'std': to_list(std),
+            'min': to_list(self.min),
+            'max': to_list(self.max)
+        }
+
+    def to_dict(self):
+        return {
+            'count': self.count.tolist(),
+            'sum': self.sum.tolist(),
+            'sumsq': self.sumsq.tolist(),
+            'min': [None if np.isinf(v) else v for v in self.min.tolist()],
+            'max': [None if np.isinf(v) else v for v in self.max.tolist()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        cube = cls(len(data['count']))
+        cube.count[:] = data['count']
+        cube.sum[:] = data['sum']
+        cube.sumsq[:] = data['sumsq']
+        cube.min[:] = [np.inf if v is None else v for v in data['min']]
+        cube.max[:] = [-np.inf if v is None else v for v in data['max']]
+        return cube
+
+
+class CubeStore:
+    """Cubes par (source, métrique) pour chaque découpage de CUBE_BINS"""
+
+    def __init__(self):
+        self._cubes = {}  # (source, metric) -> {découpage: AggregateCube}
+        self._last_samples = {}  # (source, metric) -> (datetime, valeur), pour les vitesses
+        self._recorded_until = {}  # (source, metric) -> timestamp epoch du dernier échantillon
+        self._lock = threading.Lock()
+
+    def record(self, source, metric, value, timestamp=None):
+        """Ajoute un échantillon (les valeurs manquantes sont ignorées)
+
+        Args:
+            timestamp: datetime ou secondes epoch, maintenant par défaut
+        """
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if value != value:  # NaN
+            return
+        if timestamp is None:
+            timestamp = clock.now()
+        elif not isinstance(timestamp, datetime.datetime):
+            timestamp = datetime.datetime.fromtimestamp(timestamp)
+
+        with self._lock:
+            key, recorded_at = (source, metric), timestamp.timestamp()
+            self._recorded_until[key] = max(self._recorded_until.get(key, recorded_at), recorded_at)
+            self._add(source, metric, value, timestamp)
+            rate_metric = RATE_METRICS.get(metric)
+            if rate_metric:
+                previous = self._last_samples.get((source, metric))
+                self._last_samples[(source, metric)] = (timestamp, value)
+                if previous is not None:
+                    gap = (timestamp - previous[0]).total_seconds()
+                    if 0 < gap <= RATE_MAX_GAP:
+                        self._add(source, rate_metric, (value - previous[1]) * 3600 / gap, timestamp)
+
+    def _add(self, source, metric, value, timestamp):
+        cubes = self._cubes.get((source, metric))
+        if cubes is None:
+            cubes = self._cubes[(source, metric)] = {kind: AggregateCube(n) for kind, n in CUBE_BINS.items()}
+        for kind, cube in cubes.items():
+            cube.add(cube_bin(kind, timestamp), value)
+
+    def query(self, source, metric, kind):
+        """Résumé par case d'un cube, None si la source ou la métrique est inconnue"""
+        with self._lock:
+            cubes = self._cubes.get((source, metric))
+            return cubes[kind].summary() if cubes is not None else None
+
+    def keys(self):
+        """Couples (source, métrique) disponibles"""
+        with self._lock:
+            return sorted(self._cubes)
+
+    def save(self, filename):
+        """Sauvegarde les cubes dans un fichier JSON (écriture atomique)"""
+        with self._lock:
+            data = [
+                {'source': source, 'metric': metric,
+                 'cubes': {kind: cube.to_dict() for kind, cube in cubes.items()},
+                 'recorded_until': self._recorded_until.get((source, metric))}
+                for (source, metric), cubes in self._cubes.items()
+            ]
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            # dumps (encodeur C) plutôt que dump, qui encode morceau par morceau en Python
+            f.write(json.dumps(data))
+        os.replace(temp_filename, filename)
+
+    def load(self, filename):
+        """Recharge les cubes sauvegardés
+
+        Returns:
+            bool: True si le fichier existait et a été chargé
+        """
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._cubes.clear()
+            self._last_samples.clear()
+            self._recorded_until.clear()
+            saved_at = None
+            for entry in data:
+                key = (entry['source'], entry['metric'])
+                self._cubes[key] = {
+                    kind: AggregateCube.from_dict(cube) for kind, cube in entry['cubes'].items()
+                }
+                if 'recorded_until' not in entry:
+                    # Sauvegarde d'une version précédente : heure d'écriture du fichier
+                    saved_at = saved_at or os.path.getmtime(filename)
+                    self._recorded_until[key] = saved_at
+                elif entry['recorded_until'] is not None:
+                    self._recorded_until[key] = entry['recorded_until']
+        return True
+
+    def recorded_until(self, source, metric):
+        """Timestamp epoch du dernier échantillon enregistré (None si aucun)"""
+        with self._lock:
+            return self._recorded_until.get((source, metric))
+
+
+# Instance partagée par l'application et l'API des nœuds
+sensor_cubes = CubeStore()
@@ -1,50 +1,60 @@
-from flask import Flask, render_template, jsonify, request
-import adafruit_dht
-import board
-import RPi.GPIO as GPIO
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 import threading
-import time
 import datetime
 import os
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
 import json
+import numpy as np
 from nodes_api import (
     register_node, get_node, get_all_nodes, 
-    record_node_data, get_node_history
+    record_node_data, get_node_history, NODES_DATA_DIR
+)
+from data_arrays import build_npz_export, list_node_ids, node_log_file
+from log_reader import read_lines_reverse, read_recent_rows
+from event_stream import EventPublisher
+from rolling_stats import sensor_windows
+from quantile_sketch import sensor_sketches
+from aggregate_cubes import sensor_cubes, CUBE_BINS
+from ring_buffer import sensor_rings, format_timestamps, column_to_list, HOT_WINDOW_HOURS
+from sensor_store import SENSOR_SERIES, record_row, save_aggregates, warm_from_logs
+from watering_stats import WateringCounters
+from query_cache import query_cache, cached_query, bump_generation
+from query_pool import query_pool, check_deadline, QueryError, QueryPoolBusy
+from adc_sampling import sampling_settings
+from soil_probes import SoilProbeScanner, probe_settings, probe_metric, DEFAULT_ADDRESS, PRIMARY_ZONE
+from sensor_service import SensorService, SensorSnapshot, DHT_INTERVAL, DHT_TIMEOUT, SOIL_INTERVAL, SOIL_TIMEOUT, FLOW_INTERVAL, FLOW_TIMEOUT
+from flow_meter import FlowMeter, flow_meter_settings
+from control_scheduler import DeadlineScheduler
+from watering_schedule import ScheduleIndex
+from scenario_rules import scenario_rules
+from pump_controller import PumpController, PumpCommandResult, PumpState
+from zone_scheduler import zone_scheduler
+from hardware import create_hardware, PUMP_PIN
+from clock import clock
+from control_process import (
+    ControlServer, ControlClient, ControlError, control_process_settings, raise_priority,
+    start_control_process, watch_parent
 )
 
 app = Flask(__name__)
 
-# Configuration des GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(18, GPIO.OUT)  # Pompe
-
-# Configuration I2C pour ADS1115
-i2c = busio.I2C(board.SCL, board.SDA)
-
-# Configuration ADS1115
-ads = ADS.ADS1115(i2c)
-chan = AnalogIn(ads, ADS.P0)
-
-# Configuration du GPIO pour DHT11
-dht_device = adafruit_dht.DHT11(board.D4)  # Utiliser le bon pin, D4 pour GPIO4
+# Diffusion temps réel (SSE) partagée par tous les onglets ouverts
+event_publisher = EventPublisher()
 
 # Fichier pour enregistrer l'historique des arrosages et des lectures
 log_file = "arrosage_log.csv"
 temp_humidity_log_file = "temp_humidity_log.csv"
 soil_moisture_log_file = "soil_moisture_log.csv"
 data_file = "data.json"
+watering_stats_file = "watering_stats.json"
 
-# Variables globales pour le contrôle de la pompe
-pump_on_time = None
-watering_duration_minutes = None
-last_watering_time = None  # Dernier arrosage pour protection anti-excès
+# Variables globales (l'état de la pompe est celui du contrôleur de pompe)
 maintenance_mode = False  # Mode maintenance
 vacation_mode = False  # Mode vacances
 scheduled_waterings = []  # Planification d'arrosage
 
+# Compteurs d'arrosage persistants (statistiques sans relire le log)
+watering_counters = WateringCounters(watering_stats_file, log_file)
+
 # Cache de configuration pour optimiser les performances
 _config_cache = None
 _config_cache_time = None
@@ -65,6 +75,95 @@ def save_config():
 
 load_config()
 
+def load_hardware_config():
+    """Réglages matériels de data.json (sondes, suréchantillonnage), lus au démarrage"""
+    try:
+        with open(data_file, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+_hardware_config = load_hardware_config()
+
+# Matériel : pilotes du Raspberry Pi ou simulateurs (HOMEGARDEN_HARDWARE ou
+# clé "hardware" de data.json), DHT11 et bus I2C initialisés ici
+hal = create_hardware(_hardware_config)
+hal.setup_output(PUMP_PIN)  # Pompe
+
+# Configuration ADS1115
+ads = hal.make_ads(DEFAULT_ADDRESS)
+chan = hal.make_channel(ads, 0)
+
+# Sondes d'humidité du sol : P0 à l'adresse par défaut (zone 'hub') et, si
+# configurées, les autres entrées et d'autres ADS1115 (une zone par sonde)
+soil_probes = probe_settings(_hardware_config)
+soil_scanner = SoilProbeScanner(
+    soil_probes,
+    sampling_settings(_hardware_config),
+    make_ads=hal.make_ads,
+    make_channel=hal.make_channel,
+    existing={(DEFAULT_ADDRESS, 0): (ads, chan)}
+)
+# Lecture en rafale de la sonde principale (appliquée à l'ADS1115 au démarrage)
+soil_sampler = soil_scanner.samplers[(DEFAULT_ADDRESS, 0)]
+
+def setup_flow_meter(config):
+    """Débitmètre à impulsions facultatif (clé "flow_meter" de data.json)"""
+    settings = flow_meter_settings(config)
+    if settings is None:
+        return None
+    return FlowMeter(settings)
+
+flow_meter = setup_flow_meter(_hardware_config)
+
+def start_flow_meter():
+    """Comptage des impulsions par interruption sur front descendant (sans
+    anti-rebond : aucun front perdu), dans le processus qui possède le matériel"""
+    global flow_meter
+    if flow_meter is None:
+        return
+    pin = flow_meter.settings['pin']
+    try:
+        hal.watch_falling_edges(pin, flow_meter.on_pulse)
+    except Exception as e:
+        print(f"Débitmètre indisponible sur le GPIO {pin}, volumes estimés : {e}")
+        flow_meter = None
+        sensor_service.readers.pop('flow', None)
+        return
+    print(f"Débitmètre sur le GPIO {pin} ({flow_meter.settings['pulses_per_liter']:g} impulsions/L)")
+
+def voltage_to_moisture(voltage):
+    """Convertit une tension du capteur en pourcentage d'humidité du sol (0-100)"""
+    # Gérer les tensions négatives (problème de connexion ou capteur)
+    if voltage < 0:
+        voltage = 0
+    # Calcul du pourcentage d'humidité
+    # Pour ce capteur : tension BASSE = sol HUMIDE, tension HAUTE = sol SEC
+    # Formule : inverser car plus la tension est basse, plus le sol est humide
+    moisture_percentage = (1 - (voltage / 3.3)) * 100
+    # S'assurer que le résultat est entre 0 et 100
+    return max(0, min(100, moisture_percentage))
+
+def moisture_reading(voltage, noise):
+    """(tension, bruit en volts) -> (pourcentage d'humidité, bruit en points de %)"""
+    return round(voltage_to_moisture(voltage), 2), round(noise / 3.3 * 100, 2)
+
+def read_soil_moisture():
+    """Lit l'humidité du sol depuis l'ADS1115 (rafale réduite)
+    
+    Returns:
+        tuple: (pourcentage d'humidité du sol, bruit estimé en points de %)
+        (None, None): En cas d'erreur de lecture
+    """
+    try:
+        voltage, noise = soil_sampler.read()
+        if voltage is None:
+            return None, None
+        return moisture_reading(voltage, noise)
+    except Exception as e:
+        print(f"Erreur lors de la lecture de l'humidité du sol : {e}")
+        return None, None
+
 def get_soil_moisture():
     """Lit l'humidité du sol depuis l'ADS1115
     
@@ -72,26 +171,123 @@ def get_soil_moisture():
         float: Pourcentage d'humidité du sol (0-100)
         None: En cas d'erreur de lecture
     """
-    try:
-        voltage = chan.voltage
-        # Gérer les tensions négatives (problème de connexion ou capteur)
-        if voltage < 0:
-            voltage = 0
-        # Calcul du pourcentage d'humidité
-        # Pour ce capteur : tension BASSE = sol HUMIDE, tension HAUTE = sol SEC
-        # Formule : inverser car plus la tension est basse, plus le sol est humide
-        moisture_percentage = (1 - (voltage / 3.3)) * 100
-        # S'assurer que le résultat est entre 0 et 100
-        moisture_percentage = max(0, min(100, moisture_percentage))
-        return round(moisture_percentage, 2)
-    except Exception as e:
-        print(f"Erreur lors de la lecture de l'humidité du sol : {e}")
-        return None
+    return read_soil_moisture()[0]
+
+def read_dht11():
+    """Lecture brute du DHT11 (uniquement depuis le service d'acquisition)"""
+    return hal.read_dht()
+
+def read_soil_sensor():
+    """Lecture en tourniquet de toutes les sondes (uniquement depuis le service d'acquisition)"""
+    return soil_scanner.scan(moisture_reading)
+
+# Seul propriétaire des capteurs du hub : les autres lisent ses instantanés.
+# Une seule lecture des sondes à la fois sur le bus I2C, délai proportionnel au nombre de sondes
+sensor_readers = {
+    'dht': (read_dht11, DHT_INTERVAL, DHT_TIMEOUT),
+    'soil': (read_soil_sensor, SOIL_INTERVAL, SOIL_TIMEOUT * max(1, len(soil_scanner.probes)))
+}
+if flow_meter:
+    sensor_readers['flow'] = (flow_meter.read, FLOW_INTERVAL, FLOW_TIMEOUT)
+sensor_service = SensorService(
+    sensor_readers,
+    metrics=('temperature', 'air_humidity') + tuple(probe_metric(zone) for zone in soil_scanner.zones())
+)
+
+# État des zones supplémentaires (sondes autres que P0) : dernière mesure et décision du scénario
+zone_states = {}
+
+# Période de la boucle de contrôle (secondes), tenue quelle que soit la durée des lectures
+CONTROL_INTERVAL = 5
+# Lignes gardées par la rotation des logs des capteurs (une ligne par tour) : au
+# moins HOT_WINDOW_HOURS heures, reconstruites en mémoire au démarrage
+SENSOR_LOG_MAX_LINES = HOT_WINDOW_HOURS * 3600 // CONTROL_INTERVAL
+SENSOR_STATUS_LABELS = {'stale': 'périmée', 'missing': 'indisponible'}
+
+# Ordonnanceur de la boucle de contrôle : tours périodiques et arrosages
+# programmés à l'heure exacte
+control_scheduler = DeadlineScheduler()
+_last_recorded = {}  # métrique -> heure de la dernière lecture enregistrée
+_air_mismatch_noted = set()  # scénarios retenus sur le sol seul (note déjà affichée)
+# Index des prochains arrosages programmés (recompilé à chaque changement de configuration)
+watering_schedule = ScheduleIndex()
+# Intervalle minimal entre un arrosage programmé et le précédent (minutes)
+SCHEDULED_MIN_INTERVAL = 5
+
+def switch_pump(on):
+    """Sortie de la pompe (niveau bas = pompe allumée), pilotée par le seul contrôleur"""
+    hal.write_pin(PUMP_PIN, not on)
+    if on and flow_meter:
+        flow_meter.begin_event()
+
+def on_pump_stopped(start_time, duration_seconds, reason):
+    zone_scheduler.release(PRIMARY_ZONE)
+    volume = flow_meter.end_event() if flow_meter else None
+    if volume is not None:
+        print(f"Volume d'eau mesuré : {volume} L")
+    record_arrosage(start_time, duration_seconds, volume)
+
+def check_flow(pump_state, snapshot):
+    """Détection de fuite sur le débit mesuré (remplace l'heuristique de durée)"""
+    flow_rate = snapshot.get('flow_rate')
+    if flow_rate is None:
+        return
+    settings = flow_meter.settings
+    if not pump_state.on:
+        if flow_meter.leak_suspected(flow_rate, pump_state):
+            print(f"⚠️ ALERTE FUITE : débit de {flow_rate:.2f} L/min pompe arrêtée")
+        return
+    if flow_rate > settings['max_flow']:
+        print(f"⚠️ ALERTE FUITE : débit de {flow_rate:.2f} L/min (max prévu: {settings['max_flow']} L/min)")
+        pump.stop("arrêt d'urgence : débit excessif")
+    elif flow_rate < settings['leak_flow'] and pump_state.elapsed_minutes() * 60 > settings['no_flow_seconds']:
+        print("⚠️ ALERTE : aucun débit depuis le démarrage de la pompe (désamorçage ou tuyau bouché)")
+        pump.stop("arrêt d'urgence : débit nul")
+
+# Contrôleur de la pompe : seul propriétaire du GPIO 18, commandes traitées dans
+# l'ordre et arrêt à l'échéance exacte de la durée prévue
+pump = PumpController(switch_pump, on_stopped=on_pump_stopped,
+                      on_change=lambda state: emit_control_event('pump', state.to_message()))
+
+def start_hub_watering(duration_minutes, source, min_interval_minutes=None):
+    """Démarre la pompe du hub dans un créneau du planificateur de zones
+
+    Tant que les plafonds (pompes simultanées, débit total) sont atteints par
+    les nœuds, la demande reste en file et la pompe n'est pas démarrée.
+    """
+    slot = zone_scheduler.request(PRIMARY_ZONE, duration_minutes)
+    if not slot.granted:
+        if slot.started:
+            return PumpCommandResult(False, "La pompe est déjà allumée")
+        return PumpCommandResult(False, f"Arrosage en attente d'un créneau ({slot.start.strftime('%H:%M:%S')})")
+    result = pump.start(duration_minutes, source, min_interval_minutes=min_interval_minutes)
+    if not result.accepted:
+        zone_scheduler.release(PRIMARY_ZONE)
+    return result
+
+def load_config_cached():
+    """Configuration (data.json), relue au plus toutes les _config_cache_ttl secondes
+
+    Lève une exception si data.json manque ou est illisible (load_config() ne
+    fait qu'afficher la configuration au démarrage).
+    """
+    global _config_cache, _config_cache_time
+    now = clock.now()
+    if _config_cache is None or _config_cache_time is None or \
+       (now - _config_cache_time).total_seconds() > _config_cache_ttl:
+        with open(data_file, 'r') as file:
+            _config_cache = json.load(file)
+        _config_cache_time = now
+    return _config_cache
 
 def check_scheduled_watering():
-    """Vérifie si un arrosage programmé doit être déclenché"""
-    global scheduled_waterings, last_watering_time
-    global _config_cache
+    """Déclenche les arrosages programmés arrivés à échéance
+
+    Seul le sommet de l'index des prochains déclenchements est consulté ; l'index
+    est recompilé quand la configuration change. Un créneau qui ne peut pas
+    démarrer (pompe déjà allumée, arrosage trop récent) est représenté plus tard.
+    """
+    global scheduled_waterings
     
     # Utiliser le cache si disponible
     if _config_cache:
@@ -104,287 +300,216 @@ def check_scheduled_watering():
         except:
             scheduled_waterings = []
     
-    if not scheduled_waterings:
-        return False
-    
-    now = datetime.datetime.now()
-    current_time = now.strftime("%H:%M")
-    current_day = now.strftime("%A").lower()  # jour de la semaine en anglais
-    
-    for schedule in scheduled_waterings:
-        if not schedule.get('enabled', True):
+    now = clock.now()
+    watering_schedule.update(scheduled_waterings, now)
+    started = False
+    for firing in watering_schedule.due(now):
+        schedule_duration = firing.schedule.get('duration', 1)  # minutes
+        slot = firing.fire_time.strftime("%H:%M")
+        if firing.skipped:
+            print(f"Arrosage programmé : {firing.skipped} créneau(x) dépassé(s) regroupé(s) avec celui de {slot}")
+        if firing.missed:
+            print(f"⚠️ Arrosage programmé de {slot} manqué (retard de {firing.lateness / 60:.0f} min)")
             continue
         
-        schedule_time = schedule.get('time', '')
-        schedule_days = schedule.get('days', [])
-        schedule_duration = schedule.get('duration', 1)  # minutes
-        
-        # Vérifier si c'est le bon jour
-        if current_day not in schedule_days:
+        # Refusé si la pompe est déjà allumée ou si le dernier arrosage est trop récent
+        result = start_hub_watering(schedule_duration, f"programmé {slot}", min_interval_minutes=SCHEDULED_MIN_INTERVAL)
+        if not result.accepted:
+            if watering_schedule.retry(firing, now):
+                print(f"Arrosage programmé de {slot} reporté ({result.message})")
+            else:
+                print(f"⚠️ Arrosage programmé de {slot} manqué ({result.message})")
             continue
         
-        # Vérifier si c'est l'heure (avec une marge de 1 minute)
-        schedule_hour, schedule_min = map(int, schedule_time.split(':'))
-        current_hour, current_min = map(int, current_time.split(':'))
-        
-        time_diff = abs((current_hour * 60 + current_min) - (schedule_hour * 60 + schedule_min))
-        
-        if time_diff <= 1:  # Dans la fenêtre de 1 minute
-            # Vérifier qu'on n'a pas déjà arrosé récemment (protection)
-            if last_watering_time:
-                minutes_since_last = (now - last_watering_time).total_seconds() / 60
-                if minutes_since_last < 5:  # Au moins 5 minutes entre arrosages
-                    continue
-            
-            # Déclencher l'arrosage programmé
-            is_pump_on = GPIO.input(18) == 0
-            if not is_pump_on:
-                GPIO.output(18, GPIO.LOW)
-                global pump_on_time, watering_duration_minutes
-                pump_on_time = datetime.datetime.now()
-                watering_duration_minutes = schedule_duration
-                last_watering_time = pump_on_time
-                print(f"Arrosage programmé déclenché à {current_time} pour {schedule_duration} minutes")
-                return True
+        late = f" (rattrapage, {firing.lateness:.0f} s de retard)" if firing.lateness >= 60 else ""
+        print(f"Arrosage programmé de {slot} déclenché pour {schedule_duration} minutes{late}")
+        started = True
     
-    return False
+    arm_scheduled_watering(now)
+    return started
+
+def arm_scheduled_watering(now):
+    """Programme le prochain créneau à l'heure exacte sur l'ordonnanceur de contrôle"""
+    next_fire = watering_schedule.next_fire()
+    if next_fire is None:
+        control_scheduler.cancel('scheduled_watering')
+        return
+    delay = max(0.0, (next_fire - now).total_seconds())
+    control_scheduler.schedule_in(delay, run_scheduled_watering, name='scheduled_watering')
 
-def monitor_humidity():
-    global pump_on_time, watering_duration_minutes, last_watering_time, maintenance_mode, vacation_mode
-    global _config_cache, _config_cache_time
-    pump_on_time = None  # Réinitialiser pump_on_time
-    watering_duration_minutes = None  # Durée d'arrosage prévue en minutes
+def run_scheduled_watering():
+    check_scheduled_watering()
 
-    while True:
+def monitor_humidity():
+    """Boucle de contrôle : tours périodiques et arrosages programmés, exécutés
+    par l'ordonnanceur à échéances dans ce thread"""
+    control_scheduler.schedule_every(CONTROL_INTERVAL, control_tick, name='control')
+    control_scheduler.run()
+
+def control_tick():
+    """Un tour de la boucle de contrôle (toutes les CONTROL_INTERVAL secondes)"""
+    global maintenance_mode, vacation_mode
+    try:
+        # Charger les paramètres depuis le cache
         try:
-            # Charger les paramètres depuis le cache
-            global _config_cache
-            if _config_cache:
-                config = _config_cache
-            else:
-                try:
-                    with open(data_file, 'r') as file:
-                        config = json.load(file)
-                except:
-                    time.sleep(5)
-                    continue
-            
-            maintenance_mode = config.get('maintenance_mode', False)
-            vacation_mode = config.get('vacation_mode', False)
-            
-            # Si mode maintenance, ne rien faire
-            if maintenance_mode:
-                time.sleep(30)  # Attendre plus longtemps en mode maintenance
-                continue
-            
-            soil_moisture = get_soil_moisture()
-            
-            # Lire température et humidité avec gestion des erreurs
-            try:
-                air_temperature = dht_device.temperature
-                air_humidity = dht_device.humidity
-            except RuntimeError:
-                air_temperature = None
-                air_humidity = None
-                print("Erreur lors de la lecture du DHT11")
+            config = load_config_cached()
+        except Exception as e:
+            print(f"Erreur lors du chargement de la configuration: {e}")
+            return
+        
+        maintenance_mode = config.get('maintenance_mode', False)
+        vacation_mode = config.get('vacation_mode', False)
+        zone_scheduler.configure(config.get('zone_scheduler'))
+        
+        # Si mode maintenance, ne rien faire
+        if maintenance_mode:
+            return
+        
+        # Dernier instantané du service d'acquisition (valeurs trop anciennes -> None) :
+        # la décision ne dépend jamais de la durée d'une lecture
+        snapshot = sensor_service.latest()
+        soil_moisture = snapshot.get('soil_moisture')
+        air_temperature = snapshot.get('temperature')
+        air_humidity = snapshot.get('air_humidity')
+        soil_status = snapshot.status('soil_moisture')
+        air_status = snapshot.status('temperature')
+        
+        print(f"Humidité du sol : {soil_moisture}%, Température de l'air : {air_temperature}°C, Humidité de l'air : {air_humidity}%")
+        emit_control_event('hub', read_hub_sensors(snapshot))
+        
+        # N'enregistrer que les lectures nouvelles depuis le tour précédent
+        soil_read_at = snapshot.timestamp('soil_moisture')
+        if soil_moisture is not None and soil_read_at != _last_recorded.get('soil_moisture'):
+            record_soil_moisture(soil_moisture, soil_read_at)
+            _last_recorded['soil_moisture'] = soil_read_at
+
+        # Détection de fuite : sur le débit mesuré si un débitmètre est présent, sinon
+        # quand la pompe tourne bien au-delà de la durée prévue (l'arrêt à la durée
+        # prévue est assuré par le contrôleur de pompe)
+        pump_state = pump.state
+        elapsed_minutes = pump_state.elapsed_minutes()
+        if flow_meter:
+            check_flow(pump_state, snapshot)
+        elif elapsed_minutes is not None and pump_state.duration_minutes is not None:
+            max_duration = pump_state.duration_minutes * 1.5  # 50% de marge pour détecter les fuites
+            if elapsed_minutes > max_duration:
+                print(f"⚠️ ALERTE FUITE : La pompe tourne depuis {elapsed_minutes:.1f} minutes (max prévu: {max_duration:.1f} min)")
+                pump.stop("arrêt d'urgence")
+
+        # Vérifier les arrosages programmés
+        check_scheduled_watering()
+
+        plant = config['current_scenario']
+        scenarios = config['scenarios'][plant]
+        
+        # Valeurs absentes ou périmées : traitées explicitement
+        if soil_status != 'ok':
+            # Pas de décision d'arrosage sans humidité du sol actuelle ;
+            # l'arrêt de la pompe à la durée prévue reste assuré plus haut
+            print(f"Humidité du sol {SENSOR_STATUS_LABELS[soil_status]} : évaluation des scénarios suspendue")
+            scenarios = []
+        if air_status != 'ok':
+            print(f"Température/humidité de l'air {SENSOR_STATUS_LABELS[air_status]} : conditions d'air ignorées")
+
+        matched_scenario = match_scenario(plant, scenarios, soil_moisture, air_temperature, air_humidity)
+
+        # Appliquer l'action du scénario correspondant
+        watering_requested = False
+        if matched_scenario:
+            action = matched_scenario["Action"]
+            duration_minutes = matched_scenario["Watering duration (minutes)"]
             
-            print(f"Humidité du sol : {soil_moisture}%, Température de l'air : {air_temperature}°C, Humidité de l'air : {air_humidity}%")
+            # Mode vacances : réduire la durée d'arrosage de 50%
+            if vacation_mode and duration_minutes > 0:
+                duration_minutes = duration_minutes * 0.5
+                print(f"Mode vacances actif - Durée réduite à {duration_minutes} minutes")
             
-            if soil_moisture is not None:
-                record_soil_moisture(soil_moisture)
-
-            # Vérifier si la pompe doit être arrêtée après la durée prévue
-            if pump_on_time is not None and watering_duration_minutes is not None:
-                elapsed_minutes = (datetime.datetime.now() - pump_on_time).total_seconds() / 60
-                max_duration = watering_duration_minutes * 1.5  # 50% de marge pour détecter les fuites
-                
-                # Détection de fuite : si la pompe tourne trop longtemps
-                if elapsed_minutes > max_duration:
-                    print(f"⚠️ ALERTE FUITE : La pompe tourne depuis {elapsed_minutes:.1f} minutes (max prévu: {max_duration:.1f} min)")
-                    GPIO.output(18, GPIO.HIGH)  # Arrêt d'urgence
-                    pump_off_time = datetime.datetime.now()
-                    duration_seconds = (pump_off_time - pump_on_time).total_seconds()
-                    print(f"Pompe arrêtée d'urgence à {pump_off_time}")
-                    record_arrosage(pump_on_time, duration_seconds)
-                    last_watering_time = pump_off_time
-                    pump_on_time = None
-                    watering_duration_minutes = None
-                elif elapsed_minutes >= watering_duration_minutes:
-                    # Arrêter la pompe après la durée prévue
-                    GPIO.output(18, GPIO.HIGH)
-                    pump_off_time = datetime.datetime.now()
-                    duration_seconds = (pump_off_time - pump_on_time).total_seconds()
-                    print(f"Pompe éteinte à {pump_off_time} (durée prévue atteinte)")
-                    print(f"Durée d'arrosage : {duration_seconds} secondes")
-                    record_arrosage(pump_on_time, duration_seconds)
-                    last_watering_time = pump_off_time
-                    pump_on_time = None
-                    watering_duration_minutes = None
-
-            # Vérifier les arrosages programmés
-            check_scheduled_watering()
-
-            # Charger la configuration avec cache pour optimiser
-            now = datetime.datetime.now()
+            print(f"Scénario correspondant trouvé - Action : {action}, Durée : {duration_minutes} minutes")
+
+            is_pump_on = pump.state.on
+            # Protection anti-arrosage excessif, appliquée par le contrôleur de pompe
+            min_interval = config.get('min_watering_interval', 30)  # minutes
+
+            if action == "Arroser" or action == "Arroser légèrement":
+                # Allumer la pompe si elle est éteinte et si la protection le permet ;
+                # si elle est déjà allumée, l'arrosage en cours garde son échéance
+                if not is_pump_on:
+                    watering_requested = True
+                    result = start_hub_watering(duration_minutes, f"scénario {plant}", min_interval_minutes=min_interval)
+                    if not result.accepted:
+                        print(result.message)
             
-            # Vérifier si le cache est valide
-            if _config_cache is None or _config_cache_time is None or \
-               (now - _config_cache_time).total_seconds() > _config_cache_ttl:
-                try:
-                    with open(data_file, 'r') as file:
-                        config_data = json.load(file)
-                    _config_cache = config_data
-                    _config_cache_time = now
-                except Exception as e:
-                    print(f"Erreur lors du chargement de la configuration: {e}")
-                    time.sleep(5)
-                    continue
+            elif action == "Surveiller, arroser si nécessaire":
+                # Arroser légèrement si la pompe est éteinte et si la protection le permet
+                if not is_pump_on and duration_minutes > 0:
+                    watering_requested = True
+                    start_hub_watering(duration_minutes, f"surveillance {plant}", min_interval_minutes=min_interval)
             
-            config = _config_cache
-            scenarios = config['scenarios'][config['current_scenario']]
-
-            matched_scenario = None
-            for scenario in scenarios:
-                soil_condition = scenario["Humidity of soil (%)"]
-                temp_condition = scenario["Air temperature (°C)"]
-                air_humidity_condition = scenario["Air humidity (%)"]
-
-                # Vérifier les conditions
-                # L'humidité du sol est OBLIGATOIRE (condition critique)
-                soil_match = eval_condition(soil_moisture, soil_condition) if soil_moisture is not None else False
-                # La température et l'humidité de l'air sont OPTIONNELLES (conditions souhaitables mais non bloquantes)
-                temp_match = eval_condition(air_temperature, temp_condition) if air_temperature is not None else True
-                humidity_match = eval_condition(air_humidity, air_humidity_condition) if air_humidity is not None else True
-
-                # L'humidité du sol doit correspondre, température et humidité de l'air sont optionnelles
-                if soil_match:
-                    matched_scenario = scenario
-                    break
-
-            # Appliquer l'action du scénario correspondant
-            if matched_scenario:
-                action = matched_scenario["Action"]
-                duration_minutes = matched_scenario["Watering duration (minutes)"]
-                
-                # Mode vacances : réduire la durée d'arrosage de 50%
-                if vacation_mode and duration_minutes > 0:
-                    duration_minutes = duration_minutes * 0.5
-                    print(f"Mode vacances actif - Durée réduite à {duration_minutes} minutes")
-                
-                print(f"Scénario correspondant trouvé - Action : {action}, Durée : {duration_minutes} minutes")
-
-                is_pump_on = GPIO.input(18) == 0  # GPIO.LOW = pompe allumée
-
-                if action == "Arroser" or action == "Arroser légèrement":
-                    # Vérifier la protection anti-arrosage excessif
-                    min_interval = config.get('min_watering_interval', 30)  # minutes
-                    can_water = True
-                    
-                    if last_watering_time:
-                        minutes_since_last = (datetime.datetime.now() - last_watering_time).total_seconds() / 60
-                        if minutes_since_last < min_interval:
-                            can_water = False
-                            print(f"Protection anti-arrosage : Dernier arrosage il y a {minutes_since_last:.1f} min (minimum: {min_interval} min)")
-                    
-                    # Allumer la pompe si elle est éteinte et si la protection le permet
-                    if not is_pump_on and can_water:
-                        GPIO.output(18, GPIO.LOW)
-                        pump_on_time = datetime.datetime.now()
-                        watering_duration_minutes = duration_minutes
-                        last_watering_time = pump_on_time
-                        print(f"Pompe allumée à {pump_on_time} pour {duration_minutes} minutes")
-                    # Si la pompe est déjà allumée, NE PAS réinitialiser le timer
-                    # Le timer est géré par la vérification en début de boucle (lignes 98-109)
-                    # Cela permet à la pompe de s'arrêter après la durée prévue
-                
-                elif action == "Surveiller, arroser si nécessaire":
-                    # Vérifier la protection anti-arrosage excessif
-                    min_interval = config.get('min_watering_interval', 30)
-                    can_water = True
-                    
-                    if last_watering_time:
-                        minutes_since_last = (datetime.datetime.now() - last_watering_time).total_seconds() / 60
-                        if minutes_since_last < min_interval:
-                            can_water = False
-                    
-                    # Arroser légèrement si la pompe est éteinte et si la protection le permet
-                    if not is_pump_on and duration_minutes > 0 and can_water:
-                        GPIO.output(18, GPIO.LOW)
-                        pump_on_time = datetime.datetime.now()
-                        watering_duration_minutes = duration_minutes
-                        last_watering_time = pump_on_time
-                        print(f"Pompe allumée à {pump_on_time} (surveillance) pour {duration_minutes} minutes")
-                
-                elif action == "Pas d'arrosage":
-                    # Éteindre la pompe si elle est allumée
-                    if is_pump_on:
-                        GPIO.output(18, GPIO.HIGH)
-                        if pump_on_time:
-                            pump_off_time = datetime.datetime.now()
-                            duration_seconds = (pump_off_time - pump_on_time).total_seconds()
-                            print(f"Pompe éteinte à {pump_off_time}")
-                            print(f"Durée d'arrosage : {duration_seconds} secondes")
-                            record_arrosage(pump_on_time, duration_seconds)
-                            last_watering_time = pump_off_time
-                            pump_on_time = None
-                            watering_duration_minutes = None
-            else:
-                print("Aucun scénario correspondant trouvé")
-
-            record_temp_humidity()
-            
-        except Exception as e:
-            print(f"Erreur dans la boucle de surveillance : {e}")
+            elif action == "Pas d'arrosage":
+                # Éteindre la pompe si elle est allumée
+                if is_pump_on:
+                    pump.stop("Pas d'arrosage")
+        elif soil_status == 'ok':
+            print("Aucun scénario correspondant trouvé")
+        if not watering_requested:
+            # Plus de besoin : libérer la place du hub dans la file des zones
+            zone_scheduler.cancel(PRIMARY_ZONE)
+
+        # Zones des autres sondes : enregistrement et évaluation de leur scénario
+        update_probe_zones(snapshot, config, air_temperature, air_humidity, _last_recorded)
+
+        dht_read_at = snapshot.timestamp('temperature')
+        if air_temperature is not None and air_humidity is not None \
+                and dht_read_at != _last_recorded.get('temperature'):
+            record_temp_humidity(air_temperature, air_humidity, dht_read_at)
+            _last_recorded['temperature'] = dht_read_at
         
-        time.sleep(5)  # Délai entre chaque vérification pour stabiliser les lectures
+    except Exception as e:
+        print(f"Erreur dans la boucle de surveillance : {e}")
 
-def eval_condition(value, condition):
-    """Évalue si une valeur correspond à une condition donnée"""
-    # Gérer les valeurs None
-    if value is None:
-        return False
-    
-    if isinstance(condition, str):
-        # Nettoyer la condition en enlevant les espaces
-        condition = condition.strip()
-        
-        if '-' in condition:
-            # Gérer les plages comme "18-26" ou "30-60"
-            parts = condition.split('-')
-            if len(parts) == 2:
-                try:
-                    min_val = float(parts[0].strip())
-                    max_val = float(parts[1].strip())
-                    return min_val <= value <= max_val
-                except ValueError:
-                    return False
-        elif '>' in condition:
-            # Gérer les conditions comme "> 60" ou ">26"
-            parts = condition.split('>')
-            if len(parts) == 2:
-                try:
-                    threshold = float(parts[1].strip())
-                    return value > threshold
-                except ValueError:
-                    return False
-        elif '<' in condition:
-            # Gérer les conditions comme "< 30" ou "<20"
-            parts = condition.split('<')
-            if len(parts) == 2:
-                try:
-                    threshold = float(parts[1].strip())
-                    return value < threshold
-                except ValueError:
-                    return False
-    return False
+def match_scenario(plant, scenarios, soil_moisture, air_temperature, air_humidity):
+    """Ligne du scénario à appliquer (None sinon), sur les règles compilées de la plante
+
+    L'humidité du sol est obligatoire ; parmi les lignes qui la satisfont, la
+    première dont la température et l'humidité de l'air correspondent aussi est
+    préférée (une valeur d'air absente ne bloque pas, une condition d'air vide
+    accepte toute valeur). La note sur l'air n'est affichée qu'au changement.
+    """
+    if soil_moisture is None or not scenarios:
+        return None
+    scenario, air_match = scenario_rules.match(plant, scenarios, soil_moisture, air_temperature, air_humidity)
+    air_mismatch = scenario is not None and not air_match
+    if air_mismatch and plant not in _air_mismatch_noted:
+        print(f"Scénario {plant} : conditions d'air non satisfaites, ligne retenue sur l'humidité du sol seule")
+    if air_mismatch:
+        _air_mismatch_noted.add(plant)
+    else:
+        _air_mismatch_noted.discard(plant)
+    return scenario
+
+# Lignes de chaque log tenues à jour par rotate_log_file (comptées une fois, au premier appel)
+_log_line_counts = {}
 
 def rotate_log_file(filename, max_lines=10000):
-    """Rotation des fichiers de logs pour limiter leur taille"""
+    """Rotation des fichiers de logs pour limiter leur taille
+
+    À appeler après chaque ligne ajoutée : le nombre de lignes est compté une
+    fois puis incrémenté, le fichier n'est relu que pour une rotation. Celle-ci
+    a lieu au-delà de max_lines plus 10 % et garde les max_lines dernières
+    lignes.
+    """
+    count = _log_line_counts.get(filename)
+    if count is not None:
+        count += 1
+        _log_line_counts[filename] = count
+        if count <= max_lines + max_lines // 10:
+            return
     try:
         with open(filename, 'r') as file:
             lines = file.readlines()
+        _log_line_counts[filename] = len(lines)
         
-        if len(lines) > max_lines:
+        if len(lines) > max_lines + max_lines // 10:
             # Garder seulement les dernières lignes
             lines_to_keep = lines[-max_lines:]
             
@@ -396,6 +521,7 @@ def rotate_log_file(filename, max_lines=10000):
             # Réécrire le fichier avec seulement les dernières lignes
             with open(filename, 'w') as file:
                 file.writelines(lines_to_keep)
+            _log_line_counts[filename] = len(lines_to_keep)
             
             print(f"Rotation du fichier {filename}: {len(lines)} lignes -> {len(lines_to_keep)} lignes (sauvegarde: {backup_filename})")
     except FileNotFoundError:
@@ -403,54 +529,96 @@ def rotate_log_file(filename, max_lines=10000):
     except Exception as e:
         print(f"Erreur lors de la rotation du fichier {filename}: {e}")
 
-def record_arrosage(start_time, duration):
+def record_arrosage(start_time, duration, volume=None):
+    """Enregistre un arrosage (volume en litres en troisième colonne s'il a été mesuré)"""
     with open(log_file, "a") as file:
-        file.write(f"{start_time}, {duration}\n")
+        if volume is None:
+            file.write(f"{start_time}, {duration}\n")
+        else:
+            file.write(f"{start_time}, {duration}, {volume}\n")
     # Rotation périodique (tous les 1000 enregistrements environ)
     rotate_log_file(log_file, max_lines=10000)
+    emit_control_event('watering', {'start_time': str(start_time), 'duration': duration, 'volume': volume})
 
-def record_temp_humidity():
-    max_retries = 5
-    for _ in range(max_retries):
-        try:
-            temperature = dht_device.temperature
-            humidity = dht_device.humidity
-            # Ne pas enregistrer si les valeurs sont None
-            if temperature is not None and humidity is not None:
-                timestamp = datetime.datetime.now().replace(microsecond=0)
-                with open(temp_humidity_log_file, "a") as file:
-                    file.write(f"{timestamp}, {temperature}, {humidity}\n")
-                # Rotation périodique (tous les 5000 enregistrements environ)
-                rotate_log_file(temp_humidity_log_file, max_lines=5000)
-                break  # Sortir de la boucle si la lecture est réussie
-            else:
-                print("Valeurs None détectées, nouvelle tentative...")
-                time.sleep(2)
-        except RuntimeError as e:
-            print(f"Erreur lors de l'enregistrement de la température et de l'humidité : {e}")
-            time.sleep(2)  # Attendre un peu avant de réessayer
-        except Exception as e:
-            print(f"Erreur inattendue lors de l'enregistrement : {e}")
-            break
-    else:
-        print("Échec de la lecture du capteur DHT11 après plusieurs tentatives.")
+def record_temp_humidity(temperature, humidity, timestamp=None):
+    """Enregistre une lecture du DHT11 fournie par le service d'acquisition"""
+    if temperature is None or humidity is None:
+        return
+    try:
+        timestamp = (timestamp or clock.now()).replace(microsecond=0)
+        with open(temp_humidity_log_file, "a") as file:
+            file.write(f"{timestamp}, {temperature}, {humidity}\n")
+        emit_control_event('row', {'source': 'hub', 'series': 'temp_humidity', 'timestamp': str(timestamp),
+                                   'values': [temperature, humidity]})
+        # Rotation périodique (tous les 5000 enregistrements environ)
+        rotate_log_file(temp_humidity_log_file, max_lines=SENSOR_LOG_MAX_LINES)
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement de la température et de l'humidité : {e}")
 
-def record_soil_moisture(soil_moisture):
+def record_soil_moisture(soil_moisture, timestamp=None):
     # Ne pas enregistrer si la valeur est None
     if soil_moisture is None:
         print("Tentative d'enregistrement d'une valeur None pour l'humidité du sol, ignorée")
         return
     
     try:
-        timestamp = datetime.datetime.now().replace(microsecond=0)
+        timestamp = (timestamp or clock.now()).replace(microsecond=0)
         with open(soil_moisture_log_file, "a") as file:
             file.write(f"{timestamp}, {soil_moisture}\n")
+        emit_control_event('row', {'source': 'hub', 'series': 'soil_moisture', 'timestamp': str(timestamp),
+                                   'values': [soil_moisture]})
         # Rotation périodique (tous les 5000 enregistrements environ)
-        rotate_log_file(soil_moisture_log_file, max_lines=5000)
+        rotate_log_file(soil_moisture_log_file, max_lines=SENSOR_LOG_MAX_LINES)
         print(f"Enregistrement : {timestamp}, {soil_moisture}%")  # Ajouté pour le débogage
     except Exception as e:
         print(f"Erreur lors de l'enregistrement de l'humidité du sol : {e}")
 
+def record_zone_soil_moisture(zone, soil_moisture, timestamp):
+    """Enregistre la mesure d'une sonde supplémentaire dans son propre log (comme un nœud)"""
+    try:
+        timestamp = timestamp.replace(microsecond=0)
+        os.makedirs(NODES_DATA_DIR, exist_ok=True)
+        zone_log_file = node_log_file(zone, 'soil_moisture')
+        with open(zone_log_file, "a") as file:
+            file.write(f"{timestamp}, {soil_moisture}\n")
+        emit_control_event('row', {'source': zone, 'series': 'soil_moisture', 'timestamp': str(timestamp),
+                                   'values': [soil_moisture]})
+        rotate_log_file(zone_log_file, max_lines=SENSOR_LOG_MAX_LINES)
+    except Exception as e:
+        print(f"Erreur lors de l'enregistrement de l'humidité du sol de la zone {zone} : {e}")
+
+def update_probe_zones(snapshot, config, air_temperature, air_humidity, last_recorded):
+    """Zones des sondes autres que P0 : enregistre les nouvelles mesures et évalue
+    le scénario de chaque zone (décision publiée, la pompe reste celle de la zone 'hub')"""
+    for probe in soil_scanner.probes:
+        zone = probe['zone']
+        if zone == PRIMARY_ZONE:
+            continue
+        metric = probe_metric(zone)
+        soil_moisture = snapshot.get(metric)
+        read_at = snapshot.timestamp(metric)
+        if soil_moisture is not None and read_at != last_recorded.get(metric):
+            record_zone_soil_moisture(zone, soil_moisture, read_at)
+            last_recorded[metric] = read_at
+
+        scenario_name = probe.get('scenario') or config.get('current_scenario')
+        matched = None
+        if snapshot.status(metric) == 'ok':
+            scenarios = config.get('scenarios', {}).get(scenario_name, [])
+            matched = match_scenario(scenario_name, scenarios, soil_moisture, air_temperature, air_humidity)
+        state = {
+            'zone': zone,
+            'address': f"0x{probe['address']:02x}",
+            'channel': f"P{probe['channel']}",
+            'scenario': scenario_name,
+            'soil_moisture': soil_moisture,
+            'soil_moisture_noise': snapshot.get(f'{metric}_noise'),
+            'status': snapshot.status(metric),
+            'action': matched['Action'] if matched else None,
+            'watering_duration': matched['Watering duration (minutes)'] if matched else None
+        }
+        emit_control_event('zone', state)
+
 def format_duration(seconds):
     seconds = int(seconds)
     hours = seconds // 3600
@@ -462,175 +630,458 @@ def format_duration(seconds):
 def index():
     return render_template('index.html')
 
-@app.route('/data')
-def data():
-    try:
-        temperature = dht_device.temperature
-        humidity = dht_device.humidity
-        # Vérifier si les valeurs sont None
-        if temperature is None:
-            temperature = "--"
-        if humidity is None:
-            humidity = "--"
-    except RuntimeError as e:
-        print(f"Erreur lors de la lecture du DHT11: {e}")
-        temperature = "--"
-        humidity = "--"
-    except Exception as e:
-        print(f"Erreur inattendue lors de la lecture des capteurs: {e}")
-        temperature = "--"
-        humidity = "--"
+def read_hub_sensors(snapshot=None):
+    """Valeurs courantes du hub depuis le dernier instantané du service d'acquisition
     
-    soil_moisture = get_soil_moisture()
-    if soil_moisture is None:
-        soil_moisture = "--"
+    Ne lit jamais le matériel : la latence des requêtes ne dépend pas des capteurs.
+    
+    Returns:
+        dict: temperature, air_humidity, soil_moisture (None si indisponible ou trop
+              ancienne) et age (secondes depuis la lecture la plus ancienne)
+    """
+    snapshot = snapshot or sensor_service.latest()
+    readings = snapshot.readings()
+    ages = [snapshot.age(metric) for metric in readings]
+    readings['status'] = {metric: snapshot.status(metric) for metric in snapshot.values}
+    readings['age'] = round(max(ages), 1) if ages and None not in ages else None
+    return readings
+
+def read_pump_status():
+    """État de la pompe publié par son contrôleur (aucun accès au GPIO)"""
+    return pump.state.label
+
+def build_data_section(readings):
+    """Valeurs courantes affichées sur le dashboard ("--" si indisponible)"""
+    def display(value):
+        return "--" if value is None else value
     
+    return {
+        'temperature': display(readings['temperature']),
+        'air_humidity': display(readings['air_humidity']),
+        'pump_status': read_pump_status(),
+        'soil_humidity': display(readings['soil_moisture']),
+        'soil_humidity_noise': readings.get('soil_moisture_noise'),
+        'flow_rate': readings.get('flow_rate'),
+        'sensor_age': readings.get('age'),
+        'sensor_status': readings.get('status')
+    }
+
+def publish_pump_state(state):
+    """Diffuse l'instantané de la pompe publié par son contrôleur"""
+    event_publisher.publish('pump', state.to_dict(), only_if_changed=True)
+
+def publish_hub_readings(readings):
+    """Diffuse une nouvelle lecture du hub et les alertes qui en découlent"""
     try:
-        pump_status = "Allumée" if GPIO.input(18) == 0 else "Éteinte"
+        event_publisher.publish('hub', build_data_section(readings))
+        event_publisher.publish(
+            'alerts',
+            {'alerts': build_alerts(readings, read_last_watering_timestamp())},
+            only_if_changed=True
+        )
     except Exception as e:
-        print(f"Erreur lors de la lecture du statut de la pompe: {e}")
-        pump_status = "Inconnu"
-    
-    return jsonify(
-        temperature=temperature,
-        air_humidity=humidity,
-        pump_status=pump_status,
-        soil_humidity=soil_moisture
-    )
+        print(f"Erreur lors de la diffusion des données du hub : {e}")
+
+# Processus de contrôle (clé "control_process" de data.json) : dans ce processus,
+# control_server diffuse les événements au serveur web ; dans le serveur web,
+# control_client transmet les commandes. Les deux restent None quand la boucle
+# de contrôle tourne dans le même processus que Flask.
+control_server = None
+control_client = None
+_control_process = None
+# Événements reçus par le serveur web pendant son démarrage à chaud
+_event_backlog = []
+_events_live = False
+_events_lock = threading.Lock()
+# Attente maximale de l'abonnement aux événements au démarrage (secondes)
+SUBSCRIBE_TIMEOUT = 10
+
+def emit_control_event(kind, payload):
+    """Événement de la boucle de contrôle (lecture, arrosage, état de la pompe...)
+    appliqué par le serveur web, transmis par la socket s'il est dans un autre processus"""
+    if control_server is not None:
+        control_server.emit(kind, payload)
+    else:
+        apply_control_event(kind, payload)
+
+def apply_control_event(kind, payload):
+    """Enregistrement en mémoire et diffusion SSE d'un événement de la boucle de contrôle"""
+    if kind == 'row':
+        record_row(payload['source'], payload['series'],
+                   datetime.datetime.fromisoformat(payload['timestamp']), payload['values'])
+        save_aggregates()
+    elif kind == 'watering':
+        # Relu dans le log depuis le dernier arrosage compté : rien n'est sauté
+        # si une notification précédente a été perdue
+        watering_counters.catch_up()
+        bump_generation('hub:watering')
+    elif kind == 'hub':
+        publish_hub_readings(payload)
+    elif kind == 'zone':
+        zone_states[payload['zone']] = payload
+        event_publisher.publish('zone', payload, key=f"zone:{payload['zone']}")
+    elif kind == 'pump':
+        state = PumpState.from_message(payload)
+        if control_client is not None:
+            pump.mirror(state)
+        publish_pump_state(state)
+    elif kind == 'snapshot':
+        sensor_service.mirror(SensorSnapshot.from_message(payload))
+
+def receive_control_event(kind, payload):
+    """Événement reçu par l'abonnement du serveur web : mis de côté tant que
+    les agrégats sont reconstruits depuis les logs (voir replay_control_events),
+    ignoré s'il a déjà été relu dans les logs (resync_from_logs)"""
+    with _events_lock:
+        if not _events_live:
+            _event_backlog.append((kind, payload))
+            return
+    if not already_in_logs(kind, payload):
+        apply_control_event(kind, payload)
+
+def already_in_logs(kind, payload):
+    """Ligne ou arrosage déjà relu dans les logs par le démarrage à chaud"""
+    if kind == 'row':
+        last = sensor_rings.last_timestamp(payload['source'], payload['series'])
+        return last is not None and np.datetime64(datetime.datetime.fromisoformat(payload['timestamp']), 's') <= last
+    if kind == 'watering':
+        last = watering_counters.last_watering_time()
+        return last is not None and datetime.datetime.fromisoformat(payload['start_time']) <= last
+    return False
 
-@app.route('/arrosage_history')
-def arrosage_history():
+def replay_control_events():
+    """Applique les événements reçus pendant le démarrage à chaud, sauf ceux déjà
+    relus dans les logs, puis applique les suivants dès leur réception"""
+    global _events_live
+    with _events_lock:
+        for kind, payload in _event_backlog:
+            if not already_in_logs(kind, payload):
+                apply_control_event(kind, payload)
+        _event_backlog.clear()
+        _events_live = True
+
+def control_log_sources():
+    """Logs capteurs écrits par le processus de contrôle (hub et sondes supplémentaires)"""
+    sources = [
+        ('hub', 'temp_humidity', temp_humidity_log_file),
+        ('hub', 'soil_moisture', soil_moisture_log_file)
+    ]
     try:
-        with open(log_file, "r") as file:
-            lines = file.readlines()
-    except FileNotFoundError:
-        lines = []  # Si le fichier n'existe pas, utiliser une liste vide.
+        config = load_config_cached()
+    except Exception as e:
+        print(f"Erreur lors du chargement de la configuration: {e}")
+        config = {}
+    for probe in probe_settings(config):
+        if probe['zone'] != PRIMARY_ZONE:
+            sources.append((probe['zone'], 'soil_moisture', node_log_file(probe['zone'], 'soil_moisture')))
+    return sources
+
+def resync_from_logs():
+    """Reconnexion au processus de contrôle : relit dans les logs les lignes et
+    arrosages dont les événements ont été perdus pendant la coupure, à partir
+    de la dernière ligne connue de chaque série"""
+    with _events_lock:
+        if not _events_live:
+            return  # démarrage à chaud en cours : les logs seront relus en entier
+    window_start = clock.now() - datetime.timedelta(hours=HOT_WINDOW_HOURS)
+    rows = 0
+    for source, series, filename in control_log_sources():
+        last = sensor_rings.last_timestamp(source, series)
+        since = last.astype(datetime.datetime) if last is not None else window_start
+        for timestamp, values in read_recent_rows(filename, since):
+            if last is None or np.datetime64(timestamp, 's') > last:
+                record_row(source, series, timestamp, values[:len(SENSOR_SERIES[series])])
+                rows += 1
+    waterings = watering_counters.catch_up()
+    if waterings:
+        bump_generation('hub:watering')
+    save_aggregates()
+    print(f"Resynchronisation avec le processus de contrôle : {rows} ligne(s), {waterings} arrosage(s) relus")
+
+def control_initial_events():
+    """État courant envoyé à chaque (re)connexion du serveur web"""
+    return [('pump', pump.state.to_message()), ('snapshot', sensor_service.latest().to_message())]
+
+def forward_sensor_snapshots():
+    """Transmet chaque nouvel instantané des capteurs au serveur web"""
+    sequence = 0
+    while True:
+        snapshot = sensor_service.wait_for_update(sequence)
+        sequence = snapshot.sequence
+        control_server.emit('snapshot', snapshot.to_message())
+
+def command_pump_start(duration, source):
+    """Démarrage demandé par le serveur web : prioritaire, compté dans les plafonds des zones"""
+    result = pump.start(duration, source)
+    if result.accepted:
+        zone_scheduler.occupy(PRIMARY_ZONE, duration)
+    return {'accepted': result.accepted, 'message': result.message}
+
+def command_pump_stop(reason):
+    result = pump.stop(reason)
+    return {'accepted': result.accepted, 'message': result.message}
+
+def command_zone_request(zone, duration, settings=None):
+    zone_scheduler.configure(settings)
+    slot = zone_scheduler.request(zone, duration)
+    return {'slot': slot.to_dict(), 'granted': slot.granted, 'started': slot.started}
+
+def command_zone_cancel(zone):
+    zone_scheduler.cancel(zone)
+
+def command_zone_status():
+    return zone_scheduler.status()
+
+def command_schedule_status():
+    return {'upcoming': watering_schedule.upcoming(), 'missed': list(watering_schedule.missed)}
+
+def command_status():
+    return {
+        'pid': os.getpid(),
+        'priority': os.getpriority(os.PRIO_PROCESS, 0),
+        'max_lateness': round(control_scheduler.max_lateness, 4),
+        'pump': pump.state.to_dict(),
+        'sensors': sensor_service.stats(),
+        'events': control_server.stats() if control_server else None
+    }
+
+CONTROL_COMMANDS = {
+    'pump_start': command_pump_start,
+    'pump_stop': command_pump_stop,
+    'zone_request': command_zone_request,
+    'zone_cancel': command_zone_cancel,
+    'zone_status': command_zone_status,
+    'schedule_status': command_schedule_status,
+    'status': command_status
+}
+
+def control_call(command, **arguments):
+    """Commande à la boucle de contrôle : directe dans le même processus, sinon par la socket"""
+    if control_client is None:
+        return CONTROL_COMMANDS[command](**arguments)
+    return control_client.call(command, **arguments)
+
+@app.route('/api/stream')
+def api_stream():
+    """Flux Server-Sent Events : lectures du hub, pompe, alertes et nœuds"""
+    return Response(
+        stream_with_context(event_publisher.stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/data')
+def data():
+    return jsonify(build_data_section(read_hub_sensors()))
+
+# Pagination de l'historique des arrosages
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
+def get_history_page_size():
+    """Taille de page demandée (paramètre 'limit' ou 'history_page_size' dans data.json)"""
+    page_size = request.args.get('limit', type=int)
+    if page_size is None:
         try:
-            with open(log_file, "w") as file:  # Créer le fichier vide.
-                pass
+            with open(data_file, 'r') as file:
+                page_size = json.load(file).get('history_page_size', DEFAULT_HISTORY_PAGE_SIZE)
         except Exception:
-            pass
+            page_size = DEFAULT_HISTORY_PAGE_SIZE
+    return max(1, min(int(page_size), MAX_HISTORY_PAGE_SIZE))
 
-    formatted_history = []
-    for line in lines:
-        line = line.strip()
-        if not line:  # Ignorer les lignes vides
+def read_arrosage_page(cursor=None, limit=DEFAULT_HISTORY_PAGE_SIZE):
+    """Lit une page de l'historique des arrosages, du plus récent au plus ancien
+    
+    Args:
+        cursor: position (octets) de la plus ancienne ligne de la page précédente,
+            None pour commencer à la fin du fichier
+        limit: nombre maximum d'entrées
+    
+    Returns:
+        tuple: (entrées [timestamp, durée formatée, durée en secondes], curseur suivant ou None)
+    """
+    entries = []
+    next_cursor = None
+    for line, offset in read_lines_reverse(log_file, end_offset=cursor):
+        if len(entries) >= limit:
+            break
+        next_cursor = offset
+        parts = line.split(", ")
+        if len(parts) < 2:
             continue
         try:
-            parts = line.split(", ")
-            if len(parts) >= 2:
-                timestamp = parts[0]
-                duration_str = parts[1]
-                try:
-                    duration_seconds = float(duration_str)
-                    formatted_history.append([timestamp, format_duration(duration_seconds)])
-                except ValueError:
-                    print(f"Erreur: durée invalide dans la ligne: {line}")
-                    continue
-        except Exception as e:
-            print(f"Erreur lors du parsing de la ligne d'historique: {line}, erreur: {e}")
+            duration_seconds = float(parts[1])
+        except ValueError:
+            print(f"Erreur: durée invalide dans la ligne: {line}")
             continue
-    
-    return render_template('history.html', history=formatted_history)
+        entries.append([parts[0], format_duration(duration_seconds), duration_seconds])
+    else:
+        # Début du fichier atteint : plus de page suivante
+        next_cursor = None
+    return entries, next_cursor
 
-@app.route('/temperature_humidity_history')
-def temperature_humidity_history():
-    timestamps = []
-    temperatures = []
-    humidities = []
-    soil_timestamps = []
-    soil_moistures = []
+@app.route('/arrosage_history')
+def arrosage_history():
+    if not os.path.exists(log_file):
+        try:
+            open(log_file, "w").close()  # Créer le fichier vide.
+        except Exception:
+            pass
 
+    page_size = get_history_page_size()
+    history, next_cursor = read_arrosage_page(limit=page_size)
+    return render_template(
+        'history.html',
+        history=history,
+        next_cursor=next_cursor,
+        page_size=page_size,
+        total_count=watering_counters.snapshot()['total_waterings']
+    )
+
+@app.route('/api/arrosage_history')
+def api_arrosage_history():
+    """Historique paginé des arrosages (JSON, plus récent d'abord)"""
     try:
-        # Lire le fichier de température et humidité
-        try:
-            with open(temp_humidity_log_file, "r") as file:
-                lines = file.readlines()
-        except FileNotFoundError:
-            lines = []
-            # Créer le fichier vide s'il n'existe pas
-            try:
-                with open(temp_humidity_log_file, "w") as file:
-                    pass
-            except Exception:
-                pass
+        cursor = request.args.get('cursor', type=int)
+        page_size = get_history_page_size()
+        entries, next_cursor = read_arrosage_page(cursor=cursor, limit=page_size)
+        return jsonify({'status': 'success', 'history': entries, 'next_cursor': next_cursor})
+    except Exception as e:
+        print(f"Erreur lors de la lecture de l'historique paginé : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
-        # Parser les lignes de température et humidité
-        for line in lines:
-            line = line.strip()
-            if not line:  # Ignorer les lignes vides
-                continue
-            try:
-                parts = line.split(", ")
-                if len(parts) >= 3:
-                    timestamp = parts[0]
-                    temperature_str = parts[1]
-                    humidity_str = parts[2]
-                    
-                    # Vérifier que les valeurs ne sont pas None ou vides
-                    if temperature_str and temperature_str.lower() != 'none' and humidity_str and humidity_str.lower() != 'none':
-                        temperature = float(temperature_str)
-                        humidity = float(humidity_str)
-                        timestamps.append(timestamp)
-                        temperatures.append(temperature)
-                        humidities.append(humidity)
-            except (ValueError, IndexError) as e:
-                print(f"Erreur lors du parsing de la ligne température/humidité: {line}, erreur: {e}")
-                continue
-
-        # Lire le fichier d'humidité du sol
-        try:
-            with open(soil_moisture_log_file, "r") as soil_file:
-                soil_lines = soil_file.readlines()
-        except FileNotFoundError:
-            soil_lines = []
+def read_sensor_logs(deadline=None):
+    """Lit en une seule passe les logs température/humidité et humidité du sol
+    
+    Exécuté dans le pool de processus quand les tampons en mémoire ne suffisent pas.
+    
+    Returns:
+        dict: 'temp_humidity' -> [(timestamp_str, température, humidité)],
+              'soil' -> [(timestamp_str, humidité du sol)]
+    """
+    logs = {'temp_humidity': [], 'soil': []}
+    
+    for filename in (temp_humidity_log_file, soil_moisture_log_file):
+        if not os.path.exists(filename):
             # Créer le fichier vide s'il n'existe pas
             try:
-                with open(soil_moisture_log_file, "w") as soil_file:
+                with open(filename, "w") as file:
                     pass
             except Exception:
                 pass
+    
+    try:
+        with open(temp_humidity_log_file, "r") as file:
+            for line in file:
+                line = line.strip()
+                if not line:  # Ignorer les lignes vides
+                    continue
+                parts = line.split(", ")
+                if len(parts) < 3:
+                    continue
+                timestamp_str, temperature_str, humidity_str = parts[0], parts[1], parts[2]
+                # Vérifier que les valeurs ne sont pas None ou vides
+                if not temperature_str or temperature_str.lower() == 'none' or not humidity_str or humidity_str.lower() == 'none':
+                    continue
+                try:
+                    logs['temp_humidity'].append((timestamp_str, float(temperature_str), float(humidity_str)))
+                except ValueError as e:
+                    print(f"Erreur lors du parsing de la ligne température/humidité: {line}, erreur: {e}")
+    except Exception as e:
+        print(f"Erreur lors de la lecture de {temp_humidity_log_file}: {e}")
+    
+    check_deadline(deadline)
+    try:
+        with open(soil_moisture_log_file, "r") as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                parts = line.split(", ")
+                if len(parts) < 2:
+                    continue
+                timestamp_str, moisture_str = parts[0], parts[1]
+                if not moisture_str or moisture_str.lower() == 'none':
+                    continue
+                try:
+                    logs['soil'].append((timestamp_str, float(moisture_str)))
+                except ValueError as e:
+                    print(f"Erreur lors du parsing de la ligne humidité du sol: {line}, erreur: {e}")
+    except Exception as e:
+        print(f"Erreur lors de la lecture de {soil_moisture_log_file}: {e}")
+    
+    return logs
+
+def build_history_section(logs):
+    """Séries complètes pour le graphique d'historique"""
+    return {
+        'timestamps': [row[0] for row in logs['temp_humidity']],
+        'temperatures': [row[1] for row in logs['temp_humidity']],
+        'humidities': [row[2] for row in logs['temp_humidity']],
+        'soil_timestamps': [row[0] for row in logs['soil']],
+        'soil_moistures': [row[1] for row in logs['soil']]
+    }
 
-        # Parser les lignes d'humidité du sol
-        for soil_line in soil_lines:
-            soil_line = soil_line.strip()
-            if not soil_line:  # Ignorer les lignes vides
-                continue
-            try:
-                parts = soil_line.split(", ")
-                if len(parts) >= 2:
-                    timestamp = parts[0]
-                    soil_moisture_str = parts[1]
-                    
-                    # Vérifier que la valeur n'est pas None ou vide
-                    if soil_moisture_str and soil_moisture_str.lower() != 'none':
-                        soil_moisture = float(soil_moisture_str)
-                        soil_timestamps.append(timestamp)
-                        soil_moistures.append(soil_moisture)
-            except (ValueError, IndexError) as e:
-                print(f"Erreur lors du parsing de la ligne humidité du sol: {soil_line}, erreur: {e}")
-                continue
+# Nombre maximal de lignes renvoyées par série (taille des logs après rotation)
+HISTORY_MAX_ROWS = 5000
+
+def ring_history_rows(series, hours=None, max_rows=HISTORY_MAX_ROWS):
+    """Lignes complètes (sans valeur manquante) d'une série du hub depuis le tampon circulaire
+
+    Returns:
+        tuple: (timestamps, colonnes) ou None si le tampon ne couvre pas la période
+    """
+    since = None
+    if hours is not None:
+        since = clock.now() - datetime.timedelta(hours=hours)
+        if not sensor_rings.covers('hub', series, since):
+            return None
+    elif sensor_rings.covered_since is None:
+        return None  # Tampons pas encore chargés
+    ring = sensor_rings.get('hub', series)
+    if ring is None:
+        return [], [[] for _ in SENSOR_SERIES[series]]
+    times, values = ring.window(since)
+    complete = ~np.isnan(values).any(axis=1)
+    times, values = times[complete][-max_rows:], values[complete][-max_rows:]
+    return format_timestamps(times), [column_to_list(values[:, i]) for i in range(values.shape[1])]
+
+@cached_query(series=['hub'], time_bucket=60)
+def hub_sensor_history(hours=None):
+    """Historique du hub : servi depuis les tampons circulaires en mémoire,
+    relu dans les logs seulement si les tampons ne couvrent pas la période
+
+    Args:
+        hours: limiter aux dernières heures (par défaut, les HISTORY_MAX_ROWS dernières lignes)
+    """
+    temp_humidity = ring_history_rows('temp_humidity', hours)
+    soil = ring_history_rows('soil_moisture', hours)
+    if temp_humidity is None or soil is None:
+        logs = query_pool.run(read_sensor_logs)
+        if hours is not None:
+            cutoff = str(clock.now().replace(microsecond=0) - datetime.timedelta(hours=hours))
+            logs = {key: [row for row in rows if row[0] >= cutoff] for key, rows in logs.items()}
+        return build_history_section(logs)
+    timestamps, (temperatures, humidities) = temp_humidity
+    soil_timestamps, (soil_moistures,) = soil
+    return {
+        'timestamps': timestamps,
+        'temperatures': temperatures,
+        'humidities': humidities,
+        'soil_timestamps': soil_timestamps,
+        'soil_moistures': soil_moistures
+    }
 
+@app.route('/temperature_humidity_history')
+def temperature_humidity_history():
+    try:
+        hours = request.args.get('hours', type=float)
+        return jsonify(hub_sensor_history(hours=hours))
+    except QueryError as e:
+        return query_error_response(e)
     except Exception as e:
-        print(f"Erreur générale dans temperature_humidity_history: {e}")
-        import traceback
-        traceback.print_exc()
-        # Retourner des listes vides en cas d'erreur
-        return jsonify(
-            timestamps=[],
-            temperatures=[],
-            humidities=[],
-            soil_timestamps=[],
-            soil_moistures=[]
-        ), 200
-
-    return jsonify(
-        timestamps=timestamps,
-        temperatures=temperatures,
-        humidities=humidities,
-        soil_timestamps=soil_timestamps,
-        soil_moistures=soil_moistures
-    )
+        print(f"Erreur lors de la lecture de l'historique des capteurs : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/configuration')
 def configuration():
@@ -667,12 +1118,19 @@ def get_settings():
     try:
         with open(data_file, 'r') as file:
             config = json.load(file)
+        try:
+            schedule = control_call('schedule_status')
+        except ControlError as e:
+            print(f"Prochains arrosages programmés indisponibles : {e}")
+            schedule = {'upcoming': [], 'missed': []}
         
         settings = {
             'maintenance_mode': config.get('maintenance_mode', False),
             'vacation_mode': config.get('vacation_mode', False),
             'scheduled_waterings': config.get('scheduled_waterings', []),
-            'min_watering_interval': config.get('min_watering_interval', 30)  # Minutes minimum entre arrosages
+            'min_watering_interval': config.get('min_watering_interval', 30),  # Minutes minimum entre arrosages
+            'next_scheduled_waterings': schedule['upcoming'],
+            'missed_scheduled_waterings': schedule['missed']
         }
         return jsonify(settings)
     except Exception as e:
@@ -715,104 +1173,105 @@ def update_settings():
         
         # Invalider le cache pour forcer le rechargement
         _config_cache = config
-        _config_cache_time = datetime.datetime.now()
+        _config_cache_time = clock.now()
         
         return jsonify({'status': 'success', 'message': 'Paramètres mis à jour avec succès'})
     except Exception as e:
         print(f"Erreur lors de la mise à jour des paramètres: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/alerts')
-def alerts():
-    """Retourne les alertes actuelles du système"""
+def read_last_watering_timestamp():
+    """Retourne la date du dernier arrosage (compteurs en mémoire)"""
+    return watering_counters.last_watering_time()
+
+def build_alerts(readings, last_watering):
+    """Construit la liste des alertes à partir d'une lecture des capteurs"""
     alerts_list = []
+    temperature = readings['temperature']
+    air_humidity = readings['air_humidity']
+    soil_moisture = readings['soil_moisture']
     
-    try:
-        # Vérifier les capteurs
-        try:
-            temperature = dht_device.temperature
-            air_humidity = dht_device.humidity
-        except:
-            temperature = None
-            air_humidity = None
-        
-        soil_moisture = get_soil_moisture()
-        
-        # Alerte : Capteurs défaillants
-        if temperature is None or air_humidity is None:
+    # Alerte : Capteurs défaillants
+    if temperature is None or air_humidity is None:
+        alerts_list.append({
+            'level': 'warning',
+            'message': 'Capteur DHT11 (température/humidité air) non disponible',
+            'icon': 'fa-exclamation-triangle'
+        })
+    
+    if soil_moisture is None:
+        alerts_list.append({
+            'level': 'warning',
+            'message': 'Capteur d\'humidité du sol non disponible',
+            'icon': 'fa-exclamation-triangle'
+        })
+    
+    # Alerte : Température critique
+    if temperature is not None:
+        if temperature < 10:
+            alerts_list.append({
+                'level': 'danger',
+                'message': f'Température très basse ({temperature}°C) - Risque pour les plantes',
+                'icon': 'fa-thermometer-empty'
+            })
+        elif temperature > 35:
+            alerts_list.append({
+                'level': 'danger',
+                'message': f'Température très élevée ({temperature}°C) - Risque pour les plantes',
+                'icon': 'fa-thermometer-full'
+            })
+    
+    # Alerte : Humidité du sol critique
+    if soil_moisture is not None:
+        if soil_moisture < 15:
+            alerts_list.append({
+                'level': 'danger',
+                'message': f'Sol très sec ({soil_moisture}%) - Arrosage urgent nécessaire',
+                'icon': 'fa-tint-slash'
+            })
+        elif soil_moisture > 95:
             alerts_list.append({
                 'level': 'warning',
-                'message': 'Capteur DHT11 (température/humidité air) non disponible',
-                'icon': 'fa-exclamation-triangle'
+                'message': f'Sol très humide ({soil_moisture}%) - Risque de sur-arrosage',
+                'icon': 'fa-tint'
             })
-        
-        if soil_moisture is None:
+    
+    # Alerte : Humidité de l'air
+    if air_humidity is not None:
+        if air_humidity < 20:
             alerts_list.append({
                 'level': 'warning',
-                'message': 'Capteur d\'humidité du sol non disponible',
-                'icon': 'fa-exclamation-triangle'
+                'message': f'Air très sec ({air_humidity}%) - Considérer un humidificateur',
+                'icon': 'fa-wind'
             })
-        
-        # Alerte : Température critique
-        if temperature is not None:
-            if temperature < 10:
-                alerts_list.append({
-                    'level': 'danger',
-                    'message': f'Température très basse ({temperature}°C) - Risque pour les plantes',
-                    'icon': 'fa-thermometer-empty'
-                })
-            elif temperature > 35:
-                alerts_list.append({
-                    'level': 'danger',
-                    'message': f'Température très élevée ({temperature}°C) - Risque pour les plantes',
-                    'icon': 'fa-thermometer-full'
-                })
-        
-        # Alerte : Humidité du sol critique
-        if soil_moisture is not None:
-            if soil_moisture < 15:
-                alerts_list.append({
-                    'level': 'danger',
-                    'message': f'Sol très sec ({soil_moisture}%) - Arrosage urgent nécessaire',
-                    'icon': 'fa-tint-slash'
-                })
-            elif soil_moisture > 95:
-                alerts_list.append({
-                    'level': 'warning',
-                    'message': f'Sol très humide ({soil_moisture}%) - Risque de sur-arrosage',
-                    'icon': 'fa-tint'
-                })
-        
-        # Alerte : Humidité de l'air
-        if air_humidity is not None:
-            if air_humidity < 20:
-                alerts_list.append({
-                    'level': 'warning',
-                    'message': f'Air très sec ({air_humidity}%) - Considérer un humidificateur',
-                    'icon': 'fa-wind'
-                })
-        
-        # Vérifier la dernière activité
-        try:
-            with open(log_file, "r") as file:
-                lines = file.readlines()
-            if lines:
-                last_line = lines[-1].strip()
-                if last_line:
-                    parts = last_line.split(", ")
-                    if len(parts) >= 1:
-                        last_watering = parse_timestamp(parts[0])
-                        if last_watering:
-                            hours_since = (datetime.datetime.now() - last_watering).total_seconds() / 3600
-                            if hours_since > 48 and soil_moisture is not None and soil_moisture < 30:
-                                alerts_list.append({
-                                    'level': 'info',
-                                    'message': f'Dernier arrosage il y a {int(hours_since)}h - Vérifier si nécessaire',
-                                    'icon': 'fa-clock'
-                                })
-        except:
-            pass
-            
+    
+    # Alerte : débit mesuré alors que la pompe est arrêtée
+    flow_rate = readings.get('flow_rate')
+    if flow_meter and flow_meter.leak_suspected(flow_rate, pump.state):
+        alerts_list.append({
+            'level': 'danger',
+            'message': f'Débit de {flow_rate} L/min pompe arrêtée - Fuite probable',
+            'icon': 'fa-water'
+        })
+    
+    # Vérifier la dernière activité
+    if last_watering:
+        hours_since = (clock.now() - last_watering).total_seconds() / 3600
+        if hours_since > 48 and soil_moisture is not None and soil_moisture < 30:
+            alerts_list.append({
+                'level': 'info',
+                'message': f'Dernier arrosage il y a {int(hours_since)}h - Vérifier si nécessaire',
+                'icon': 'fa-clock'
+            })
+    
+    return alerts_list
+
+@app.route('/alerts')
+def alerts():
+    """Retourne les alertes actuelles du système"""
+    alerts_list = []
+    try:
+        alerts_list = build_alerts(read_hub_sensors(), read_last_watering_timestamp())
     except Exception as e:
         print(f"Erreur lors de la vérification des alertes: {e}")
     
@@ -834,248 +1293,310 @@ def parse_timestamp(timestamp_str):
             except:
                 return None
 
+def round_summary(summary):
+    """Arrondit un résumé min/max/moyenne pour l'affichage"""
+    return {
+        key: (round(summary[key], 1) if summary[key] is not None else None)
+        for key in ('min', 'max', 'avg')
+    }
+
+@cached_query(series=lambda source='hub', **_: [source], time_bucket=60)
+def build_trends_section(source='hub'):
+    """Tendances des dernières 24h : min, max et moyenne (fenêtres glissantes),
+    p5, p50 et p95 (esquisses de quantiles)"""
+    now = clock.now()
+    trends_data = {}
+    for metric in ('temperature', 'air_humidity', 'soil_moisture'):
+        trends_data[metric] = round_summary(sensor_windows.summary(source, metric))
+        percentiles = sensor_sketches.query(source, metric, now - datetime.timedelta(hours=24), now)
+        trends_data[metric].update({key: percentiles[key] for key in ('p5', 'p50', 'p95')})
+    return trends_data
+
+def sensor_log_sources():
+    """Fichiers de logs capteurs du hub et des nœuds : [(source, série, fichier)]"""
+    sources = [
+        ('hub', 'temp_humidity', temp_humidity_log_file),
+        ('hub', 'soil_moisture', soil_moisture_log_file)
+    ]
+    for node_id in list_node_ids():
+        for series in ('temp_humidity', 'soil_moisture'):
+            sources.append((node_id, series, node_log_file(node_id, series)))
+    return sources
+
 @app.route('/trends')
 def trends():
-    """Retourne les tendances (min, max, moyennes) pour les dernières 24h"""
-    trends_data = {
-        'temperature': {'min': None, 'max': None, 'avg': None},
-        'air_humidity': {'min': None, 'max': None, 'avg': None},
-        'soil_moisture': {'min': None, 'max': None, 'avg': None}
-    }
+    """Retourne les tendances (min, max, moyennes) pour les dernières 24h
     
+    Paramètre optionnel 'source' : 'hub' (par défaut) ou identifiant d'un nœud
+    """
+    return jsonify(build_trends_section(request.args.get('source', 'hub')))
+
+@app.route('/api/percentiles')
+def api_percentiles():
+    """Percentiles p5, p50, p95 sur une période quelconque
+    
+    Paramètres : source ('hub' ou nœud), metric (temperature, air_humidity, soil_moisture),
+    puis soit hours (24 par défaut), soit start et end (ISO 8601)
+    """
     try:
-        cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=24)
+        source = request.args.get('source', 'hub')
+        metric = request.args.get('metric', 'soil_moisture')
+        if metric not in ('temperature', 'air_humidity', 'soil_moisture'):
+            return jsonify({'status': 'error', 'message': f'Métrique inconnue : {metric}'}), 400
         
-        # Tendances température et humidité air
-        try:
-            with open(temp_humidity_log_file, "r") as file:
-                lines = file.readlines()
-            
-            temps = []
-            hums = []
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    parts = line.split(", ")
-                    if len(parts) >= 3:
-                        timestamp_str = parts[0]
-                        temp_str = parts[1]
-                        hum_str = parts[2]
-                        
-                        if temp_str and temp_str.lower() != 'none' and hum_str and hum_str.lower() != 'none':
-                            timestamp = parse_timestamp(timestamp_str)
-                            if timestamp and timestamp >= cutoff_time:
-                                temps.append(float(temp_str))
-                                hums.append(float(hum_str))
-                except:
-                    continue
-            
-            if temps:
-                trends_data['temperature'] = {
-                    'min': round(min(temps), 1),
-                    'max': round(max(temps), 1),
-                    'avg': round(sum(temps) / len(temps), 1)
-                }
-            if hums:
-                trends_data['air_humidity'] = {
-                    'min': round(min(hums), 1),
-                    'max': round(max(hums), 1),
-                    'avg': round(sum(hums) / len(hums), 1)
-                }
-        except:
-            pass
+        if request.args.get('start'):
+            start = datetime.datetime.fromisoformat(request.args['start'])
+            end = datetime.datetime.fromisoformat(request.args['end']) if request.args.get('end') else clock.now()
+        else:
+            end = clock.now()
+            start = end - datetime.timedelta(hours=request.args.get('hours', 24, type=float))
         
-        # Tendances humidité du sol
-        try:
-            with open(soil_moisture_log_file, "r") as file:
-                lines = file.readlines()
-            
-            moistures = []
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    parts = line.split(", ")
-                    if len(parts) >= 2:
-                        timestamp_str = parts[0]
-                        moisture_str = parts[1]
-                        
-                        if moisture_str and moisture_str.lower() != 'none':
-                            timestamp = parse_timestamp(timestamp_str)
-                            if timestamp and timestamp >= cutoff_time:
-                                moistures.append(float(moisture_str))
-                except:
-                    continue
-            
-            if moistures:
-                trends_data['soil_moisture'] = {
-                    'min': round(min(moistures), 1),
-                    'max': round(max(moistures), 1),
-                    'avg': round(sum(moistures) / len(moistures), 1)
-                }
-        except:
-            pass
-            
+        result = sensor_sketches.query(source, metric, start, end)
+        return jsonify({
+            'status': 'success',
+            'source': source,
+            'metric': metric,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'percentiles': result
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Période invalide : {e}'}), 400
+    except Exception as e:
+        print(f"Erreur lors du calcul des percentiles : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/cubes')
+def api_cubes():
+    """Agrégats par heure de la semaine ou par jour de l'année, pour les cartes de chaleur
+    
+    Paramètres : source ('hub' ou nœud), metric (temperature, air_humidity, soil_moisture,
+    soil_moisture_rate), kind (hour_of_week ou day_of_year).
+    Sans paramètre, retourne la liste des sources et métriques disponibles.
+    """
+    try:
+        if 'metric' not in request.args:
+            available = [{'source': source, 'metric': metric} for source, metric in sensor_cubes.keys()]
+            return jsonify({'status': 'success', 'kinds': list(CUBE_BINS), 'available': available})
+        
+        source = request.args.get('source', 'hub')
+        metric = request.args['metric']
+        kind = request.args.get('kind', 'hour_of_week')
+        if kind not in CUBE_BINS:
+            return jsonify({'status': 'error', 'message': f'Découpage inconnu : {kind}'}), 400
+        
+        cube = sensor_cubes.query(source, metric, kind)
+        if cube is None:
+            return jsonify({'status': 'error', 'message': f'Aucune donnée pour {source} / {metric}'}), 404
+        return jsonify({
+            'status': 'success',
+            'source': source,
+            'metric': metric,
+            'kind': kind,
+            'bins': cube
+        })
+    except Exception as e:
+        print(f"Erreur lors de la lecture des cubes d'agrégats : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/zones')
+def api_zones():
+    """Sondes d'humidité du hub : zone, entrée, scénario, dernière mesure et décision"""
+    try:
+        snapshot = sensor_service.latest()
+        zones = []
+        for probe in soil_scanner.probes:
+            zone = probe['zone']
+            if zone == PRIMARY_ZONE:
+                zones.append({
+                    'zone': zone,
+                    'address': f"0x{probe['address']:02x}",
+                    'channel': f"P{probe['channel']}",
+                    'scenario': load_config_cached().get('current_scenario'),
+                    'soil_moisture': snapshot.get('soil_moisture'),
+                    'soil_moisture_noise': snapshot.get('soil_moisture_noise'),
+                    'status': snapshot.status('soil_moisture'),
+                    'pump_status': read_pump_status()
+                })
+            else:
+                zones.append(zone_states.get(zone, {'zone': zone, 'status': snapshot.status(probe_metric(zone))}))
+        return jsonify({'status': 'success', 'zones': zones})
     except Exception as e:
-        print(f"Erreur lors du calcul des tendances: {e}")
+        print(f"Erreur lors de la lecture des zones : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@cached_query(series=['hub', 'hub:watering'], time_bucket=60)
+def build_statistics_section(days=None):
+    """Statistiques d'arrosage (compteurs persistants) et moyennes des capteurs sur 24h
+    
+    Args:
+        days: si renseigné, ajoute les cumuls journaliers des 'days' derniers jours
+    """
+    watering = watering_counters.snapshot()
+    total_duration = watering['total_duration']
+    trends_data = build_trends_section()
     
-    return jsonify(trends_data)
+    stats = {
+        'today_waterings': watering['today_waterings'],
+        'total_waterings': watering['total_waterings'],
+        # Volume d'eau mesuré par le débitmètre, estimé (0.3 L/min) pour les autres arrosages
+        'total_water_volume': round(watering['total_volume'], 2),
+        'today_water_volume': round(watering['today_volume'], 2),
+        'metered_waterings': watering['metered_waterings'],
+        'avg_temperature': trends_data['temperature']['avg'],
+        'avg_air_humidity': trends_data['air_humidity']['avg'],
+        'avg_soil_moisture': trends_data['soil_moisture']['avg'],
+        'last_watering': watering['last_watering'],
+        'pump_total_time': round(total_duration / 60, 2)  # En minutes
+    }
+    if days:
+        stats['daily'] = watering_counters.daily_series(days)
+    return stats
 
 @app.route('/statistics')
 def statistics():
-    """Retourne les statistiques du système"""
-    stats = {
-        'today_waterings': 0,
-        'total_waterings': 0,
-        'total_water_volume': 0.0,
-        'avg_temperature': None,
-        'avg_air_humidity': None,
-        'avg_soil_moisture': None,
-        'last_watering': None,
-        'pump_total_time': 0.0
+    """Retourne les statistiques du système (paramètre optionnel 'days' pour les cumuls journaliers)"""
+    return jsonify(build_statistics_section(request.args.get('days', type=int)))
+
+@app.route('/api/cache_stats')
+def api_cache_stats():
+    """Compteurs du cache de requêtes et du pool de processus analytiques"""
+    return jsonify({'status': 'success', 'cache': query_cache.stats(), 'query_pool': query_pool.stats()})
+
+def query_error_response(error):
+    """Réponse HTTP d'une requête analytique refusée (503) ou annulée (504)"""
+    print(f"Requête analytique non aboutie : {error}")
+    status_code = 503 if isinstance(error, QueryPoolBusy) else 504
+    return jsonify({'status': 'error', 'message': str(error)}), status_code
+
+# Dashboard groupé : durée de validité (secondes) de chaque section
+DASHBOARD_SECTION_TTL = {
+    'data': 5,
+    'alerts': 10,
+    'statistics': 30,
+    'trends': 60,
+    'history': 60
+}
+_dashboard_cache = {}  # section -> (timestamp de calcul, valeur)
+_dashboard_computing = set()  # sections en cours de calcul par une requête
+_dashboard_lock = threading.Lock()  # protège le cache, jamais tenu pendant un calcul
+
+def compute_dashboard_sections(sections):
+    """Recalcule les sections demandées avec une seule lecture des capteurs et des logs
+
+    Returns:
+        tuple: ({section: valeur}, {section: message d'erreur}) ; une section en
+        erreur n'empêche pas le calcul des autres
+    """
+    results = {}
+    errors = {}
+    readings = None
+    if {'data', 'alerts'} & sections:
+        try:
+            readings = read_hub_sensors()
+        except Exception as e:
+            errors.update((name, str(e)) for name in {'data', 'alerts'} & sections)
+    
+    builders = {
+        'data': lambda: build_data_section(readings),
+        'alerts': lambda: {'alerts': build_alerts(readings, read_last_watering_timestamp())},
+        'history': hub_sensor_history,
+        'trends': build_trends_section,
+        'statistics': build_statistics_section
     }
+    for name in sections:
+        if name in errors:
+            continue
+        try:
+            results[name] = builders[name]()
+        except Exception as e:
+            errors[name] = str(e)
+    for name, message in errors.items():
+        print(f"Erreur lors du calcul de la section {name} du dashboard : {message}")
+    return results, errors
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    """Regroupe /data, /alerts, /statistics, /trends et /temperature_humidity_history
     
+    Paramètre 'sections' (séparées par des virgules) : sections voulues, toutes par défaut.
+    Une section encore valide est servie depuis le cache, partagé entre tous les onglets.
+    Les sections périmées sont recalculées hors du verrou : une section lente ne
+    bloque pas les autres requêtes, qui reçoivent sa valeur précédente pendant le calcul.
+    Une section dont le calcul échoue est servie avec sa valeur précédente (ou
+    omise s'il n'y en a pas) et son erreur est indiquée dans 'errors'.
+    """
     try:
-        # Statistiques d'arrosage
-        today = datetime.datetime.now().date()
-        with open(log_file, "r") as file:
-            lines = file.readlines()
+        requested = request.args.get('sections')
+        if requested:
+            sections = [name for name in requested.split(',') if name in DASHBOARD_SECTION_TTL]
+        else:
+            sections = list(DASHBOARD_SECTION_TTL)
         
-        total_duration = 0.0
-        last_watering_timestamp = None
+        with _dashboard_lock:
+            now = clock.time()
+            stale = {
+                name for name in sections
+                if name not in _dashboard_cache or now - _dashboard_cache[name][0] >= DASHBOARD_SECTION_TTL[name]
+            }
+            # Une section déjà en calcul n'est recalculée que si aucune valeur n'est en cache
+            stale = {name for name in stale if name not in _dashboard_computing or name not in _dashboard_cache}
+            _dashboard_computing.update(stale)
         
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+        errors = {}
+        if stale:
+            computed = {}
             try:
-                parts = line.split(", ")
-                if len(parts) >= 2:
-                    timestamp_str = parts[0]
-                    duration = float(parts[1])
-                    total_duration += duration
-                    stats['total_waterings'] += 1
-                    
-                    # Vérifier si c'est aujourd'hui
-                    timestamp = parse_timestamp(timestamp_str)
-                    if timestamp:
-                        if timestamp.date() == today:
-                            stats['today_waterings'] += 1
-                        
-                        # Garder le dernier arrosage
-                        if last_watering_timestamp is None or timestamp > last_watering_timestamp:
-                            last_watering_timestamp = timestamp
-                            stats['last_watering'] = timestamp_str
-            except Exception as e:
-                print(f"Erreur lors du parsing de la ligne d'arrosage: {line}, erreur: {e}")
-                continue
-        
-        stats['pump_total_time'] = round(total_duration / 60, 2)  # En minutes
-        
-        # Calculer le volume d'eau (approximatif : 0.3 L/min)
-        stats['total_water_volume'] = round(total_duration * 0.3 / 60, 2)
+                computed, errors = compute_dashboard_sections(stale)
+            finally:
+                with _dashboard_lock:
+                    _dashboard_computing.difference_update(stale)
+                    for name, value in computed.items():
+                        if name not in _dashboard_cache or _dashboard_cache[name][0] <= now:
+                            _dashboard_cache[name] = (now, value)
         
-        # Statistiques des capteurs (dernières 24h)
-        try:
-            with open(temp_humidity_log_file, "r") as file:
-                lines = file.readlines()
-            
-            temps = []
-            hums = []
-            cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=24)
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    parts = line.split(", ")
-                    if len(parts) >= 3:
-                        timestamp_str = parts[0]
-                        temp = float(parts[1])
-                        hum = float(parts[2])
-                        timestamp = parse_timestamp(timestamp_str)
-                        if timestamp and timestamp >= cutoff_time:
-                            temps.append(temp)
-                            hums.append(hum)
-                except:
-                    continue
-            
-            if temps:
-                stats['avg_temperature'] = round(sum(temps) / len(temps), 1)
-            if hums:
-                stats['avg_air_humidity'] = round(sum(hums) / len(hums), 1)
-        except:
-            pass
+        with _dashboard_lock:
+            cached = {name: _dashboard_cache[name] for name in sections if name in _dashboard_cache}
         
-        # Statistiques humidité du sol (dernières 24h)
-        try:
-            with open(soil_moisture_log_file, "r") as file:
-                lines = file.readlines()
-            
-            moistures = []
-            cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=24)
-            
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    parts = line.split(", ")
-                    if len(parts) >= 2:
-                        timestamp_str = parts[0]
-                        moisture = float(parts[1])
-                        timestamp = parse_timestamp(timestamp_str)
-                        if timestamp and timestamp >= cutoff_time:
-                            moistures.append(moisture)
-                except:
-                    continue
-            
-            if moistures:
-                stats['avg_soil_moisture'] = round(sum(moistures) / len(moistures), 1)
-        except:
-            pass
-            
+        return jsonify({
+            'status': 'success',
+            'sections': {name: value for name, (_, value) in cached.items()},
+            'errors': errors,
+            'freshness': {
+                name: {
+                    'computed_at': datetime.datetime.fromtimestamp(computed_at).isoformat(),
+                    'age': round(now - computed_at, 1),
+                    'max_age': DASHBOARD_SECTION_TTL[name]
+                }
+                for name, (computed_at, _) in cached.items()
+            }
+        })
     except Exception as e:
-        print(f"Erreur lors du calcul des statistiques: {e}")
-    
-    return jsonify(stats)
+        print(f"Erreur lors de la construction du dashboard : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/manual_pump_control', methods=['POST'])
 def manual_pump_control():
     """Contrôle manuel de la pompe"""
-    global pump_on_time, watering_duration_minutes
-    
     try:
         data = request.get_json()
         action = data.get('action')  # 'start' ou 'stop'
         duration = data.get('duration', 1)  # Durée en minutes (par défaut 1 minute)
         
         if action == 'start':
-            # Démarrer la pompe
-            if GPIO.input(18) == 1:  # Si la pompe est éteinte
-                GPIO.output(18, GPIO.LOW)  # Allumer la pompe
-                pump_on_time = datetime.datetime.now()
-                watering_duration_minutes = float(duration)
+            # Démarrer la pompe (refusé par le contrôleur si elle est déjà allumée) ;
+            # commande manuelle prioritaire, comptée dans les plafonds des zones
+            result = control_call('pump_start', duration=duration, source='manuel')
+            if result['accepted']:
                 return jsonify({'status': 'success', 'message': f'Pompe démarrée pour {duration} minute(s)'})
-            else:
-                return jsonify({'status': 'error', 'message': 'La pompe est déjà allumée'}), 400
+            return jsonify({'status': 'error', 'message': result['message']}), 400
         
         elif action == 'stop':
             # Arrêter la pompe
-            GPIO.output(18, GPIO.HIGH)  # Éteindre la pompe
-            if pump_on_time:
-                pump_off_time = datetime.datetime.now()
-                duration_seconds = (pump_off_time - pump_on_time).total_seconds()
-                record_arrosage(pump_on_time, duration_seconds)
-                pump_on_time = None
-                watering_duration_minutes = None
-            return jsonify({'status': 'success', 'message': 'Pompe arrêtée'})
+            result = control_call('pump_stop', reason='manuel')
+            if result['accepted']:
+                return jsonify({'status': 'success', 'message': 'Pompe arrêtée'})
+            return jsonify({'status': 'error', 'message': result['message']}), 500
         
         else:
             return jsonify({'status': 'error', 'message': 'Action invalide'}), 400
@@ -1086,13 +1607,34 @@ def manual_pump_control():
 
 @app.route('/export_data', methods=['GET'])
 def export_data():
-    """Exporte les données en CSV"""
+    """Exporte les données en CSV, JSON ou archive NumPy (.npz)"""
     try:
         data_type = request.args.get('type', 'all')  # 'all', 'watering', 'sensors', 'soil'
-        format_type = request.args.get('format', 'csv')  # 'csv' ou 'json'
+        format_type = request.args.get('format', 'csv')  # 'csv', 'json' ou 'npz'
         
         from flask import Response
         
+        if format_type == 'npz':
+            # Colonnes typées pour le hub et tous les nœuds, chargées en bloc
+            series_by_type = {
+                'all': ['watering', 'temp_humidity', 'soil_moisture'],
+                'watering': ['watering'],
+                'sensors': ['temp_humidity'],
+                'soil': ['soil_moisture']
+            }
+            hub_files = {
+                'watering': log_file,
+                'temp_humidity': temp_humidity_log_file,
+                'soil_moisture': soil_moisture_log_file
+            }
+            content = query_pool.run(build_npz_export, hub_files, series_by_type.get(data_type, series_by_type['all']),
+                                     exported_at=clock.now())
+            return Response(
+                content,
+                mimetype='application/octet-stream',
+                headers={'Content-Disposition': f'attachment; filename=homegarden_export_{data_type}_{clock.now().strftime("%Y%m%d_%H%M%S")}.npz'}
+            )
+        
         if data_type == 'watering' or data_type == 'all':
             # Exporter l'historique d'arrosage
             try:
@@ -1141,9 +1683,11 @@ def export_data():
             return Response(
                 csv_content,
                 mimetype='text/csv',
-                headers={'Content-Disposition': f'attachment; filename=homegarden_export_{data_type}_{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'}
+                headers={'Content-Disposition': f'attachment; filename=homegarden_export_{data_type}_{clock.now().strftime("%Y%m%d_%H%M%S")}.csv'}
             )
             
+    except QueryError as e:
+        return query_error_response(e)
     except Exception as e:
         print(f"Erreur lors de l'export: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1193,6 +1737,7 @@ def api_register_node():
         }
         
         node = register_node(node_id, node_info)
+        event_publisher.publish('node', {'node': node}, key=f'node:{node_id}')
         print(f"Nœud enregistré/mis à jour : {node_id} ({node_info['name']})")
         return jsonify({'status': 'success', 'node': node})
     except Exception as e:
@@ -1223,7 +1768,8 @@ def api_node_data(node_id):
             'solar_charging': data.get('solar_charging', False),
             'ip_address': request.remote_addr
         }
-        register_node(node_id, node_info)
+        node = register_node(node_id, node_info)
+        event_publisher.publish('node', {'node': node, 'data': sensor_data}, key=f'node:{node_id}')
         
         # Charger la configuration pour déterminer l'action
         try:
@@ -1243,21 +1789,35 @@ def api_node_data(node_id):
         
         # Logique de décision (simplifiée - peut être étendue)
         if not config.get('maintenance_mode', False):
-            scenarios = config.get('scenarios', {}).get(config.get('current_scenario', 'Monstera deliciosa'), [])
-            soil_moisture = sensor_data.get('soil_moisture')
-            
-            if soil_moisture is not None:
-                for scenario in scenarios:
-                    soil_condition = scenario.get("Humidity of soil (%)", "")
-                    if eval_condition(soil_moisture, soil_condition):
-                        action = scenario.get("Action", "Pas d'arrosage")
-                        if action in ["Arroser", "Arroser légèrement"]:
-                            response['action'] = 'water'
-                            duration = scenario.get("Watering duration (minutes)", 1)
-                            if config.get('vacation_mode', False):
-                                duration = duration * 0.5
-                            response['duration'] = duration
-                        break
+            plant = config.get('current_scenario', 'Monstera deliciosa')
+            scenarios = config.get('scenarios', {}).get(plant, [])
+            scenario = match_scenario(plant, scenarios, sensor_data.get('soil_moisture'),
+                                      sensor_data.get('temperature'), sensor_data.get('air_humidity'))
+            action = scenario.get("Action", "Pas d'arrosage") if scenario is not None else None
+            if action in ["Arroser", "Arroser légèrement"]:
+                duration = scenario.get("Watering duration (minutes)", 1)
+                if config.get('vacation_mode', False):
+                    duration = duration * 0.5
+                # Créneau du planificateur de zones : 'water' seulement quand il commence,
+                # sinon 'wait' avec l'heure de début (le nœud redemande à son prochain envoi)
+                try:
+                    slot = control_call('zone_request', zone=node_id, duration=duration,
+                                        settings=config.get('zone_scheduler'))
+                except ControlError as e:
+                    print(f"Créneau du nœud {node_id} indisponible : {e}")
+                    return jsonify({'status': 'error', 'message': str(e)}), 503
+                response['slot'] = slot['slot']
+                if slot['granted']:
+                    response['action'] = 'water'
+                    response['duration'] = duration
+                elif not slot['started']:
+                    response['action'] = 'wait'
+                    response['duration'] = duration
+            else:
+                try:
+                    control_call('zone_cancel', zone=node_id)
+                except ControlError as e:
+                    print(f"Annulation du créneau du nœud {node_id} impossible : {e}")
         
         print(f"Données reçues du nœud {node_id}: {sensor_data}")
         return jsonify(response)
@@ -1265,6 +1825,26 @@ def api_node_data(node_id):
         print(f"Erreur lors de la réception des données du nœud {node_id}: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/zone_schedule', methods=['GET'])
+def api_zone_schedule():
+    """Zones en cours d'arrosage et file d'attente des créneaux"""
+    try:
+        return jsonify({'status': 'success', **control_call('zone_status')})
+    except Exception as e:
+        print(f"Erreur lors de la lecture du planificateur de zones : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/control', methods=['GET'])
+def api_control():
+    """État de la boucle de contrôle : processus, priorité, retard maximal, capteurs"""
+    try:
+        status = control_call('status')
+        status['mode'] = 'process' if control_client is not None else 'thread'
+        return jsonify({'status': 'success', **status})
+    except Exception as e:
+        print(f"Erreur lors de la lecture de l'état de la boucle de contrôle : {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/nodes', methods=['GET'])
 def api_get_nodes():
     """Récupère la liste de tous les nœuds"""
@@ -1287,6 +1867,8 @@ def api_get_node(node_id):
             return jsonify({'status': 'success', 'node': node})
         else:
             return jsonify({'status': 'error', 'message': 'Nœud non trouvé'}), 404
+    except QueryError as e:
+        return query_error_response(e)
     except Exception as e:
         print(f"Erreur lors de la récupération du nœud {node_id}: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1314,7 +1896,10 @@ def api_control_node(node_id):
         print(f"Erreur lors du contrôle du nœud {node_id}: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-if __name__ == '__main__':
+def initialize_data_files():
+    """Crée les logs vides et data.json (scénarios par défaut, paramètres) s'ils manquent"""
+    global maintenance_mode, vacation_mode, scheduled_waterings
+
     # Vérifier si le fichier log existe au démarrage, sinon le créer.
     if not os.path.exists(log_file):
         with open(log_file, "w") as file:
@@ -1328,7 +1913,18 @@ if __name__ == '__main__':
         with open(soil_moisture_log_file, "w") as file:
             pass  # Créer simplement un fichier vide.
 
-    if not os.path.exists(data_file):
+    # Réglages déjà présents sans scénarios (ex. graine de la simulation) : gardés,
+    # complétés par les scénarios par défaut
+    existing_config = {}
+    if os.path.exists(data_file):
+        try:
+            with open(data_file, 'r') as file:
+                existing_config = json.load(file)
+        except Exception as e:
+            print(f"Erreur lors de la lecture de {data_file}: {e}")
+            existing_config = None
+
+    if existing_config is not None and 'scenarios' not in existing_config:
         # Initialiser le fichier data.json avec les scénarios
         initial_config = {
             "scenarios": {
@@ -1569,6 +2165,7 @@ if __name__ == '__main__':
             },
             "current_scenario": "Monstera deliciosa"
         }
+        initial_config.update(existing_config)
         with open(data_file, 'w') as file:
             json.dump(initial_config, file)
 
@@ -1596,15 +2193,112 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"Erreur lors de l'initialisation des paramètres: {e}")
 
+def start_acquisition(stepping=False, interval_scale=1.0):
+    """Débitmètre et capteurs, dans le processus qui possède le matériel"""
+    start_flow_meter()
+    # Acquisition des capteurs (ADS1115 en conversion continue si configuré)
+    soil_scanner.configure(hal.adc_modes)
+    if stepping:
+        sensor_service.start_stepping(interval_scale)
+    else:
+        sensor_service.start()
+
+def start_services(stepping=False, interval_scale=1.0):
+    """Démarre le matériel, l'acquisition, le contrôleur de pompe et la boucle de
+    contrôle dans ce processus (processus de contrôle désactivé, simulation)
+
+    Avec 'stepping' (simulation en temps virtuel), aucun thread n'est lancé :
+    retourne les composants à faire avancer par clock.run_events() ; les
+    périodes de la boucle de contrôle et des capteurs sont multipliées par
+    'interval_scale'.
+    """
     # Initialiser l'état de la pompe (la pompe doit être éteinte par défaut)
-    GPIO.output(18, GPIO.HIGH)
+    hal.write_pin(PUMP_PIN, True)
 
-    # Démarrer le thread de surveillance
+    # Processus de calcul créés avant tout autre thread
+    query_pool.start()
+
+    start_acquisition(stepping, interval_scale)
+
+    # Reconstruire les agrégats en mémoire (fenêtres 24h, esquisses de quantiles)
+    warm_from_logs(sensor_log_sources())
+    watering_counters.load()
+
+    if stepping:
+        pump.start_stepping()
+        control_scheduler.schedule_every(CONTROL_INTERVAL * interval_scale, control_tick, name='control')
+        return [control_scheduler, pump, sensor_service, hal]
+
+    # Contrôleur de la pompe (éteint la pompe à son démarrage), puis boucle de contrôle
+    pump.start_thread()
     thread = threading.Thread(target=monitor_humidity)
     thread.daemon = True
     thread.start()
-    
+
+def run_control_process(settings):
+    """Point d'entrée du processus de contrôle : matériel, acquisition, pompe et
+    boucle de contrôle, à priorité élevée ; commandes et événements par la socket"""
+    global control_server
+    raise_priority(settings['nice'])
+    hal.write_pin(PUMP_PIN, True)
+    control_server = ControlServer(settings['socket'], CONTROL_COMMANDS, initial_events=control_initial_events,
+                                   state_kinds=('row', 'watering'))
+    control_server.start()
+    start_acquisition()
+    pump.start_thread()
+    threading.Thread(target=forward_sensor_snapshots, name='snapshot-forwarder', daemon=True).start()
+    watch_parent(stop_control_process)
+    try:
+        monitor_humidity()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_control_process()
+
+def stop_control_process():
+    """Éteint la pompe, libère le matériel et termine le processus de contrôle"""
+    pump.stop("arrêt du processus de contrôle")
+    hal.cleanup()
+    os._exit(0)
+
+def watch_control_process():
+    """Le serveur web s'arrête avec le processus de contrôle (relancés ensemble par systemd)"""
+    _control_process.join()
+    print(f"⚠️ Processus de contrôle arrêté (code {_control_process.exitcode}), arrêt du serveur web")
+    os._exit(1)
+
+def start_control_process_and_web(settings):
+    """Boucle de contrôle dans son propre processus, serveur web dans celui-ci"""
+    global control_client, _control_process
+    # Processus de contrôle puis processus de calcul créés avant tout autre thread
+    _control_process = start_control_process(run_control_process, settings)
+    query_pool.start()
+
+    # Abonnement avant la relecture des logs : aucune ligne écrite entre les deux
+    # n'est perdue, celles déjà relues sont ignorées à la reprise
+    control_client = ControlClient(settings['socket'])
+    control_client.subscribe(receive_control_event, on_reconnect=resync_from_logs)
+    if not control_client.wait_subscribed(SUBSCRIBE_TIMEOUT):
+        print("Processus de contrôle injoignable, agrégats construits depuis les logs seulement")
+
+    # Agrégats en mémoire et compteurs : tenus par le serveur web, alimentés par les événements
+    warm_from_logs(sensor_log_sources())
+    watering_counters.load()
+    replay_control_events()
+    threading.Thread(target=watch_control_process, name='control-watchdog', daemon=True).start()
+
+if __name__ == '__main__':
+    initialize_data_files()
+    control_settings = control_process_settings(_hardware_config)
+    if control_settings:
+        start_control_process_and_web(control_settings)
+    else:
+        start_services()
+
     try:
-        app.run(host='0.0.0.0', port=5000)
+        app.run(host='0.0.0.0', port=5000, threaded=True)  # threaded : un thread par flux SSE
     except KeyboardInterrupt:
-        GPIO.cleanup()
+        if not control_settings:
+            hal.cleanup()
+    finally:
+        query_pool.shutdown()
@@ -0,0 +1,88 @@
+"""
+Horloge de l'application
+Toutes les lectures de l'heure et les attentes passent par l'instance unique
+'clock'. En fonctionnement normal elle délègue à datetime et time ; en
+simulation elle est virtuelle : le temps ne s'écoule pas, il saute d'une
+échéance à la suivante (tour de contrôle, lecture d'un capteur, arrêt de la
+pompe, envoi d'un nœud). Une année simulée ne coûte que le calcul de ses
+événements, et chaque événement a lieu exactement à son heure.
+
+En temps virtuel, aucun thread n'attend le temps : les composants sont avancés
+pas à pas par run_events() dans un seul thread, et sleep() fait avancer
+l'horloge de la durée d'un travail simulé (latence d'un capteur).
+"""
+import time
+import datetime
+
+
+class Clock:
+    """Heure courante, temps monotone et attentes, réels ou virtuels"""
+
+    def __init__(self):
+        self._virtual = None  # temps virtuel (secondes epoch), None en temps réel
+
+    @property
+    def virtual(self):
+        return self._virtual is not None
+
+    def virtualize(self, start=None):
+        """Passe en temps virtuel à partir de 'start' (datetime, maintenant par défaut)
+
+        À appeler avant de créer les objets de l'application : l'heure ne change
+        ensuite que par sleep(), advance_to() et run_events().
+        """
+        self._virtual = start.timestamp() if start is not None else time.time()
+
+    def time(self):
+        """Secondes depuis l'epoch (comme time.time())"""
+        if self._virtual is None:
+            return time.time()
+        return self._virtual
+
+    def monotonic(self):
+        """Temps monotone (comme time.monotonic()), dans l'échelle de l'horloge"""
+        if self._virtual is None:
+            return time.monotonic()
+        return self._virtual
+
+    def now(self):
+        if self._virtual is None:
+            return datetime.datetime.now()
+        return datetime.datetime.fromtimestamp(self._virtual)
+
+    def today(self):
+        return self.now().date()
+
+    def sleep(self, seconds):
+        if self._virtual is None:
+            time.sleep(max(0.0, seconds))
+        else:
+            self._virtual += max(0.0, seconds)
+
+    def advance_to(self, timestamp):
+        """Temps virtuel : avance jusqu'à 'timestamp' (jamais en arrière)"""
+        self._virtual = max(self._virtual, timestamp)
+
+    def run_events(self, components, until):
+        """Temps virtuel : exécute les événements des composants jusqu'à 'until'
+
+        Args:
+            components: objets avec next_deadline() (échéance monotone de leur
+                prochain événement, None s'il n'y en a pas) et run_due() (exécute
+                les événements échus)
+            until: échéance monotone de fin ; l'horloge s'y arrête
+        """
+        while True:
+            deadlines = [deadline for deadline in (component.next_deadline() for component in components)
+                         if deadline is not None]
+            next_event = min(deadlines, default=None)
+            if next_event is None or next_event > until:
+                self.advance_to(until)
+                return
+            self.advance_to(next_event)
+            for component in components:
+                component.run_due()
+
+
+# Instance unique partagée par tous les modules
+clock = Clock()
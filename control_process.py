@@ -0,0 +1,293 @@
+"""
+Processus de contrôle
+La boucle de contrôle, le service d'acquisition et le contrôleur de pompe
+tournent dans un processus séparé du serveur web, à priorité d'ordonnancement
+élevée : les requêtes lourdes de Flask (relecture de logs, exports) ne prennent
+plus le GIL de l'arrêt de la pompe ni des lectures de capteurs.
+
+Le serveur web lui parle par une socket Unix, en lignes JSON :
+- commandes : {"command": nom, ...arguments} -> {"status": "success", "result": ...}
+  ou {"status": "error", "message": ...}, une connexion par commande ;
+- événements : après {"command": "subscribe"}, la connexion reçoit un flux
+  {"kind": ..., "payload": ...} (lectures, état de la pompe, lignes à
+  enregistrer), précédé de l'état courant.
+L'envoi des événements ne bloque jamais la boucle de contrôle. Les événements
+d'état (lignes de log, arrosages) ne sont jamais abandonnés : si un abonné en
+accumule trop, sa connexion est fermée et le serveur web, à sa reconnexion,
+relit dans les logs ce qui lui manque (comme après une déconnexion). Les
+autres événements (lectures, état de la pompe) en trop sont abandonnés et
+comptés : l'état courant est renvoyé à chaque reconnexion.
+"""
+import os
+import json
+import queue
+import socket
+import threading
+import multiprocessing
+
+# Réglages par défaut, surchargés par la clé "control_process" de data.json
+DEFAULT_CONTROL_PROCESS = {
+    'enabled': True,
+    'socket': "homegarden_control.sock",   # relatif au répertoire des données
+    'nice': -10                            # priorité du processus (-20 = la plus haute)
+}
+# Délai maximal d'une commande (secondes), démarrage de pompe compris
+CALL_TIMEOUT = 10.0
+# Événements en attente par abonné avant abandon (événements sans état)
+EVENT_QUEUE_SIZE = 1000
+# Événements en attente par abonné avant fermeture de sa connexion (événements d'état)
+STATE_QUEUE_SIZE = 20000
+# Attente avant une nouvelle tentative de connexion de l'abonné (secondes)
+RECONNECT_DELAY = 1.0
+# Période de vérification de la présence du serveur web (secondes)
+PARENT_CHECK_INTERVAL = 1.0
+
+
+class ControlError(Exception):
+    """Commande refusée ou processus de contrôle injoignable"""
+
+
+def control_process_settings(config):
+    """Réglages validés du processus de contrôle, None s'il est désactivé"""
+    settings = dict(DEFAULT_CONTROL_PROCESS)
+    settings.update((config or {}).get('control_process') or {})
+    if not settings.get('enabled', True):
+        return None
+    try:
+        settings['nice'] = max(-20, min(19, int(settings['nice'])))
+    except (TypeError, ValueError) as e:
+        print(f"Priorité du processus de contrôle invalide, valeur par défaut : {e}")
+        settings['nice'] = DEFAULT_CONTROL_PROCESS['nice']
+    return settings
+
+
+def raise_priority(niceness):
+    """Applique la priorité au processus courant (une priorité négative demande
+    les droits root, CAP_SYS_NICE ou LimitNICE= dans le service systemd)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, niceness)
+        print(f"Processus de contrôle : priorité {niceness}")
+    except OSError as e:
+        print(f"Priorité {niceness} refusée ({e}), processus de contrôle à la priorité "
+              f"{os.getpriority(os.PRIO_PROCESS, 0)}")
+
+
+def _send(connection, message):
+    connection.sendall((json.dumps(message, default=str) + "\n").encode())
+
+
+class _Subscriber:
+    """File d'événements d'un abonné ; 'overflowed' quand un événement d'état n'a pu y entrer"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.overflowed = False
+
+
+class ControlServer:
+    """Côté processus de contrôle : commandes et diffusion des événements
+
+    Args:
+        path: chemin de la socket Unix
+        commands: {nom: fonction(**arguments) -> résultat sérialisable en JSON}
+        initial_events: fonction -> [(type, données)] envoyée à chaque nouvel abonné
+        state_kinds: types d'événements jamais abandonnés (voir le module)
+    """
+
+    def __init__(self, path, commands, initial_events=None, state_kinds=()):
+        self.path = path
+        self.commands = commands
+        self.initial_events = initial_events
+        self.state_kinds = frozenset(state_kinds)
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._socket = None
+        self.dropped = 0
+        self.overflows = 0
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # socket d'une exécution précédente
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._socket.listen(16)
+        threading.Thread(target=self._accept, name='control-server', daemon=True).start()
+
+    def _accept(self):
+        while True:
+            connection, _ = self._socket.accept()
+            threading.Thread(target=self._serve, args=(connection,), name='control-connection',
+                             daemon=True).start()
+
+    def _serve(self, connection):
+        with connection:
+            try:
+                line = connection.makefile('r').readline()
+                if not line:
+                    return
+                message = json.loads(line)
+                command = message.pop('command', None)
+                if command == 'subscribe':
+                    self._stream(connection)
+                    return
+                _send(connection, self._execute(command, message))
+            except (OSError, ValueError) as e:
+                print(f"Connexion au processus de contrôle interrompue : {e}")
+
+    def _execute(self, command, arguments):
+        handler = self.commands.get(command)
+        if handler is None:
+            return {'status': 'error', 'message': f"Commande inconnue : {command}"}
+        try:
+            return {'status': 'success', 'result': handler(**arguments)}
+        except Exception as e:
+            print(f"Erreur de la commande {command} : {e}")
+            return {'status': 'error', 'message': str(e)}
+
+    def _stream(self, connection):
+        subscriber = _Subscriber()
+        if self.initial_events:
+            for kind, payload in self.initial_events():
+                subscriber.events.put_nowait((kind, payload))
+        with self._lock:
+            self._subscribers.append(subscriber)
+        try:
+            while True:
+                event = subscriber.events.get()
+                if subscriber.overflowed:
+                    # Fermeture : l'abonné se reconnecte et relit les logs
+                    print("Abonné aux événements en retard, connexion fermée pour resynchronisation")
+                    return
+                kind, payload = event
+                _send(connection, {'kind': kind, 'payload': payload})
+        finally:
+            with self._lock:
+                self._subscribers.remove(subscriber)
+
+    def emit(self, kind, payload):
+        """Diffuse un événement aux abonnés, sans jamais attendre"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        state = kind in self.state_kinds
+        for subscriber in subscribers:
+            if subscriber.overflowed:
+                continue
+            pending = subscriber.events.qsize()
+            if state and pending >= STATE_QUEUE_SIZE:
+                subscriber.overflowed = True
+                self.overflows += 1
+                subscriber.events.put_nowait(None)  # réveille _stream
+            elif not state and pending >= EVENT_QUEUE_SIZE:
+                self.dropped += 1
+            else:
+                subscriber.events.put_nowait((kind, payload))
+
+    def stats(self):
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {'subscribers': subscribers, 'dropped_events': self.dropped, 'overflows': self.overflows}
+
+
+class ControlClient:
+    """Côté serveur web : commandes et abonnement aux événements"""
+
+    def __init__(self, path, timeout=CALL_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.connected = False
+        self._subscribed = threading.Event()
+
+    def call(self, command, **arguments):
+        """Exécute une commande dans le processus de contrôle et retourne son résultat
+
+        Raises:
+            ControlError: processus injoignable, délai dépassé ou commande en erreur
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                connection.settimeout(self.timeout)
+                connection.connect(self.path)
+                _send(connection, {'command': command, **arguments})
+                line = connection.makefile('r').readline()
+        except OSError as e:
+            raise ControlError(f"Processus de contrôle injoignable : {e}")
+        if not line:
+            raise ControlError("Processus de contrôle sans réponse")
+        response = json.loads(line)
+        if response.get('status') != 'success':
+            raise ControlError(response.get('message', "Erreur du processus de contrôle"))
+        return response.get('result')
+
+    def subscribe(self, on_event, on_reconnect=None):
+        """Reçoit les événements dans un thread dédié, en se reconnectant au besoin
+
+        'on_event(type, données)' est appelé pour chaque événement ; l'état
+        courant est renvoyé à chaque reconnexion. 'on_reconnect()' est appelé
+        à chaque reconnexion (pas à la première connexion), avant les
+        événements : les événements émis pendant la coupure sont perdus et
+        doivent être relus ailleurs (logs).
+        """
+        thread = threading.Thread(target=self._listen, args=(on_event, on_reconnect), name='control-events',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def wait_subscribed(self, timeout=None):
+        """Attend la première connexion de l'abonnement (False si délai dépassé)"""
+        return self._subscribed.wait(timeout)
+
+    def _listen(self, on_event, on_reconnect):
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+                    connection.connect(self.path)
+                    _send(connection, {'command': 'subscribe'})
+                    self.connected = True
+                    if self._subscribed.is_set() and on_reconnect is not None:
+                        try:
+                            on_reconnect()
+                        except Exception as e:
+                            print(f"Erreur lors de la resynchronisation avec le processus de contrôle : {e}")
+                    self._subscribed.set()
+                    for line in connection.makefile('r'):
+                        event = json.loads(line)
+                        try:
+                            on_event(event['kind'], event['payload'])
+                        except Exception as e:
+                            print(f"Erreur lors du traitement de l'événement {event.get('kind')} : {e}")
+            except (OSError, ValueError):
+                pass
+            if self.connected:
+                print("Connexion aux événements du processus de contrôle perdue, reconnexion")
+            self.connected = False
+            threading.Event().wait(RECONNECT_DELAY)
+
+
+def watch_parent(on_orphaned):
+    """Appelle 'on_orphaned()' si le serveur web qui a lancé ce processus disparaît
+    (tué sans pouvoir arrêter ses processus fils) : jamais deux boucles de contrôle
+    sur la même pompe après un redémarrage"""
+    parent = os.getppid()
+
+    def check():
+        while os.getppid() == parent:
+            threading.Event().wait(PARENT_CHECK_INTERVAL)
+        print("Serveur web disparu, arrêt du processus de contrôle")
+        on_orphaned()
+
+    thread = threading.Thread(target=check, name='parent-watch', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_control_process(target, *args):
+    """Lance 'target(*args)' dans un processus créé par fork
+
+    À appeler au démarrage, avant tout thread : le processus n'hérite ainsi
+    d'aucun verrou tenu par un autre thread.
+    """
+    process = multiprocessing.get_context('fork').Process(target=target, args=args,
+                                                         name='homegarden-control', daemon=True)
+    process.start()
+    return process
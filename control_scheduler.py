@@ -0,0 +1,130 @@
+"""
+Ordonnanceur à échéances pour la boucle de contrôle
+Un tas d'échéances monotones : le thread dort jusqu'à la prochaine échéance
+(arrêt de pompe, tour de contrôle, arrosage programmé) et se réveille à la
+milliseconde, sans scrutation périodique. En simulation (temps virtuel),
+les tâches échues sont exécutées pas à pas par run_due()
+"""
+import heapq
+import itertools
+import threading
+
+from clock import clock
+
+
+class DeadlineScheduler:
+    """Tâches nommées, ponctuelles ou périodiques, exécutées par un seul thread
+
+    Reprogrammer une tâche sous le même nom remplace l'échéance précédente.
+    Les tâches doivent être courtes : elles s'exécutent les unes après les autres.
+    """
+
+    def __init__(self, clock=clock):
+        self._clock = clock   # horloge de l'application (réelle ou virtuelle)
+        self._heap = []        # (échéance, ordre, nom)
+        self._tasks = {}       # nom -> (échéance, ordre, fonction, période)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self.max_lateness = 0.0  # retard maximal observé au déclenchement (secondes)
+
+    def schedule_at(self, deadline, callback, name, interval=None):
+        """Programme 'callback' à l'échéance monotone 'deadline'"""
+        with self._condition:
+            order = next(self._counter)
+            self._tasks[name] = (deadline, order, callback, interval)
+            heapq.heappush(self._heap, (deadline, order, name))
+            # Réveiller le thread si cette échéance devient la plus proche
+            self._condition.notify()
+
+    def schedule_in(self, delay, callback, name):
+        self.schedule_at(self._clock.monotonic() + delay, callback, name)
+
+    def schedule_every(self, interval, callback, name, first_delay=0.0):
+        """Tâche périodique sans dérive (échéances espacées de 'interval')"""
+        self.schedule_at(self._clock.monotonic() + first_delay, callback, name, interval)
+
+    def cancel(self, name):
+        with self._condition:
+            self._tasks.pop(name, None)
+
+    def deadline(self, name):
+        """Échéance monotone d'une tâche programmée (None si absente)"""
+        with self._condition:
+            task = self._tasks.get(name)
+            return task[0] if task else None
+
+    def _next_due(self):
+        """Retire les entrées périmées du tas et retourne (nom, tâche) de la plus proche"""
+        while self._heap:
+            deadline, order, name = self._heap[0]
+            task = self._tasks.get(name)
+            if task is None or task[1] != order:
+                heapq.heappop(self._heap)  # annulée ou reprogrammée
+                continue
+            return name, task
+        return None, None
+
+    def _take(self, name, task):
+        """Retire la tâche échue du tas (et reprogramme une tâche périodique) ;
+        appelé verrou tenu"""
+        heapq.heappop(self._heap)
+        deadline, _, callback, interval = task
+        if interval is None:
+            del self._tasks[name]
+        else:
+            # Prochaine échéance calée sur la précédente, sans rattrapage en rafale
+            next_deadline = max(deadline + interval, self._clock.monotonic())
+            order = next(self._counter)
+            self._tasks[name] = (next_deadline, order, callback, interval)
+            heapq.heappush(self._heap, (next_deadline, order, name))
+        return deadline, callback
+
+    def _execute(self, name, deadline, callback):
+        self.max_lateness = max(self.max_lateness, self._clock.monotonic() - deadline)
+        try:
+            callback()
+        except Exception as e:
+            print(f"Erreur dans la tâche planifiée '{name}' : {e}")
+
+    def run(self):
+        """Boucle de l'ordonnanceur (bloquante)"""
+        self._running = True
+        while self._running:
+            with self._condition:
+                name, task = self._next_due()
+                if task is None:
+                    self._condition.wait()
+                    continue
+                delay = task[0] - self._clock.monotonic()
+                if delay > 0:
+                    self._condition.wait(timeout=delay)
+                    continue
+                deadline, callback = self._take(name, task)
+            self._execute(name, deadline, callback)
+
+    def next_deadline(self):
+        """Échéance de la tâche la plus proche (None si aucune)"""
+        with self._condition:
+            _, task = self._next_due()
+            return task[0] if task else None
+
+    def run_due(self):
+        """Exécute dans le thread appelant les tâches échues (simulation en temps virtuel)"""
+        while True:
+            with self._condition:
+                name, task = self._next_due()
+                if task is None or task[0] > self._clock.monotonic():
+                    return
+                deadline, callback = self._take(name, task)
+            self._execute(name, deadline, callback)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name='control-scheduler', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
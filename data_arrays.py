@@ -0,0 +1,186 @@
+"""
+Chargement vectorisé des logs CSV en tableaux NumPy
+Ce module convertit les fichiers "timestamp, valeur, ..." en colonnes typées
+(datetime64 / float64) sans créer d'objet Python par ligne
+"""
+import io
+import os
+import glob
+import warnings
+
+import numpy as np
+
+from nodes_api import NODES_DATA_DIR
+from query_pool import check_deadline
+from clock import clock
+
+# Valeurs manquantes rencontrées dans les logs (DHT11 en échec, nœuds sans capteur)
+MISSING_VALUES = ('--', 'None', 'none', '')
+
+# Séries disponibles : nom -> (suffixe du fichier nœud, noms des colonnes de valeurs)
+SERIES = {
+    'soil_moisture': ('soil_moisture', ('soil_moisture',)),
+    'temp_humidity': ('temp_humidity', ('temperature', 'air_humidity')),
+    'watering': ('watering', ('duration',)),
+}
+# Unités des colonnes chargées : les nœuds envoient la durée d'arrosage en
+# minutes, le hub l'enregistre en secondes ; tout est converti à l'unité du hub
+UNITS = {'soil_moisture': '%', 'temperature': '°C', 'air_humidity': '%', 'duration': 's'}
+NODE_UNIT_FACTORS = {'duration': 60.0}
+
+
+def _empty_columns(value_names):
+    columns = {'timestamp': np.empty(0, dtype='datetime64[s]')}
+    for name in value_names:
+        columns[name] = np.empty(0, dtype=np.float64)
+    return columns
+
+
+def _parse_timestamps(raw):
+    """Convertit une colonne de chaînes en datetime64[s] (avec ou sans microsecondes)"""
+    try:
+        return raw.astype('datetime64[us]').astype('datetime64[s]')
+    except ValueError:
+        # Chemin lent uniquement en présence de lignes corrompues
+        parsed = np.empty(raw.shape, dtype='datetime64[s]')
+        for i, value in enumerate(raw):
+            try:
+                parsed[i] = np.datetime64(value, 'us')
+            except ValueError:
+                parsed[i] = np.datetime64('NaT')
+        return parsed
+
+
+def _parse_values(raw):
+    """Convertit une colonne de chaînes en float64, les valeurs manquantes deviennent NaN"""
+    raw = np.char.strip(raw)
+    raw = np.where(np.isin(raw, MISSING_VALUES), 'nan', raw)
+    try:
+        return raw.astype(np.float64)
+    except ValueError:
+        parsed = np.full(raw.shape, np.nan)
+        for i, value in enumerate(raw):
+            try:
+                parsed[i] = float(value)
+            except ValueError:
+                pass
+        return parsed
+
+
+def load_log_columns(filename, value_names, since=None):
+    """Charge un fichier de log en colonnes typées
+
+    Args:
+        filename: chemin du fichier CSV ("timestamp, v1, v2, ...")
+        value_names: noms des colonnes de valeurs après le timestamp
+        since: datetime optionnel, les lignes plus anciennes sont ignorées
+
+    Returns:
+        dict: {'timestamp': datetime64[s], <nom>: float64, ...}
+    """
+    n_columns = 1 + len(value_names)
+    try:
+        with open(filename, 'rb') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return _empty_columns(value_names)
+    if not content.strip():
+        return _empty_columns(value_names)
+
+    try:
+        raw = np.loadtxt(io.BytesIO(content), dtype=str, delimiter=',',
+                         usecols=range(n_columns), ndmin=2, encoding='utf-8')
+    except ValueError:
+        # Lignes incomplètes : genfromtxt les ignore au lieu d'échouer
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            raw = np.genfromtxt(io.BytesIO(content), dtype=str, delimiter=',',
+                                usecols=range(n_columns), invalid_raise=False,
+                                encoding='utf-8')
+        raw = np.atleast_2d(raw) if raw.size else np.empty((0, n_columns), dtype=str)
+
+    columns = {'timestamp': _parse_timestamps(np.char.strip(raw[:, 0]))}
+    for i, name in enumerate(value_names, start=1):
+        columns[name] = _parse_values(raw[:, i])
+
+    valid = ~np.isnat(columns['timestamp'])
+    if since is not None:
+        valid &= columns['timestamp'] >= np.datetime64(since.replace(microsecond=0), 's')
+    if not valid.all():
+        columns = {name: column[valid] for name, column in columns.items()}
+    return columns
+
+
+def to_common_units(source, columns):
+    """Convertit les colonnes d'un nœud dans les unités de UNITS"""
+    if source == 'hub':
+        return columns
+    return {name: column * NODE_UNIT_FACTORS[name] if name in NODE_UNIT_FACTORS else column
+            for name, column in columns.items()}
+
+
+def list_node_ids(node_log_dir=NODES_DATA_DIR):
+    """Liste les nœuds ayant au moins un fichier de log"""
+    node_ids = set()
+    for path in glob.glob(os.path.join(node_log_dir, '*.csv')):
+        name = os.path.basename(path)[:-len('.csv')]
+        for suffix, _ in SERIES.values():
+            if name.endswith('_' + suffix):
+                node_ids.add(name[:-len(suffix) - 1])
+    return sorted(node_ids)
+
+
+def node_log_file(node_id, series, node_log_dir=NODES_DATA_DIR):
+    """Chemin du fichier de log d'un nœud pour une série donnée"""
+    suffix, _ = SERIES[series]
+    return os.path.join(node_log_dir, f"{node_id}_{suffix}.csv")
+
+
+def collect_series(hub_files, series_names, node_log_dir=NODES_DATA_DIR, since=None, deadline=None):
+    """Charge les séries demandées pour le hub et tous les nœuds
+
+    Args:
+        hub_files: dict série -> fichier de log du hub
+        series_names: séries à charger (clés de SERIES)
+        deadline: heure limite (secondes epoch), vérifiée entre deux fichiers
+
+    Returns:
+        dict: {'hub/soil_moisture/timestamp': ndarray, ..., 'units/duration': 's', ...}
+        valeurs dans les unités de UNITS
+    """
+    arrays = {}
+    sources = [('hub', hub_files)]
+    for node_id in list_node_ids(node_log_dir):
+        sources.append((node_id, {s: node_log_file(node_id, s, node_log_dir) for s in SERIES}))
+
+    for source, files in sources:
+        for series in series_names:
+            filename = files.get(series)
+            if filename is None:
+                continue
+            check_deadline(deadline)
+            _, value_names = SERIES[series]
+            columns = to_common_units(source, load_log_columns(filename, value_names, since=since))
+            for name, column in columns.items():
+                arrays[f"{source}/{series}/{name}"] = column
+            for name in value_names:
+                arrays[f"units/{name}"] = np.array(UNITS[name])
+    return arrays
+
+
+def build_npz_export(hub_files, series_names, node_log_dir=NODES_DATA_DIR, exported_at=None, deadline=None):
+    """Construit une archive .npz compressée en mémoire
+
+    'exported_at' est l'heure de l'application, passée par l'appelant : dans un
+    processus du pool, une horloge virtuelle est figée à l'heure du fork
+
+    Returns:
+        bytes: contenu de l'archive, lisible avec un seul np.load
+    """
+    arrays = collect_series(hub_files, series_names, node_log_dir, deadline=deadline)
+    check_deadline(deadline)
+    exported_at = exported_at or clock.now()
+    arrays['exported_at'] = np.array(exported_at.replace(microsecond=0), dtype='datetime64[s]')
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
@@ -0,0 +1,85 @@
+"""
+Diffusion d'événements en temps réel (Server-Sent Events)
+Un seul éditeur partagé : la boucle de surveillance et l'API des nœuds publient,
+chaque onglet ouvert ne fait qu'attendre sur sa propre file
+"""
+import json
+import queue
+import threading
+
+# Nombre d'événements en attente par abonné avant de supprimer les plus anciens
+SUBSCRIBER_QUEUE_SIZE = 100
+# Intervalle des commentaires keep-alive (secondes)
+HEARTBEAT_INTERVAL = 15
+
+
+class EventPublisher:
+    """Éditeur d'événements partagé entre tous les clients SSE"""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self._queue_size = queue_size
+        self._subscribers = set()
+        self._last_events = {}  # clé -> (événement, données), rejoués à la connexion
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=self._queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            for event, data in self._last_events.values():
+                subscriber.put_nowait((event, data))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data, key=None, only_if_changed=False):
+        """Publie un événement vers tous les abonnés
+
+        Args:
+            event: nom de l'événement SSE ('hub', 'pump', 'alerts', 'node')
+            data: données sérialisables en JSON
+            key: clé de rejeu (par défaut le nom de l'événement, ex. 'node:ESP32_001')
+            only_if_changed: ne rien envoyer si les données sont identiques au dernier envoi
+
+        Returns:
+            bool: True si l'événement a été diffusé
+        """
+        key = key or event
+        with self._lock:
+            if only_if_changed and self._last_events.get(key) == (event, data):
+                return False
+            self._last_events[key] = (event, data)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event, data))
+            except queue.Full:
+                # Client trop lent : on abandonne l'événement le plus ancien
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait((event, data))
+                except (queue.Empty, queue.Full):
+                    pass
+        return True
+
+    def stream(self, heartbeat=HEARTBEAT_INTERVAL):
+        """Générateur de messages SSE pour une connexion"""
+        subscriber = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
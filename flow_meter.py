@@ -0,0 +1,114 @@
+"""
+Débitmètre à impulsions (type YF-S201)
+Les impulsions sont comptées par interruption sur front descendant : le
+rappel se limite à incrémenter un entier, sans verrou ni allocation, et ne
+perd aucun front même à plusieurs centaines d'impulsions par seconde. Le
+débit instantané et les volumes (par arrosage, par jour) sont calculés à la
+lecture, à partir des écarts du compteur.
+"""
+from collections import deque
+
+from clock import clock
+
+# Réglages par défaut, surchargés par la clé "flow_meter" de data.json
+DEFAULT_FLOW_METER = {
+    'pin': 23,
+    'pulses_per_liter': 450,   # YF-S201 : F (Hz) = 7.5 x débit (L/min)
+    'leak_flow': 0.05,         # L/min mesurés pompe arrêtée : fuite
+    'max_flow': 10.0,          # L/min pompe allumée : rupture de tuyau
+    'no_flow_seconds': 30      # pompe allumée sans débit : désamorçage ou tuyau bouché
+}
+# Fenêtre de calcul du débit instantané (secondes)
+FLOW_WINDOW_SECONDS = 5.0
+# Débit supposé sans débitmètre (L/min), pour estimer les volumes
+ESTIMATED_FLOW_RATE = 0.3
+
+
+def flow_meter_settings(config):
+    """Réglages validés du débitmètre, None s'il n'est pas configuré"""
+    entry = (config or {}).get('flow_meter')
+    if not entry or not entry.get('enabled', True):
+        return None
+    settings = dict(DEFAULT_FLOW_METER)
+    settings.update(entry)
+    try:
+        settings['pin'] = int(settings['pin'])
+        settings['pulses_per_liter'] = float(settings['pulses_per_liter'])
+        if settings['pulses_per_liter'] <= 0:
+            raise ValueError("pulses_per_liter doit être positif")
+    except (TypeError, ValueError) as e:
+        print(f"Configuration du débitmètre invalide, débitmètre ignoré : {e}")
+        return None
+    return settings
+
+
+class FlowMeter:
+    """Compteur d'impulsions, débit et volumes
+
+    'on_pulse' est le rappel d'interruption : il n'est appelé que par le thread
+    des événements GPIO (un seul écrivain), les lecteurs se contentent de lire
+    le compteur.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.liters_per_pulse = 1.0 / settings['pulses_per_liter']
+        self.pulses = 0
+        self._samples = deque()     # (clock.monotonic(), impulsions) sur la fenêtre de débit
+        self._event_start = None    # impulsions au démarrage de l'arrosage en cours
+        self._restart_window = False  # fenêtre de débit à vider à la prochaine lecture
+
+    def on_pulse(self, channel=None):
+        self.pulses += 1
+
+    def flow_rate(self):
+        """Débit (L/min) sur la fenêtre glissante, mis à jour à chaque appel"""
+        now = clock.monotonic()
+        pulses = self.pulses
+        if self._restart_window:
+            # Arrosage terminé : le débit ne doit plus compter les impulsions de la pompe
+            self._restart_window = False
+            self._samples.clear()
+        self._samples.append((now, pulses))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= FLOW_WINDOW_SECONDS:
+            self._samples.popleft()
+        start_time, start_pulses = self._samples[0]
+        if now - start_time <= 0:
+            return 0.0
+        return (pulses - start_pulses) * self.liters_per_pulse / (now - start_time) * 60
+
+    def total_volume(self):
+        """Volume total compté depuis le démarrage (L)"""
+        return self.pulses * self.liters_per_pulse
+
+    def read(self):
+        """Lecture pour le service d'acquisition"""
+        return {'flow_rate': round(self.flow_rate(), 3), 'water_total': round(self.total_volume(), 3)}
+
+    def begin_event(self):
+        self._event_start = self.pulses
+
+    def end_event(self):
+        """Volume (L) écoulé depuis begin_event, None sans arrosage en cours"""
+        if self._event_start is None:
+            return None
+        volume = (self.pulses - self._event_start) * self.liters_per_pulse
+        self._event_start = None
+        self._restart_window = True
+        return round(volume, 3)
+
+    def leak_suspected(self, flow_rate, pump_state, now=None):
+        """Débit mesuré pompe arrêtée, hors des FLOW_WINDOW_SECONDS qui suivent un
+        arrêt (écoulement du tuyau, lecture prise avant l'arrêt)"""
+        if pump_state.on or flow_rate is None or flow_rate <= self.settings['leak_flow']:
+            return False
+        stopped_at = pump_state.last_watering_time
+        if stopped_at is None:
+            return True
+        return ((now or clock.now()) - stopped_at).total_seconds() >= FLOW_WINDOW_SECONDS
+
+    def event_volume(self):
+        """Volume (L) de l'arrosage en cours"""
+        if self._event_start is None:
+            return None
+        return (self.pulses - self._event_start) * self.liters_per_pulse
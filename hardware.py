@@ -0,0 +1,304 @@
+"""
+Couche d'abstraction matérielle
+Deux implémentations de la même interface : les pilotes du Raspberry Pi
+(RPi.GPIO, DHT11, ADS1115 sur I2C) et des simulateurs déterministes (bruit
+des capteurs, latence de lecture, lectures ratées du DHT11, pompe qui
+humidifie le sol, débitmètre à impulsions). Le choix se fait par la variable
+d'environnement HOMEGARDEN_HARDWARE ou la clé "hardware" de data.json
+('real' ou 'simulated') ; par défaut, les pilotes réels s'ils sont
+importables, sinon les simulateurs : l'application entière tourne et se
+teste en charge sur un Linux ordinaire.
+"""
+import os
+import math
+import time
+import random
+import threading
+
+from soil_probes import DEFAULT_ADDRESS
+from clock import clock
+
+HARDWARE_ENV = 'HOMEGARDEN_HARDWARE'
+HARDWARE_KINDS = ('real', 'simulated')
+
+# Broches (numérotation BCM)
+PUMP_PIN = 18
+DHT_PIN = 4
+
+# Réglages des simulateurs, surchargés par la clé "simulation" de data.json
+DEFAULT_SIMULATION = {
+    'seed': 42,
+    'soil_moisture': 45.0,        # humidité initiale du sol (%)
+    'drying_rate': 1.5,           # perte d'humidité du sol (points de % par heure, à 20°C)
+    'watering_rate': 6.0,         # gain d'humidité du sol pompe allumée (points de % par minute)
+    'voltage_noise': 0.01,        # écart-type du bruit de l'ADS1115 (V)
+    'adc_latency': 0.0,           # latence d'une conversion (s), en plus de la cadence
+    'dht_latency': 0.25,          # durée d'une lecture du DHT11 (s)
+    'dht_failure_rate': 0.1,      # proportion de lectures ratées du DHT11
+    'temperature_mean': 21.0,     # cycle journalier de la température de l'air (°C)
+    'temperature_amplitude': 5.0,
+    'flow_rate': 1.5,             # débit de la pompe simulée (L/min)
+    'pulses_per_liter': 450
+}
+# Période des paquets d'impulsions du débitmètre simulé (secondes d'horloge)
+PULSE_PERIOD = 0.1
+
+
+class RealHardware:
+    """Pilotes du Raspberry Pi (import des bibliothèques à la création)"""
+
+    kind = 'real'
+
+    def __init__(self, config=None):
+        import board
+        import busio
+        import adafruit_dht
+        import RPi.GPIO as GPIO
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.analog_in import AnalogIn
+        from adafruit_ads1x15.ads1x15 import Mode
+
+        self._GPIO = GPIO
+        self._ADS = ADS
+        self._AnalogIn = AnalogIn
+        self._channels = (ADS.P0, ADS.P1, ADS.P2, ADS.P3)
+        self.adc_modes = {'continuous': Mode.CONTINUOUS, 'single': Mode.SINGLE}
+        GPIO.setmode(GPIO.BCM)
+        # Configuration I2C pour les ADS1115
+        self._i2c = busio.I2C(board.SCL, board.SDA)
+        # Configuration du GPIO pour DHT11
+        self._dht = adafruit_dht.DHT11(getattr(board, f'D{DHT_PIN}'))
+
+    def setup_output(self, pin):
+        self._GPIO.setup(pin, self._GPIO.OUT)
+
+    def write_pin(self, pin, high):
+        self._GPIO.output(pin, self._GPIO.HIGH if high else self._GPIO.LOW)
+
+    def watch_falling_edges(self, pin, callback):
+        """Appelle 'callback' à chaque front descendant (entrée avec tirage au niveau haut)"""
+        self._GPIO.setup(pin, self._GPIO.IN, pull_up_down=self._GPIO.PUD_UP)
+        self._GPIO.add_event_detect(pin, self._GPIO.FALLING, callback=callback)
+
+    def make_ads(self, address):
+        return self._ADS.ADS1115(self._i2c, address=address)
+
+    def make_channel(self, ads, channel):
+        return self._AnalogIn(ads, self._channels[channel])
+
+    def read_dht(self):
+        return {'temperature': self._dht.temperature, 'air_humidity': self._dht.humidity}
+
+    def cleanup(self):
+        self._GPIO.cleanup()
+
+
+class SimulatedGarden:
+    """Modèle physique minimal : sol qui sèche, pompe qui l'humidifie, cycle
+    journalier de l'air.
+
+    Chaque capteur tire ses aléas dans son propre générateur, dérivé de la
+    graine et du nom du capteur, et le cycle journalier suit l'heure UTC de
+    l'horloge : en temps virtuel, une simulation est reproductible pour une
+    graine donnée, quels que soient le fuseau horaire et l'ordre des lectures.
+    """
+
+    def __init__(self, settings, clock=clock):
+        self.settings = settings
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._randoms = {}  # nom du capteur -> random.Random
+        self.pump_on = False
+        self._moisture = {}   # (adresse, entrée) -> humidité du sol (%)
+        self._updated_at = clock.time()
+
+    def random(self, name):
+        """Générateur propre au capteur 'name', graine dérivée de celle de la simulation"""
+        with self._lock:
+            generator = self._randoms.get(name)
+            if generator is None:
+                generator = self._randoms[name] = random.Random(f"{self.settings['seed']}:{name}")
+            return generator
+
+    def _advance(self):
+        now = self._clock.time()
+        elapsed = max(0.0, now - self._updated_at)
+        if elapsed == 0.0:
+            return
+        self._updated_at = now
+        drying = self.settings['drying_rate'] / 3600 * elapsed * max(0.2, self.air_temperature(now) / 20)
+        for key, moisture in self._moisture.items():
+            moisture -= drying
+            if self.pump_on and key == (DEFAULT_ADDRESS, 0):
+                # Seule la zone du hub est arrosée par la pompe du hub
+                moisture += self.settings['watering_rate'] / 60 * elapsed
+            self._moisture[key] = min(100.0, max(0.0, moisture))
+
+    def set_pump(self, on):
+        with self._lock:
+            self._advance()
+            self.pump_on = on
+
+    def water(self, key, minutes):
+        """Arrosage par une autre pompe que celle du hub (nœud simulé)"""
+        self.soil_moisture(key)
+        with self._lock:
+            self._moisture[key] = min(100.0, self._moisture[key] + self.settings['watering_rate'] * minutes)
+
+    def soil_moisture(self, key):
+        if key not in self._moisture:
+            # Chaque sonde part d'une humidité un peu différente
+            start = self.settings['soil_moisture'] + self.random(f"soil:{key[0]}:{key[1]}").uniform(-10, 10)
+            with self._lock:
+                self._moisture.setdefault(key, start)
+        with self._lock:
+            self._advance()
+            return self._moisture[key]
+
+    def air_temperature(self, now=None):
+        # Minimum vers 5 h, maximum vers 17 h (heure UTC, indépendante du fuseau)
+        now = now if now is not None else self._clock.time()
+        hours = now % 86400 / 3600
+        return self.settings['temperature_mean'] - self.settings['temperature_amplitude'] * math.cos(
+            (hours - 5) / 24 * 2 * math.pi)
+
+    def air_humidity(self, now=None):
+        # Humidité relative en opposition de phase avec la température
+        deviation = self.air_temperature(now) - self.settings['temperature_mean']
+        return min(95.0, max(20.0, 55.0 - 2.5 * deviation))
+
+
+class SimulatedADS1115:
+    def __init__(self, hardware, address):
+        self.hardware = hardware
+        self.address = address
+        self.mode = 'single'
+        self.data_rate = 128
+
+
+class SimulatedAnalogIn:
+    """Entrée de l'ADS1115 : tension du capteur capacitif (basse = sol humide) et bruit"""
+
+    def __init__(self, ads, channel):
+        self.ads = ads
+        self.channel = channel
+        self._random = ads.hardware.garden.random(f"adc:{ads.address}:{channel}")
+
+    @property
+    def voltage(self):
+        hardware = self.ads.hardware
+        settings = hardware.settings
+        if self.ads.mode == 'single':
+            # Une conversion complète à chaque lecture
+            clock.sleep(1.0 / self.ads.data_rate)
+        if settings['adc_latency']:
+            clock.sleep(settings['adc_latency'])
+        moisture = hardware.garden.soil_moisture((self.ads.address, self.channel))
+        noise = self._random.gauss(0.0, settings['voltage_noise'])
+        return (1 - moisture / 100) * 3.3 + noise
+
+
+class SimulatedHardware:
+    """Simulateurs de la pompe, du DHT11, des ADS1115 et du débitmètre"""
+
+    kind = 'simulated'
+    adc_modes = {'continuous': 'continuous', 'single': 'single'}
+
+    def __init__(self, config=None):
+        self.settings = dict(DEFAULT_SIMULATION)
+        self.settings.update((config or {}).get('simulation', {}))
+        self.garden = SimulatedGarden(self.settings)
+        self._dht_random = self.garden.random('dht')
+        self._pins = {}
+        self._pulse_callbacks = []
+        self._pulse_pin = None
+        self._pulse_lock = threading.Lock()
+        self._pulses_at = clock.monotonic()  # heure des dernières impulsions produites
+        self._pending_pulses = 0.0
+
+    def setup_output(self, pin):
+        self._pins.setdefault(pin, True)
+
+    def write_pin(self, pin, high):
+        self._pins[pin] = high
+        if pin == PUMP_PIN:
+            # Impulsions dues avant le changement d'état, puis pompe active au niveau bas
+            self._emit_pulses()
+            self.garden.set_pump(not high)
+
+    def watch_falling_edges(self, pin, callback):
+        self._pulse_pin = pin
+        self._pulse_callbacks.append(callback)
+        if len(self._pulse_callbacks) == 1 and not clock.virtual:
+            # En temps virtuel, les impulsions sont produites par run_due()
+            threading.Thread(target=self._generate_pulses, name='sim-flow', daemon=True).start()
+
+    def _generate_pulses(self):
+        while True:
+            time.sleep(PULSE_PERIOD)
+            self._emit_pulses()
+
+    def _emit_pulses(self):
+        """Impulsions du débitmètre écoulées depuis le dernier appel, pompe allumée"""
+        with self._pulse_lock:
+            now = clock.monotonic()
+            elapsed, self._pulses_at = now - self._pulses_at, now
+            if not self.garden.pump_on or not self._pulse_callbacks:
+                return
+            self._pending_pulses += self.settings['flow_rate'] / 60 * self.settings['pulses_per_liter'] * elapsed
+            pulses = int(self._pending_pulses)
+            self._pending_pulses -= pulses
+        for callback in self._pulse_callbacks:
+            for _ in range(pulses):
+                callback(self._pulse_pin)
+
+    def next_deadline(self):
+        """Prochain paquet d'impulsions en temps virtuel (pompe allumée seulement)"""
+        if not self.garden.pump_on or not self._pulse_callbacks:
+            return None
+        return self._pulses_at + PULSE_PERIOD
+
+    def run_due(self):
+        deadline = self.next_deadline()
+        if deadline is not None and clock.monotonic() >= deadline:
+            self._emit_pulses()
+
+    def make_ads(self, address):
+        return SimulatedADS1115(self, address)
+
+    def make_channel(self, ads, channel):
+        return SimulatedAnalogIn(ads, channel)
+
+    def read_dht(self):
+        clock.sleep(self.settings['dht_latency'])
+        if self._dht_random.random() < self.settings['dht_failure_rate']:
+            # Même exception que la bibliothèque adafruit_dht
+            raise RuntimeError("Checksum did not validate. Try again.")
+        # Résolution du DHT11 : 1°C et 1 %
+        return {'temperature': float(round(self.garden.air_temperature())),
+                'air_humidity': float(round(self.garden.air_humidity()))}
+
+    def cleanup(self):
+        pass
+
+
+def hardware_kind(config):
+    """'real' ou 'simulated' : variable d'environnement, puis data.json, puis détection"""
+    kind = os.environ.get(HARDWARE_ENV) or (config or {}).get('hardware')
+    if kind in HARDWARE_KINDS:
+        return kind
+    if kind:
+        print(f"Matériel inconnu '{kind}' (choix : {', '.join(HARDWARE_KINDS)}), détection automatique")
+    try:
+        import RPi.GPIO  # noqa: F401
+        return 'real'
+    except (ImportError, RuntimeError):
+        return 'simulated'
+
+
+def create_hardware(config=None):
+    kind = hardware_kind(config)
+    if kind == 'real':
+        return RealHardware(config)
+    print("Matériel simulé : pompe, DHT11, ADS1115 et débitmètre virtuels")
+    return SimulatedHardware(config)
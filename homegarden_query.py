@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Requêtes en ligne de commande sur l'historique du hub et des nœuds
+Lit directement les logs CSV (sans démarrer Flask ni toucher au matériel),
+filtre par période, regroupe par source / métrique / période et agrège.
+Les valeurs sont ramenées aux unités du hub (durées d'arrosage des nœuds,
+envoyées en minutes, converties en secondes) ; chaque ligne indique son unité.
+Les fichiers sont analysés en parallèle sur tous les cœurs.
+
+Exemples :
+    ./homegarden-query --source ESP32_003 --metric duration --last 30d --agg count,sum
+    ./homegarden-query --metric soil_moisture --group-by source,day --since 2025-07-01 --format json
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from nodes_api import NODES_DATA_DIR
+from data_arrays import SERIES, UNITS, list_node_ids, node_log_file, load_log_columns, to_common_units
+
+# Logs du hub (noms relatifs au répertoire des données, comme dans app.py)
+HUB_LOG_FILES = {
+    'watering': "arrosage_log.csv",
+    'temp_humidity': "temp_humidity_log.csv",
+    'soil_moisture': "soil_moisture_log.csv",
+}
+
+# Métrique -> série qui la contient
+METRIC_SERIES = {name: series for series, (_, names) in SERIES.items() for name in names}
+# Métriques et unités pour l'aide ('%' doublé pour argparse)
+METRIC_HELP = ', '.join(f"{name} ({UNITS[name]})" for name in METRIC_SERIES).replace('%', '%%')
+
+GROUP_KEYS = ('source', 'metric', 'year', 'month', 'day', 'weekday', 'hour')
+AGGREGATES = ('count', 'sum', 'mean', 'min', 'max', 'std')
+
+
+def parse_datetime(value):
+    """Date ou date-heure ISO 8601"""
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date invalide : {value}")
+
+
+def parse_duration(value):
+    """Durée relative : 90m, 12h, 30d, 8w"""
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+    try:
+        return datetime.timedelta(**{units[value[-1]]: float(value[:-1])})
+    except (KeyError, ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"durée invalide : {value} (exemples : 90m, 12h, 30d, 8w)")
+
+
+def parse_list(choices):
+    def parse(value):
+        items = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = [item for item in items if item not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"valeur(s) inconnue(s) : {', '.join(unknown)} (choix : {', '.join(choices)})")
+        return items
+    return parse
+
+
+def _group_columns(timestamps, group_by):
+    """Clés de regroupement temporelles, vectorisées"""
+    columns = {}
+    if 'year' in group_by:
+        columns['year'] = timestamps.astype('datetime64[Y]').astype(str)
+    if 'month' in group_by:
+        columns['month'] = timestamps.astype('datetime64[M]').astype(str)
+    if 'day' in group_by:
+        columns['day'] = timestamps.astype('datetime64[D]').astype(str)
+    if 'weekday' in group_by:
+        # 1970-01-01 était un jeudi : lundi = 0
+        columns['weekday'] = ((timestamps.astype('datetime64[D]').astype(np.int64) + 3) % 7).astype(str)
+    if 'hour' in group_by:
+        columns['hour'] = ((timestamps - timestamps.astype('datetime64[D]')).astype('timedelta64[h]')
+                           .astype(np.int64)).astype(str)
+    return columns
+
+
+def scan_file(source, series, filename, metrics, since, until, group_by):
+    """Agrégats partiels d'un fichier (exécuté dans un processus de calcul)
+
+    Returns:
+        dict: {(clé de groupe...): [count, sum, sumsq, min, max]} fusionnables
+    """
+    _, value_names = SERIES[series]
+    columns = to_common_units(source, load_log_columns(filename, value_names, since=since))
+    timestamps = columns['timestamp']
+    if until is not None:
+        keep = timestamps < np.datetime64(until.replace(microsecond=0), 's')
+        columns = {name: column[keep] for name, column in columns.items()}
+        timestamps = columns['timestamp']
+
+    partials = {}
+    time_columns = _group_columns(timestamps, group_by)
+    for metric in metrics:
+        values = columns[metric]
+        valid = ~np.isnan(values)
+        if not valid.any():
+            continue
+        values = values[valid]
+        parts = []
+        for key in group_by:
+            if key == 'source':
+                parts.append(np.full(values.shape, source, dtype=object))
+            elif key == 'metric':
+                parts.append(np.full(values.shape, metric, dtype=object))
+            else:
+                parts.append(time_columns[key][valid].astype(object))
+        if parts:
+            labels = parts[0]
+            for part in parts[1:]:
+                labels = labels + '\x1f' + part
+            uniques, inverse = np.unique(labels.astype(str), return_inverse=True)
+        else:
+            uniques, inverse = np.array(['']), np.zeros(values.shape, dtype=np.int64)
+
+        n = len(uniques)
+        counts = np.bincount(inverse, minlength=n)
+        sums = np.bincount(inverse, weights=values, minlength=n)
+        sumsqs = np.bincount(inverse, weights=values * values, minlength=n)
+        minimums = np.full(n, np.inf)
+        maximums = np.full(n, -np.inf)
+        np.minimum.at(minimums, inverse, values)
+        np.maximum.at(maximums, inverse, values)
+        for i, label in enumerate(uniques.tolist()):
+            key = (metric,) + (tuple(label.split('\x1f')) if group_by else ())
+            partials[key] = [int(counts[i]), float(sums[i]), float(sumsqs[i]),
+                             float(minimums[i]), float(maximums[i])]
+    return partials
+
+
+def merge_partials(total, partials):
+    for key, (count, total_sum, sumsq, minimum, maximum) in partials.items():
+        current = total.get(key)
+        if current is None:
+            total[key] = [count, total_sum, sumsq, minimum, maximum]
+        else:
+            current[0] += count
+            current[1] += total_sum
+            current[2] += sumsq
+            current[3] = min(current[3], minimum)
+            current[4] = max(current[4], maximum)
+
+
+def finalize(key, partial, group_by, aggregates):
+    count, total_sum, sumsq, minimum, maximum = partial
+    mean = total_sum / count
+    values = {
+        'count': count,
+        'sum': round(total_sum, 3),
+        'mean': round(mean, 3),
+        'min': minimum,
+        'max': maximum,
+        'std': round(max(sumsq / count - mean * mean, 0.0) ** 0.5, 3)
+    }
+    metric, group_values = key[0], key[1:]
+    row = dict(zip(group_by, group_values))
+    for name in ('weekday', 'hour'):
+        if name in row:
+            row[name] = int(row[name])
+    row.setdefault('metric', metric)
+    row['unit'] = UNITS[metric]
+    row.update({name: values[name] for name in aggregates})
+    return row
+
+
+def build_scan_list(data_dir, sources, metrics):
+    """Fichiers à analyser : [(source, série, fichier, métriques)]"""
+    series_metrics = {}
+    for metric in metrics:
+        series_metrics.setdefault(METRIC_SERIES[metric], []).append(metric)
+
+    node_dir = os.path.join(data_dir, NODES_DATA_DIR)
+    all_sources = ['hub'] + list_node_ids(node_dir)
+    scans = []
+    for source in (sources or all_sources):
+        for series, wanted in series_metrics.items():
+            if source == 'hub':
+                filename = os.path.join(data_dir, HUB_LOG_FILES[series])
+            else:
+                filename = node_log_file(source, series, node_dir)
+            if os.path.exists(filename):
+                scans.append((source, series, filename, wanted))
+    return scans
+
+
+def run_query(args):
+    """Exécute la requête et retourne les lignes de résultat triées"""
+    since = args.since
+    if args.last is not None:
+        since = datetime.datetime.now() - args.last
+    group_by = args.group_by
+    scans = build_scan_list(args.data_dir, args.source, args.metric)
+
+    total = {}
+    if args.workers > 1 and len(scans) > 1:
+        # fork : pas de réimport du script ni de matériel dans les processus
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(scans)),
+                                 mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = [executor.submit(scan_file, source, series, filename, metrics, since, args.until, group_by)
+                       for source, series, filename, metrics in scans]
+            for future in futures:
+                merge_partials(total, future.result())
+    else:
+        for source, series, filename, metrics in scans:
+            merge_partials(total, scan_file(source, series, filename, metrics, since, args.until, group_by))
+
+    columns = list(group_by) + (['metric'] if 'metric' not in group_by else [])
+    rows = [finalize(key, partial, group_by, args.agg) for key, partial in total.items()]
+    rows.sort(key=lambda row: tuple(str(row[column]) for column in columns))
+    return columns + ['unit'] + list(args.agg), rows
+
+
+def write_output(fieldnames, rows, output_format, stream=sys.stdout):
+    if output_format == 'json':
+        json.dump(rows, stream, indent=2, ensure_ascii=False)
+        stream.write('\n')
+    else:
+        writer = csv.DictWriter(stream, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='homegarden-query',
+        description="Requêtes sur l'historique du hub et des nœuds (logs CSV)"
+    )
+    parser.add_argument('--data-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="répertoire des logs (par défaut, celui de l'application)")
+    parser.add_argument('--source', type=lambda v: [s.strip() for s in v.split(',') if s.strip()],
+                        help="sources séparées par des virgules : hub, ESP32_001... (toutes par défaut)")
+    parser.add_argument('--metric', type=parse_list(tuple(METRIC_SERIES)), default=list(METRIC_SERIES),
+                        help=f"métriques : {METRIC_HELP} (toutes par défaut)")
+    parser.add_argument('--since', type=parse_datetime, help="début de période (ISO 8601)")
+    parser.add_argument('--until', type=parse_datetime, help="fin de période exclue (ISO 8601)")
+    parser.add_argument('--last', type=parse_duration, help="période relative : 12h, 30d, 8w (remplace --since)")
+    parser.add_argument('--group-by', type=parse_list(GROUP_KEYS), default=['source', 'metric'],
+                        help=f"regroupement : {', '.join(GROUP_KEYS)} (défaut : source,metric)")
+    parser.add_argument('--agg', type=parse_list(AGGREGATES), default=['count', 'mean', 'min', 'max'],
+                        help=f"agrégats : {', '.join(AGGREGATES)} (défaut : count,mean,min,max)")
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv', help="format de sortie")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processus d'analyse en parallèle (défaut : nombre de cœurs)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        fieldnames, rows = run_query(args)
+    except Exception as e:
+        print(f"Erreur lors de la requête : {e}", file=sys.stderr)
+        return 1
+    write_output(fieldnames, rows, args.format)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
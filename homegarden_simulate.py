@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Simulation du hub en temps virtuel
+Démarre l'application complète (boucle de contrôle, arrosages programmés,
+rotation des logs, planificateur des zones) sur le matériel simulé et une
+horloge virtuelle à événements discrets : le temps saute d'une échéance à la
+suivante (tour de contrôle, lecture d'un capteur, arrêt de la pompe, envoi
+d'un nœud), une année simulée ne prend que le temps de calcul de ses
+événements. Des nœuds ESP32 virtuels postent par l'API HTTP ; des rapports à
+intervalles réguliers donnent la taille des données, le comportement des
+ordonnanceurs et les temps de réponse (réels) des requêtes principales.
+
+Les fichiers sont écrits dans un répertoire dédié (jamais dans celui du hub) ;
+les messages de l'application vont dans un log séparé.
+
+Exemples :
+    ./homegarden-simulate --days 30
+    ./homegarden-simulate --days 365 --cadence 12 --nodes 4 --data-dir simulation_annee
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import contextlib
+
+from clock import clock
+from sensor_service import DHT_INTERVAL, SENSOR_MAX_AGE
+
+# Requêtes chronométrées à chaque rapport
+TIMED_QUERIES = (
+    '/api/dashboard',
+    '/api/arrosage_history',
+    '/api/percentiles?hours=168',
+    '/api/cubes',
+    '/trends',
+    '/statistics',
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulation du hub en temps virtuel sur matériel simulé")
+    parser.add_argument('--days', type=float, default=30, help="durée simulée en jours (30)")
+    parser.add_argument('--cadence', type=float, default=1,
+                        help="multiplie les périodes de la boucle de contrôle et des capteurs : moins "
+                             "d'événements par jour simulé pour les longues durées (1 = cadence réelle)")
+    parser.add_argument('--start', type=datetime.datetime.fromisoformat,
+                        help="date simulée de départ (ISO 8601, maintenant par défaut)")
+    parser.add_argument('--nodes', type=int, default=2, help="nombre de nœuds ESP32 simulés (2)")
+    parser.add_argument('--node-interval', type=float, default=300,
+                        help="période d'envoi des nœuds en secondes simulées (300)")
+    parser.add_argument('--report-hours', type=float, default=24,
+                        help="intervalle des rapports en heures simulées (24)")
+    parser.add_argument('--data-dir', default='simulation', help="répertoire des données simulées")
+    parser.add_argument('--config', help="data.json de départ (scénarios, programmations, réglages)")
+    parser.add_argument('--seed', type=int, help="graine des simulateurs")
+    parser.add_argument('--log', default='simulation.log',
+                        help="log des messages de l'application, dans le répertoire des données")
+    parser.add_argument('--json', dest='json_file',
+                        help="rapports au format JSON (un par ligne), dans le répertoire des données")
+    args = parser.parse_args(argv)
+    # Au-delà, la lecture du DHT11 vieillit plus que l'âge maximal accepté par la boucle
+    max_cadence = SENSOR_MAX_AGE / DHT_INTERVAL
+    if not 0 < args.cadence <= max_cadence:
+        parser.error(f"--cadence doit être comprise entre 0 et {max_cadence:g}")
+    return args
+
+
+def prepare_data_dir(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+    data_file = os.path.join(args.data_dir, 'data.json')
+    if args.config:
+        shutil.copyfile(args.config, data_file)
+    if args.seed is not None:
+        config = {}
+        if os.path.exists(data_file):
+            with open(data_file) as file:
+                config = json.load(file)
+        # Scénarios et paramètres par défaut ajoutés par initialize_data_files
+        config.setdefault('simulation', {})['seed'] = args.seed
+        with open(data_file, 'w') as file:
+            json.dump(config, file, indent=2)
+
+
+def data_size(directory):
+    """Taille totale (octets) et nombre de fichiers du répertoire des données"""
+    total, count = 0, 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+            count += 1
+    return total, count
+
+
+class SimulatedNodes:
+    """Nœuds ESP32 virtuels : sol du modèle simulé, envoi périodique par l'API,
+    arrosage quand le hub répond 'water' (composant de clock.run_events())"""
+
+    def __init__(self, app_module, count, interval):
+        self.app = app_module
+        self.client = app_module.app.test_client()
+        self.garden = app_module.hal.garden
+        self.node_ids = [f"SIM_{i + 1:03d}" for i in range(count)]
+        self.interval = interval
+        self._next_send = None
+        self.pending_watering = {}  # nœud -> durée (minutes) à déclarer au prochain envoi
+        self.posts = 0
+        self.errors = 0
+        self.waterings = 0
+        self.waits = 0
+
+    def send(self, node_id):
+        duration = self.pending_watering.pop(node_id, None)
+        payload = {
+            'temperature': round(self.garden.air_temperature(), 1),
+            'air_humidity': round(self.garden.air_humidity(), 1),
+            'soil_moisture': round(self.garden.soil_moisture(('node', node_id)), 1),
+            'watering_event': duration is not None,
+            'watering_duration': duration or 0,
+            'battery_level': 100
+        }
+        response = self.client.post(f'/api/nodes/{node_id}/data', json=payload)
+        self.posts += 1
+        if response.status_code != 200:
+            self.errors += 1
+            return
+        answer = response.get_json()
+        if answer.get('action') == 'water':
+            self.garden.water(('node', node_id), answer['duration'])
+            self.pending_watering[node_id] = answer['duration']
+            self.waterings += 1
+        elif answer.get('action') == 'wait':
+            self.waits += 1
+
+    def start(self):
+        if self.node_ids:
+            self._next_send = clock.monotonic()
+
+    def next_deadline(self):
+        return self._next_send
+
+    def run_due(self):
+        if self._next_send is None or clock.monotonic() < self._next_send:
+            return
+        for node_id in self.node_ids:
+            self.send(node_id)
+        self._next_send = max(self._next_send + self.interval, clock.monotonic())
+
+    def stats(self):
+        return {'posts': self.posts, 'errors': self.errors, 'waterings': self.waterings, 'waits': self.waits}
+
+
+def time_queries(client):
+    """Temps de réponse réel (ms) de chaque requête chronométrée"""
+    timings = {}
+    for path in TIMED_QUERIES:
+        started = time.perf_counter()
+        response = client.get(path)
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        timings[path] = elapsed if response.status_code == 200 else f"{elapsed} ({response.status_code})"
+    return timings
+
+
+def build_report(app_module, nodes, data_dir, started, real_started):
+    size, files = data_size(data_dir)
+    counters = app_module.watering_counters.snapshot()
+    return {
+        'simulated_time': clock.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'elapsed_days': round((clock.now() - started).total_seconds() / 86400, 2),
+        'real_seconds': round(time.perf_counter() - real_started, 1),
+        'data_bytes': size,
+        'data_files': files,
+        'hub_waterings': counters.get('total_waterings'),
+        'water_volume': counters.get('total_volume'),
+        'control_max_lateness': round(app_module.control_scheduler.max_lateness, 3),
+        'missed_scheduled_waterings': len(app_module.watering_schedule.missed),
+        'zone_queue': len(app_module.zone_scheduler.status()['queued']),
+        'sensors': app_module.sensor_service.stats(),
+        'nodes': nodes.stats(),
+        'query_ms': time_queries(app_module.app.test_client())
+    }
+
+
+def print_report(report, file=None):
+    print(f"[{report['simulated_time']}] jour {report['elapsed_days']:g} ({report['real_seconds']:g} s réelles) : "
+          f"{report['data_bytes'] / 1024:.0f} Kio en {report['data_files']} fichiers, "
+          f"{report['hub_waterings']} arrosages du hub, retard max de la boucle {report['control_max_lateness']} s, "
+          f"{report['missed_scheduled_waterings']} programmation(s) manquée(s), "
+          f"nœuds {report['nodes']}", file=file)
+    print("    requêtes (ms) : " + ", ".join(f"{path} {ms}" for path, ms in report['query_ms'].items()),
+          file=file, flush=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    prepare_data_dir(args)
+    os.chdir(args.data_dir)
+    os.environ['HOMEGARDEN_HARDWARE'] = 'simulated'
+
+    # L'horloge est virtuelle avant la création des objets de l'application
+    clock.virtualize(args.start)
+    started = clock.now()
+    end = started + datetime.timedelta(days=args.days)
+    print(f"Simulation de {args.days:g} jour(s) à partir du {started:%Y-%m-%d %H:%M}")
+
+    json_output = open(args.json_file, 'a') if args.json_file else None
+    with open(args.log, 'a') as log, contextlib.redirect_stdout(log):
+        import app as app_module
+        app_module.initialize_data_files()
+        components = app_module.start_services(stepping=True, interval_scale=args.cadence)
+        nodes = SimulatedNodes(app_module, args.nodes, args.node_interval)
+        nodes.start()
+        components.append(nodes)
+        real_started = time.perf_counter()
+        try:
+            next_report = started
+            while clock.now() < end:
+                next_report = min(next_report + datetime.timedelta(hours=args.report_hours), end)
+                clock.run_events(components, next_report.timestamp())
+                report = build_report(app_module, nodes, '.', started, real_started)
+                print_report(report, sys.__stdout__)
+                if json_output:
+                    json_output.write(json.dumps(report) + "\n")
+                    json_output.flush()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            app_module.query_pool.shutdown()
+    if json_output:
+        json_output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Lecture des fichiers de logs depuis la fin
+Permet de paginer l'historique (plus récent d'abord) et de ne relire que
+les dernières heures au démarrage, sans parcourir tout le fichier
+"""
+import os
+import datetime
+
+BLOCK_SIZE = 8192
+
+
+def read_lines_reverse(filename, end_offset=None, block_size=BLOCK_SIZE):
+    """Parcourt les lignes d'un fichier de la dernière à la première
+
+    Args:
+        filename: chemin du fichier
+        end_offset: position (en octets) où commencer la lecture à rebours,
+            la fin du fichier par défaut
+        block_size: taille des blocs lus
+
+    Yields:
+        tuple: (ligne décodée sans '\\n', position de début de ligne en octets)
+    """
+    try:
+        f = open(filename, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        file_size = os.fstat(f.fileno()).st_size
+        position = file_size if end_offset is None else max(0, min(end_offset, file_size))
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size) + remainder
+            lines = chunk.split(b'\n')
+            # La première ligne du bloc peut être incomplète : on la garde pour le bloc suivant
+            remainder = lines.pop(0)
+            line_end = position + len(chunk)
+            for raw_line in reversed(lines):
+                line_end -= len(raw_line) + 1
+                if raw_line.strip():
+                    yield raw_line.decode('utf-8', errors='replace').strip(), line_end + 1
+        if remainder.strip():
+            yield remainder.decode('utf-8', errors='replace').strip(), 0
+
+
+def parse_log_timestamp(timestamp_str):
+    """Parse un timestamp de log ("YYYY-MM-DD HH:MM:SS" avec ou sans microsecondes)"""
+    try:
+        return datetime.datetime.fromisoformat(timestamp_str.strip())
+    except ValueError:
+        return None
+
+
+def parse_log_value(value_str):
+    """Convertit une valeur de log en float, None si manquante ('--', 'None')"""
+    try:
+        return float(value_str)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_recent_rows(filename, since):
+    """Lit uniquement la fin d'un log, jusqu'à la première ligne antérieure à 'since'
+
+    Returns:
+        list: [(datetime, [valeurs float ou None]), ...] dans l'ordre chronologique
+    """
+    rows = []
+    for line, _ in read_lines_reverse(filename):
+        parts = line.split(", ")
+        timestamp = parse_log_timestamp(parts[0])
+        if timestamp is None:
+            continue
+        if timestamp < since:
+            break
+        rows.append((timestamp, [parse_log_value(value) for value in parts[1:]]))
+    rows.reverse()
+    return rows
@@ -7,10 +7,19 @@ import os
 import datetime
 from threading import Lock
 
+from sensor_store import record_row
+from ring_buffer import sensor_rings, format_timestamps, column_to_list
+from query_cache import cached_query, bump_generation
+from query_pool import query_pool, check_deadline
+from clock import clock
+
 # Fichier de stockage des nœuds
 NODES_FILE = "nodes.json"
 NODES_LOCK = Lock()
 
+# Répertoire des logs par nœud
+NODES_DATA_DIR = "nodes_data"
+
 def load_nodes():
     """Charge la configuration des nœuds depuis le fichier"""
     if os.path.exists(NODES_FILE):
@@ -35,7 +44,7 @@ def register_node(node_id, node_info):
             'id': node_id,
             'name': node_info.get('name', f'Node {node_id}'),
             'location': node_info.get('location', 'Non spécifié'),
-            'registered_at': datetime.datetime.now().isoformat(),
+            'registered_at': clock.now().isoformat(),
             'last_seen': None,
             'status': 'offline',
             'battery_level': None,
@@ -44,7 +53,7 @@ def register_node(node_id, node_info):
     
     # Mise à jour des informations
     nodes[node_id].update({
-        'last_seen': datetime.datetime.now().isoformat(),
+        'last_seen': clock.now().isoformat(),
         'status': 'online',
         'battery_level': node_info.get('battery_level'),
         'solar_charging': node_info.get('solar_charging', False),
@@ -64,7 +73,7 @@ def get_all_nodes():
     """Récupère tous les nœuds"""
     nodes = load_nodes()
     # Marquer les nœuds offline s'ils n'ont pas été vus depuis plus de 5 minutes
-    now = datetime.datetime.now()
+    now = clock.now()
     for node_id, node in nodes.items():
         if node.get('last_seen'):
             last_seen = datetime.datetime.fromisoformat(node['last_seen'])
@@ -74,21 +83,24 @@ def get_all_nodes():
 
 def record_node_data(node_id, sensor_data):
     """Enregistre les données d'un nœud dans les fichiers de log"""
-    timestamp = datetime.datetime.now().replace(microsecond=0)
+    timestamp = clock.now().replace(microsecond=0)
     
     # Fichiers de log par nœud
-    node_log_dir = "nodes_data"
+    node_log_dir = NODES_DATA_DIR
     if not os.path.exists(node_log_dir):
         os.makedirs(node_log_dir)
     
     # Log température/humidité
     if sensor_data.get('temperature') is not None or sensor_data.get('air_humidity') is not None:
+        record_row(node_id, 'temp_humidity', timestamp,
+                   (sensor_data.get('temperature'), sensor_data.get('air_humidity')))
         temp_hum_file = os.path.join(node_log_dir, f"{node_id}_temp_humidity.csv")
         with open(temp_hum_file, "a") as f:
             f.write(f"{timestamp}, {sensor_data.get('temperature', '--')}, {sensor_data.get('air_humidity', '--')}\n")
     
     # Log humidité du sol
     if sensor_data.get('soil_moisture') is not None:
+        record_row(node_id, 'soil_moisture', timestamp, (sensor_data.get('soil_moisture'),))
         soil_file = os.path.join(node_log_dir, f"{node_id}_soil_moisture.csv")
         with open(soil_file, "a") as f:
             f.write(f"{timestamp}, {sensor_data.get('soil_moisture', '--')}\n")
@@ -98,12 +110,27 @@ def record_node_data(node_id, sensor_data):
         watering_file = os.path.join(node_log_dir, f"{node_id}_watering.csv")
         with open(watering_file, "a") as f:
             f.write(f"{timestamp}, {sensor_data.get('watering_duration', 0)}\n")
+    
+    bump_generation(node_id)
 
+@cached_query(series=lambda node_id, **_: [node_id], time_bucket=60)
 def get_node_history(node_id, hours=24):
-    """Récupère l'historique d'un nœud"""
-    node_log_dir = "nodes_data"
-    cutoff_time = datetime.datetime.now() - datetime.timedelta(hours=hours)
+    """Récupère l'historique d'un nœud
+
+    Servi depuis les tampons circulaires en mémoire quand ils couvrent la
+    période demandée, sinon relu dans les logs du nœud.
+    """
+    node_log_dir = NODES_DATA_DIR
+    cutoff_time = clock.now() - datetime.timedelta(hours=hours)
     
+    history = get_node_history_from_rings(node_id, cutoff_time)
+    if history is not None:
+        return history
+    # Relecture complète des logs : hors du processus principal
+    return query_pool.run(read_node_history_files, node_id, cutoff_time, node_log_dir)
+
+def read_node_history_files(node_id, cutoff_time, node_log_dir=NODES_DATA_DIR, deadline=None):
+    """Relit l'historique d'un nœud dans ses fichiers de log (exécuté dans le pool de processus)"""
     history = {
         'timestamps': [],
         'temperatures': [],
@@ -116,7 +143,9 @@ def get_node_history(node_id, hours=24):
     temp_hum_file = os.path.join(node_log_dir, f"{node_id}_temp_humidity.csv")
     if os.path.exists(temp_hum_file):
         with open(temp_hum_file, "r") as f:
-            for line in f:
+            for line_number, line in enumerate(f):
+                if line_number % 10000 == 0:
+                    check_deadline(deadline)
                 parts = line.strip().split(", ")
                 if len(parts) >= 3:
                     try:
@@ -134,7 +163,9 @@ def get_node_history(node_id, hours=24):
     soil_file = os.path.join(node_log_dir, f"{node_id}_soil_moisture.csv")
     if os.path.exists(soil_file):
         with open(soil_file, "r") as f:
-            for line in f:
+            for line_number, line in enumerate(f):
+                if line_number % 10000 == 0:
+                    check_deadline(deadline)
                 parts = line.strip().split(", ")
                 if len(parts) >= 2:
                     try:
@@ -150,3 +181,31 @@ def get_node_history(node_id, hours=24):
     
     return history
 
+def get_node_history_from_rings(node_id, cutoff_time):
+    """Historique d'un nœud depuis les tampons circulaires (None s'ils ne couvrent pas la période)"""
+    for series in ('temp_humidity', 'soil_moisture'):
+        if not sensor_rings.covers(node_id, series, cutoff_time):
+            return None
+    temp_hum_ring = sensor_rings.get(node_id, 'temp_humidity')
+    soil_ring = sensor_rings.get(node_id, 'soil_moisture')
+    
+    history = {
+        'timestamps': [],
+        'temperatures': [],
+        'humidities': [],
+        'soil_moistures': [],
+        'waterings': []
+    }
+    if temp_hum_ring is not None:
+        times, values = temp_hum_ring.window(cutoff_time)
+        history['timestamps'] = format_timestamps(times)
+        history['temperatures'] = column_to_list(values[:, 0])
+        history['humidities'] = column_to_list(values[:, 1])
+    if soil_ring is not None:
+        times, values = soil_ring.window(cutoff_time)
+        history['soil_moistures'] = [
+            {'timestamp': timestamp, 'moisture': moisture}
+            for timestamp, moisture in zip(format_timestamps(times), column_to_list(values[:, 0]))
+        ]
+    return history
+
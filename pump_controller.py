@@ -0,0 +1,213 @@
+"""
+Contrôleur de la pompe
+Un seul thread possède la sortie de la pompe : les demandes de démarrage et
+d'arrêt (boucle de contrôle, arrosages programmés, routes Flask) passent par
+une file de commandes et sont appliquées une à une. L'état est publié dans un
+instantané immuable que les lecteurs consultent sans verrou ni accès au GPIO.
+L'arrêt à la fin de la durée prévue est une échéance de ce même thread.
+En simulation (temps virtuel, un seul thread), le contrôleur fonctionne pas
+à pas : les commandes s'exécutent dans le thread appelant.
+"""
+import queue
+import datetime
+import threading
+
+from clock import clock
+
+# Délai maximal d'attente de la réponse à une commande (secondes)
+COMMAND_TIMEOUT = 5.0
+
+
+class PumpState:
+    """Instantané de l'état de la pompe (remplacé à chaque changement, jamais modifié)"""
+
+    def __init__(self, on=False, started_at=None, duration_minutes=None, source=None,
+                 last_watering_time=None, sequence=0):
+        self.on = on
+        self.started_at = started_at              # datetime du démarrage en cours
+        self.duration_minutes = duration_minutes  # durée prévue de l'arrosage en cours
+        self.source = source                      # origine de la demande en cours
+        self.last_watering_time = last_watering_time
+        self.sequence = sequence
+
+    @property
+    def label(self):
+        return "Allumée" if self.on else "Éteinte"
+
+    def elapsed_minutes(self, now=None):
+        if not self.on or self.started_at is None:
+            return None
+        return ((now or clock.now()) - self.started_at).total_seconds() / 60
+
+    def to_dict(self):
+        return {
+            'pump_status': self.label,
+            'started_at': self.started_at.strftime("%Y-%m-%d %H:%M:%S") if self.started_at else None,
+            'duration_minutes': self.duration_minutes,
+            'source': self.source
+        }
+
+    def to_message(self):
+        """État complet pour un autre processus (voir from_message)"""
+        return {
+            'on': self.on,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration_minutes': self.duration_minutes,
+            'source': self.source,
+            'last_watering_time': self.last_watering_time.isoformat() if self.last_watering_time else None,
+            'sequence': self.sequence
+        }
+
+    @classmethod
+    def from_message(cls, message):
+        def parse(value):
+            return datetime.datetime.fromisoformat(value) if value else None
+        return cls(message['on'], parse(message['started_at']), message['duration_minutes'],
+                   message['source'], parse(message['last_watering_time']), message['sequence'])
+
+
+class PumpCommandResult:
+    def __init__(self, accepted, message, duration_seconds=None):
+        self.accepted = accepted
+        self.message = message
+        self.duration_seconds = duration_seconds  # durée de l'arrosage arrêté
+
+
+class PumpController:
+    """Acteur de la pompe
+
+    Args:
+        switch: fonction booléen -> None qui allume (True) ou éteint (False) la
+            pompe ; appelée uniquement depuis le thread du contrôleur
+        on_stopped: fonction (début, durée en secondes, raison) appelée après
+            chaque arrêt d'un arrosage (enregistrement)
+        on_change: fonction (PumpState) appelée après chaque changement d'état
+    """
+
+    def __init__(self, switch, on_stopped=None, on_change=None):
+        self._switch = switch
+        self._on_stopped = on_stopped
+        self._on_change = on_change
+        self._commands = queue.Queue()
+        self._claim_lock = threading.Lock()  # prise en charge / abandon d'une commande
+        self._deadline = None  # échéance monotone de l'arrêt prévu
+        self._thread = None
+        self._stepping = False
+        self.state = PumpState()
+
+    def start(self, duration_minutes, source, min_interval_minutes=None, timeout=COMMAND_TIMEOUT):
+        """Demande un arrosage ; refusé si la pompe tourne déjà ou si le dernier
+        arrosage date de moins de 'min_interval_minutes'"""
+        return self._submit('start', timeout, duration_minutes=float(duration_minutes), source=source,
+                            min_interval_minutes=min_interval_minutes)
+
+    def stop(self, reason, timeout=COMMAND_TIMEOUT):
+        """Demande l'arrêt de la pompe (sans effet si elle est déjà éteinte)"""
+        return self._submit('stop', timeout, reason=reason)
+
+    def _submit(self, action, timeout, **arguments):
+        command = {'action': action, 'done': threading.Event(), 'result': None,
+                   'claimed': False, 'cancelled': False, **arguments}
+        if self._stepping:
+            return self._execute(command)
+        self._commands.put(command)
+        if not command['done'].wait(timeout):
+            with self._claim_lock:
+                command['cancelled'] = not command['claimed']
+            if command['cancelled']:
+                # Abandonnée : le contrôleur l'ignorera, l'appelant peut libérer son créneau
+                return PumpCommandResult(False, "Contrôleur de pompe sans réponse")
+            # Déjà en cours d'exécution : son résultat est celui qui s'applique
+            command['done'].wait()
+        return command['result']
+
+    def run(self):
+        """Boucle du contrôleur : commandes dans l'ordre d'arrivée et échéance d'arrêt"""
+        self._switch(False)
+        while True:
+            timeout = None if self._deadline is None else max(0.0, self._deadline - clock.monotonic())
+            try:
+                command = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                self._stop("durée prévue atteinte")
+                continue
+            with self._claim_lock:
+                if command['cancelled']:
+                    continue
+                command['claimed'] = True
+            command['result'] = self._execute(command)
+            command['done'].set()
+
+    def _execute(self, command):
+        try:
+            if command['action'] == 'start':
+                return self._start(command['duration_minutes'], command['source'],
+                                   command['min_interval_minutes'])
+            return self._stop(command['reason'])
+        except Exception as e:
+            print(f"Erreur du contrôleur de pompe : {e}")
+            return PumpCommandResult(False, str(e))
+
+    def _publish(self, state):
+        self.state = state
+        if self._on_change:
+            try:
+                self._on_change(state)
+            except Exception as e:
+                print(f"Erreur lors de la diffusion de l'état de la pompe : {e}")
+
+    def _start(self, duration_minutes, source, min_interval_minutes):
+        current = self.state
+        if current.on:
+            return PumpCommandResult(False, "La pompe est déjà allumée")
+        now = clock.now()
+        if min_interval_minutes and current.last_watering_time:
+            minutes_since_last = (now - current.last_watering_time).total_seconds() / 60
+            if minutes_since_last < min_interval_minutes:
+                return PumpCommandResult(False, f"Protection anti-arrosage : Dernier arrosage il y a "
+                                                f"{minutes_since_last:.1f} min (minimum: {min_interval_minutes} min)")
+        self._switch(True)
+        self._deadline = clock.monotonic() + duration_minutes * 60
+        self._publish(PumpState(True, now, duration_minutes, source, now, current.sequence + 1))
+        print(f"Pompe allumée à {now} pour {duration_minutes} minutes ({source})")
+        return PumpCommandResult(True, f"Pompe démarrée pour {duration_minutes:g} minute(s)")
+
+    def _stop(self, reason):
+        current = self.state
+        self._deadline = None
+        self._switch(False)
+        if not current.on:
+            return PumpCommandResult(True, "Pompe arrêtée")
+        now = clock.now()
+        duration_seconds = (now - current.started_at).total_seconds()
+        self._publish(PumpState(False, last_watering_time=now, sequence=current.sequence + 1))
+        print(f"Pompe éteinte à {now} ({reason}), durée d'arrosage : {duration_seconds} secondes")
+        if self._on_stopped:
+            try:
+                self._on_stopped(current.started_at, duration_seconds, reason)
+            except Exception as e:
+                print(f"Erreur lors de l'enregistrement de l'arrosage : {e}")
+        return PumpCommandResult(True, "Pompe arrêtée", duration_seconds)
+
+    def mirror(self, state):
+        """Reprend l'état publié par le contrôleur d'un autre processus (lecture seule)"""
+        self.state = state
+
+    def start_stepping(self):
+        """Mode pas à pas (simulation en temps virtuel) : pas de thread, l'arrêt
+        prévu est exécuté par run_due()"""
+        self._stepping = True
+        self._switch(False)
+
+    def next_deadline(self):
+        return self._deadline
+
+    def run_due(self):
+        if self._deadline is not None and clock.monotonic() >= self._deadline:
+            self._stop("durée prévue atteinte")
+
+    def start_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name='pump-controller', daemon=True)
+            self._thread.start()
+        return self._thread
@@ -0,0 +1,274 @@
+"""
+Esquisses de quantiles fusionnables (t-digest) pour les capteurs
+Chaque source (hub, nœud) et métrique possède une esquisse par heure, fusionnée
+en esquisses journalières en vieillissant. Les percentiles d'une période
+quelconque s'obtiennent en fusionnant les esquisses, sans relire les logs
+"""
+import os
+import json
+import math
+import datetime
+import threading
+from array import array
+
+from clock import clock
+
+# Compression du t-digest : nombre approximatif de centroïdes conservés
+DEFAULT_COMPRESSION = 40
+# Taille des seaux (secondes) et durée de conservation
+HOUR_BUCKET = 3600
+DAY_BUCKET = 86400
+HOURLY_RETENTION_HOURS = 7 * 24
+DAILY_RETENTION_DAYS = 180
+# Percentiles exposés par l'API
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+
+
+class TDigest:
+    """t-digest fusionnable (variante "merging", fonction d'échelle k1)"""
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self._means = array('d')
+        self._weights = array('d')
+        self._buffer = []
+        self._min = math.inf
+        self._max = -math.inf
+
+    @property
+    def count(self):
+        return sum(self._weights) + sum(w for _, w in self._buffer)
+
+    def add(self, value, weight=1.0):
+        self._buffer.append((value, weight))
+        if value < self._min:
+            self._min = value
+        if value > self._max:
+            self._max = value
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        """Fusionne une autre esquisse dans celle-ci"""
+        other._compress()
+        self._buffer.extend(zip(other._means, other._weights))
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        self._compress()
+        return self
+
+    def _q_to_k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _k_to_q(self, k):
+        k = min(k, self.compression / 4)
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        centroids = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in centroids)
+
+        means = array('d')
+        weights = array('d')
+        current_mean, current_weight = centroids[0]
+        weight_so_far = 0.0
+        weight_limit = total * self._k_to_q(self._q_to_k(0.0) + 1)
+        for mean, weight in centroids[1:]:
+            if weight_so_far + current_weight + weight <= weight_limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                weight_so_far += current_weight
+                means.append(current_mean)
+                weights.append(current_weight)
+                weight_limit = total * self._k_to_q(self._q_to_k(weight_so_far / total) + 1)
+                current_mean, current_weight = mean, weight
+        means.append(current_mean)
+        weights.append(current_weight)
+        self._means, self._weights = means, weights
+
+    def quantile(self, q):
+        """Estimation du quantile q (0-1), None si l'esquisse est vide"""
+        self._compress()
+        n = len(self._means)
+        if n == 0:
+            return None
+        if n == 1:
+            return self._means[0]
+        total = sum(self._weights)
+        target = q * total
+
+        # Extrémités : interpolation vers le min / max exacts
+        first_half = self._weights[0] / 2
+        if target < first_half:
+            return self._min + (self._means[0] - self._min) * target / first_half
+        last_half = self._weights[-1] / 2
+        if target > total - last_half:
+            return self._max - (self._max - self._means[-1]) * (total - target) / last_half
+
+        cumulative = first_half
+        for i in range(n - 1):
+            step = (self._weights[i] + self._weights[i + 1]) / 2
+            if cumulative + step >= target:
+                fraction = (target - cumulative) / step
+                return self._means[i] + (self._means[i + 1] - self._means[i]) * fraction
+            cumulative += step
+        return self._means[-1]
+
+    def to_dict(self):
+        self._compress()
+        return {
+            'means': list(self._means),
+            'weights': list(self._weights),
+            'min': self._min if self._means else None,
+            'max': self._max if self._means else None
+        }
+
+    @classmethod
+    def from_dict(cls, data, compression=DEFAULT_COMPRESSION):
+        digest = cls(compression)
+        digest._means = array('d', data.get('means', []))
+        digest._weights = array('d', data.get('weights', []))
+        if data.get('min') is not None:
+            digest._min = data['min']
+            digest._max = data['max']
+        return digest
+
+
+class SketchStore:
+    """Esquisses par (source, métrique) et par seau horaire puis journalier"""
+
+    def __init__(self, compression=DEFAULT_COMPRESSION,
+                 hourly_retention_hours=HOURLY_RETENTION_HOURS,
+                 daily_retention_days=DAILY_RETENTION_DAYS):
+        self.compression = compression
+        self.hourly_retention = hourly_retention_hours * HOUR_BUCKET
+        self.daily_retention = daily_retention_days * DAY_BUCKET
+        self._hourly = {}  # (source, metric) -> {début du seau: TDigest}
+        self._daily = {}
+        self._recorded_until = {}  # (source, metric) -> timestamp epoch du dernier échantillon
+        self._lock = threading.Lock()
+
+    def record(self, source, metric, value, timestamp=None):
+        """Ajoute un échantillon dans le seau horaire correspondant"""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if value != value:  # NaN
+            return
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = timestamp.timestamp()
+        timestamp = clock.time() if timestamp is None else timestamp
+        bucket = int(timestamp // HOUR_BUCKET) * HOUR_BUCKET
+
+        with self._lock:
+            key = (source, metric)
+            self._recorded_until[key] = max(self._recorded_until.get(key, timestamp), timestamp)
+            buckets = self._hourly.setdefault(key, {})
+            digest = buckets.get(bucket)
+            if digest is None:
+                digest = buckets[bucket] = TDigest(self.compression)
+                self._roll_up(source, metric, bucket)
+            digest.add(value)
+
+    def _roll_up(self, source, metric, newest_bucket):
+        """Fusionne les seaux horaires trop anciens dans les seaux journaliers"""
+        hourly = self._hourly[(source, metric)]
+        daily = self._daily.setdefault((source, metric), {})
+        hourly_cutoff = newest_bucket - self.hourly_retention
+        for bucket in [b for b in hourly if b < hourly_cutoff]:
+            day = int(bucket // DAY_BUCKET) * DAY_BUCKET
+            daily.setdefault(day, TDigest(self.compression)).merge(hourly.pop(bucket))
+        daily_cutoff = newest_bucket - self.daily_retention
+        for day in [d for d in daily if d < daily_cutoff]:
+            del daily[day]
+
+    def query(self, source, metric, start, end, quantiles=DEFAULT_QUANTILES):
+        """Percentiles sur [start, end[ par fusion des seaux qui chevauchent la période
+
+        La précision temporelle est celle des seaux (1h, puis 1 jour au-delà
+        de la rétention horaire).
+
+        Args:
+            start, end: datetime ou secondes epoch
+
+        Returns:
+            dict: {'p5': ..., 'p50': ..., 'p95': ..., 'count': ...}
+        """
+        if isinstance(start, datetime.datetime):
+            start = start.timestamp()
+        if isinstance(end, datetime.datetime):
+            end = end.timestamp()
+
+        merged = TDigest(self.compression)
+        with self._lock:
+            for buckets, size in ((self._hourly, HOUR_BUCKET), (self._daily, DAY_BUCKET)):
+                for bucket, digest in buckets.get((source, metric), {}).items():
+                    if bucket < end and bucket + size > start:
+                        merged.merge(digest)
+
+        result = {'count': int(merged.count)}
+        for q in quantiles:
+            value = merged.quantile(q)
+            result[f"p{q * 100:g}"] = round(value, 2) if value is not None else None
+        return result
+
+    def save(self, filename):
+        """Sauvegarde les esquisses dans un fichier JSON (écriture atomique)"""
+        with self._lock:
+            data = {
+                kind: [
+                    {'source': source, 'metric': metric,
+                     'buckets': {str(bucket): digest.to_dict() for bucket, digest in buckets.items()}}
+                    for (source, metric), buckets in store.items()
+                ]
+                for kind, store in (('hourly', self._hourly), ('daily', self._daily))
+            }
+            data['recorded_until'] = [{'source': source, 'metric': metric, 'timestamp': timestamp}
+                                      for (source, metric), timestamp in self._recorded_until.items()]
+        temp_filename = filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            # dumps (encodeur C) plutôt que dump, qui encode morceau par morceau en Python
+            f.write(json.dumps(data))
+        os.replace(temp_filename, filename)
+
+    def load(self, filename):
+        """Recharge les esquisses sauvegardées
+
+        Returns:
+            bool: True si le fichier existait et a été chargé
+        """
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            for kind, store in (('hourly', self._hourly), ('daily', self._daily)):
+                store.clear()
+                for entry in data.get(kind, []):
+                    store[(entry['source'], entry['metric'])] = {
+                        int(bucket): TDigest.from_dict(digest, self.compression)
+                        for bucket, digest in entry['buckets'].items()
+                    }
+            if 'recorded_until' in data:
+                self._recorded_until = {(entry['source'], entry['metric']): entry['timestamp']
+                                        for entry in data['recorded_until']}
+            else:
+                # Sauvegarde d'une version précédente : heure d'écriture du fichier
+                saved_at = os.path.getmtime(filename)
+                self._recorded_until = {key: saved_at for key in list(self._hourly) + list(self._daily)}
+        return True
+
+    def recorded_until(self, source, metric):
+        """Timestamp epoch du dernier échantillon enregistré (None si aucun)"""
+        with self._lock:
+            return self._recorded_until.get((source, metric))
+
+
+# Instance partagée par l'application et l'API des nœuds
+sensor_sketches = SketchStore()
@@ -0,0 +1,137 @@
+"""
+Cache des résultats de requêtes indexé par génération des données
+Chaque série (hub, nœud, arrosages...) possède un compteur de génération
+incrémenté à chaque ajout. Une requête identique entre deux ajouts est servie
+depuis la mémoire ; éviction LRU avec un plafond mémoire adapté au Raspberry Pi
+"""
+import json
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+from clock import clock
+
+# Limites du cache
+MAX_ENTRIES = 256
+MAX_BYTES = 4 * 1024 * 1024
+
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def bump_generation(series):
+    """Signale un ajout dans une série : invalide les résultats qui en dépendent"""
+    with _generations_lock:
+        _generations[series] = _generations.get(series, 0) + 1
+
+
+def generation(series):
+    with _generations_lock:
+        return _generations.get(series, 0)
+
+
+def _estimate_size(value):
+    """Taille approximative d'un résultat (octets de sa forme JSON)"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class QueryCache:
+    """Cache LRU borné en nombre d'entrées et en mémoire"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # clé -> (valeur, taille)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], True
+
+    def put(self, key, value):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Cache partagé par toute l'application
+query_cache = QueryCache()
+
+
+def cached_query(series, time_bucket=None, cache=None):
+    """Décorateur : mémorise le résultat tant que les séries concernées n'ont pas changé
+
+    Args:
+        series: liste de noms de séries, ou fonction recevant les arguments de
+            la fonction décorée et retournant cette liste
+        time_bucket: pour les requêtes sur une fenêtre glissante ("dernières 24h"),
+            durée en secondes au-delà de laquelle le résultat est recalculé même
+            sans nouvel ajout
+        cache: instance de QueryCache (cache partagé par défaut)
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target = cache or query_cache
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            names = series(**bound.arguments) if callable(series) else series
+            key = (
+                func.__qualname__,
+                tuple(bound.arguments.items()),
+                tuple(generation(name) for name in names),
+                int(clock.time() // time_bucket) if time_bucket else None
+            )
+            value, found = target.get(key)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            target.put(key, value)
+            return value
+
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+"""
+Pool de processus pour les requêtes analytiques lourdes
+Exports et historiques relus dans les logs s'exécutent dans des processus
+séparés : ils utilisent les autres cœurs sans prendre le GIL du thread de
+surveillance (lectures capteurs, arrêt de la pompe)
+"""
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+# Processus de calcul : le Raspberry Pi garde un cœur pour le contrôle et Flask
+QUERY_WORKERS = 2
+# Requêtes en attente ou en cours au-delà desquelles les nouvelles sont refusées
+MAX_PENDING_QUERIES = 8
+# Durée maximale d'une requête (secondes)
+QUERY_TIMEOUT = 30
+
+
+class QueryError(Exception):
+    """Requête analytique non aboutie"""
+
+
+class QueryTimeout(QueryError):
+    """Délai dépassé : la requête a été annulée"""
+
+
+class QueryPoolBusy(QueryError):
+    """Trop de requêtes en attente"""
+
+
+def check_deadline(deadline):
+    """Annulation coopérative : à appeler entre deux fichiers ou blocs de lignes"""
+    if deadline is not None and time.time() > deadline:
+        raise QueryTimeout("Délai dépassé")
+
+
+def _noop():
+    return None
+
+
+class QueryPool:
+    """ProcessPoolExecutor borné, avec délai et annulation par requête
+
+    Les processus sont créés par fork ; start() doit être appelé au démarrage,
+    avant les threads de surveillance et de Flask, pour que les processus
+    n'héritent d'aucun verrou tenu par un autre thread. Pour la même raison,
+    aucun pool n'est recréé ensuite : si un processus est tué (mémoire
+    insuffisante...), le pool est abandonné et les requêtes s'exécutent dans le
+    thread appelant, avec le même délai, jusqu'au prochain démarrage. Les
+    fonctions exécutées doivent être des fonctions de module (sérialisables) qui
+    acceptent un argument 'deadline' et appellent check_deadline() régulièrement.
+    """
+
+    def __init__(self, max_workers=QUERY_WORKERS, max_pending=MAX_PENDING_QUERIES, timeout=QUERY_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.broken = False
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def start(self):
+        """Crée le pool et ses processus (au démarrage, avant tout thread)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('fork')
+                )
+                executor = self._executor
+            else:
+                return
+        # Les processus sont créés à la soumission : on les lance tout de suite
+        for future in [executor.submit(_noop) for _ in range(self.max_workers)]:
+            future.result()
+
+    def _submit(self, func, args, kwargs, deadline):
+        """Soumet la requête au pool ; None s'il n'est pas démarré ou s'il est cassé"""
+        executor = self._executor
+        if executor is None:
+            return None
+        try:
+            return executor.submit(func, *args, deadline=deadline, **kwargs)
+        except BrokenProcessPool:
+            self._abandon()
+            return None
+
+    def _abandon(self):
+        """Pool cassé : abandonné sans en recréer un (fork interdit une fois les threads lancés)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.broken = True
+        if executor is not None:
+            print("⚠️ Processus de calcul arrêté : requêtes analytiques exécutées dans le serveur web "
+                  "jusqu'au prochain démarrage")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, func, *args, timeout=None, **kwargs):
+        """Exécute func(*args, deadline=..., **kwargs) dans le pool et attend le résultat
+
+        Raises:
+            QueryPoolBusy: trop de requêtes en attente
+            QueryTimeout: délai dépassé (la requête est annulée)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not self._pending.acquire(blocking=False):
+            self.rejected += 1
+            raise QueryPoolBusy("Trop de requêtes analytiques en cours, réessayer plus tard")
+        try:
+            deadline = time.time() + timeout
+            future = self._submit(func, args, kwargs, deadline)
+            try:
+                if future is None:
+                    # Pas de pool : dans ce thread, arrêtée par check_deadline
+                    result = func(*args, deadline=deadline, **kwargs)
+                else:
+                    result = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                # Encore en file : retirée ; déjà en cours : check_deadline l'arrête
+                future.cancel()
+                self.timeouts += 1
+                raise QueryTimeout(f"Requête annulée après {timeout:g} s")
+            except QueryTimeout:
+                self.timeouts += 1
+                raise
+            except BrokenProcessPool:
+                self._abandon()
+                raise QueryError("Processus de calcul arrêté pendant la requête")
+            self.completed += 1
+            return result
+        finally:
+            self._pending.release()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'broken': self.broken,
+            'timeout': self.timeout,
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'rejected': self.rejected
+        }
+
+
+# Pool partagé par toute l'application
+query_pool = QueryPool()
@@ -0,0 +1,166 @@
+"""
+Tampons circulaires en mémoire pour la fenêtre récente (48h)
+Un tableau NumPy par source et par série, dimensionné sur la cadence de la série, à résolution native :
+les endpoints d'historique lisent ici au lieu de relire les logs
+"""
+import threading
+
+import numpy as np
+
+# Durée couverte par les tampons (heures)
+HOT_WINDOW_HOURS = 48
+# Capacités : chaque tampon commence à INITIAL_CAPACITY et double tant que la
+# ligne à écraser est encore dans la fenêtre, jusqu'à MAX_CAPACITY (une ligne
+# par tour de contrôle de 5 s : hub et sondes supplémentaires ; les nœuds
+# envoient toutes les 1 à 5 min)
+INITIAL_CAPACITY = HOT_WINDOW_HOURS * 60
+MAX_CAPACITY = HOT_WINDOW_HOURS * 3600 // 5
+
+
+class RingBuffer:
+    """Tampon circulaire de lignes (timestamp, valeur1, valeur2, ...)
+
+    Les timestamps sont des datetime64[s] en heure locale, comme dans les logs.
+    Les valeurs manquantes sont stockées en NaN. Avec 'max_capacity', le tampon
+    s'agrandit plutôt que d'écraser une ligne de moins de 'window_seconds' :
+    sa taille suit la cadence réelle de la série.
+    """
+
+    def __init__(self, capacity, n_columns, max_capacity=None, window_seconds=HOT_WINDOW_HOURS * 3600):
+        self.capacity = capacity
+        self.max_capacity = max(capacity, max_capacity or capacity)
+        self._window = np.timedelta64(int(window_seconds), 's')
+        self._times = np.empty(capacity, dtype='datetime64[s]')
+        self._values = np.empty((capacity, n_columns), dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        # Début de la période dont toutes les lignes sont présentes dans le tampon
+        self.covered_since = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, values):
+        timestamp = np.datetime64(timestamp, 's')
+        row = [np.nan if value is None else value for value in values]
+        with self._lock:
+            if (self._size == self.capacity and self.capacity < self.max_capacity
+                    and self._times[self._next] > timestamp - self._window):
+                self._grow()
+            if self._size == self.capacity:
+                # La ligne écrasée sort du tampon : la couverture commence après elle
+                self.covered_since = self._times[self._next] + np.timedelta64(1, 's')
+            elif self.covered_since is None:
+                self.covered_since = timestamp
+            self._times[self._next] = timestamp
+            self._values[self._next] = row
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _grow(self):
+        """Double la capacité (bornée par max_capacity), lignes remises dans l'ordre"""
+        capacity = min(self.capacity * 2, self.max_capacity)
+        order = np.r_[self._next:self.capacity, 0:self._next]
+        times = np.empty(capacity, dtype='datetime64[s]')
+        values = np.empty((capacity, self._values.shape[1]), dtype=np.float64)
+        times[:self._size] = self._times[order]
+        values[:self._size] = self._values[order]
+        self._times, self._values = times, values
+        self._next = self._size
+        self.capacity = capacity
+
+    def last_timestamp(self):
+        """Timestamp de la dernière ligne ajoutée (None si vide)"""
+        with self._lock:
+            return self._times[self._next - 1] if self._size else None
+
+    def covers(self, since):
+        """Indique si toutes les lignes postérieures à 'since' sont dans le tampon"""
+        with self._lock:
+            return self.covered_since is not None and self.covered_since <= np.datetime64(since, 's')
+
+    def window(self, since=None):
+        """Retourne (timestamps, valeurs) depuis 'since', dans l'ordre chronologique"""
+        with self._lock:
+            if self._size < self.capacity:
+                times = self._times[:self._size].copy()
+                values = self._values[:self._size].copy()
+            else:
+                order = np.r_[self._next:self.capacity, 0:self._next]
+                times = self._times[order]
+                values = self._values[order]
+        if since is not None:
+            start = np.searchsorted(times, np.datetime64(since, 's'), side='left')
+            times, values = times[start:], values[start:]
+        return times, values
+
+
+class RingBufferStore:
+    """Tampons circulaires par (source, série)"""
+
+    def __init__(self, initial_capacity=INITIAL_CAPACITY, max_capacity=MAX_CAPACITY):
+        self.initial_capacity = initial_capacity
+        self.max_capacity = max_capacity
+        self._buffers = {}
+        # Début de la période chargée au démarrage : une série sans tampon n'a
+        # aucune ligne depuis cette date
+        self.covered_since = None
+        self._lock = threading.Lock()
+
+    def append(self, source, series, timestamp, values):
+        key = (source, series)
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = RingBuffer(self.initial_capacity, len(values),
+                                                         max_capacity=self.max_capacity)
+                # Série apparue après le démarrage à chaud : aucune ligne depuis le
+                # début de la couverture, son tampon la couvre donc aussi
+                buffer.covered_since = self.covered_since
+        buffer.append(timestamp, values)
+
+    def get(self, source, series):
+        with self._lock:
+            return self._buffers.get((source, series))
+
+    def last_timestamp(self, source, series):
+        buffer = self.get(source, series)
+        return buffer.last_timestamp() if buffer is not None else None
+
+    def covers(self, source, series, since):
+        """Indique si le tampon de la série contient toutes ses lignes depuis 'since'"""
+        with self._lock:
+            buffer = self._buffers.get((source, series))
+            if buffer is None:
+                return self.covered_since is not None and self.covered_since <= np.datetime64(since, 's')
+        return buffer.covers(since)
+
+    def mark_covered(self, since):
+        """Après un démarrage à chaud : les tampons contiennent tout depuis 'since'"""
+        with self._lock:
+            self.covered_since = np.datetime64(since, 's')
+            buffers = list(self._buffers.values())
+        for buffer in buffers:
+            with buffer._lock:
+                if buffer._size < buffer.capacity:
+                    buffer.covered_since = np.datetime64(since, 's')
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self.covered_since = None
+
+
+def format_timestamps(times):
+    """datetime64[s] -> chaînes "YYYY-MM-DD HH:MM:SS" comme dans les logs"""
+    return np.char.replace(np.datetime_as_string(times, unit='s'), 'T', ' ').tolist()
+
+
+def column_to_list(values):
+    """Colonne float64 -> liste Python, NaN remplacés par None"""
+    return [None if value != value else value for value in values.tolist()]
+
+
+# Instance partagée par l'application et l'API des nœuds
+sensor_rings = RingBufferStore()
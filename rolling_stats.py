@@ -0,0 +1,128 @@
+"""
+Agrégats glissants (min, max, moyenne) sur les dernières 24h
+Mis à jour à chaque enregistrement et expirés au fil du temps avec des files
+monotones : une requête /trends ne relit plus aucun fichier
+"""
+import datetime
+import threading
+from collections import deque
+
+from clock import clock
+
+# Durée de la fenêtre glissante (secondes)
+WINDOW_SECONDS = 24 * 3600
+
+# Métriques suivies pour chaque source (hub ou nœud)
+METRICS = ('temperature', 'air_humidity', 'soil_moisture')
+
+
+class RollingWindow:
+    """Fenêtre glissante : somme, compte et files monotones pour min/max
+
+    Chaque opération est en O(1) amorti. Les échantillons doivent arriver
+    dans l'ordre chronologique (c'est le cas des enregistrements).
+    """
+
+    def __init__(self, window_seconds=WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._samples = deque()   # (timestamp, séquence, valeur)
+        self._min_queue = deque()  # valeurs croissantes
+        self._max_queue = deque()  # valeurs décroissantes
+        self._sequence = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, value, timestamp=None):
+        timestamp = clock.time() if timestamp is None else timestamp
+        with self._lock:
+            sample = (timestamp, self._sequence, value)
+            self._sequence += 1
+            self._samples.append(sample)
+            self._sum += value
+            while self._min_queue and self._min_queue[-1][2] >= value:
+                self._min_queue.pop()
+            self._min_queue.append(sample)
+            while self._max_queue and self._max_queue[-1][2] <= value:
+                self._max_queue.pop()
+            self._max_queue.append(sample)
+            self._expire(timestamp)
+
+    def _expire(self, now):
+        cutoff = now - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            sample = self._samples.popleft()
+            self._sum -= sample[2]
+            if self._min_queue and self._min_queue[0][1] == sample[1]:
+                self._min_queue.popleft()
+            if self._max_queue and self._max_queue[0][1] == sample[1]:
+                self._max_queue.popleft()
+        if not self._samples:
+            # Repartir de zéro pour éviter la dérive de la somme flottante
+            self._sum = 0.0
+
+    def summary(self, now=None):
+        """Retourne {'min', 'max', 'avg', 'count'} sur la fenêtre (None si vide)"""
+        now = clock.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            count = len(self._samples)
+            if count == 0:
+                return {'min': None, 'max': None, 'avg': None, 'count': 0}
+            return {
+                'min': self._min_queue[0][2],
+                'max': self._max_queue[0][2],
+                'avg': self._sum / count,
+                'count': count
+            }
+
+
+class RollingAggregates:
+    """Fenêtres glissantes par source (hub, nœuds) et par métrique"""
+
+    def __init__(self, window_seconds=WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _window(self, source, metric):
+        key = (source, metric)
+        with self._lock:
+            if key not in self._windows:
+                self._windows[key] = RollingWindow(self.window_seconds)
+            return self._windows[key]
+
+    def record(self, source, metric, value, timestamp=None):
+        """Ajoute un échantillon (les valeurs manquantes sont ignorées)
+
+        Args:
+            timestamp: datetime ou secondes epoch, maintenant par défaut
+        """
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if value != value:  # NaN
+            return
+        if isinstance(timestamp, datetime.datetime):
+            timestamp = timestamp.timestamp()
+        self._window(source, metric).add(value, timestamp)
+
+    def summary(self, source, metric):
+        with self._lock:
+            window = self._windows.get((source, metric))
+        if window is None:
+            return {'min': None, 'max': None, 'avg': None, 'count': 0}
+        return window.summary()
+
+    def sources(self):
+        with self._lock:
+            return sorted({source for source, _ in self._windows})
+
+    def clear(self, source=None):
+        with self._lock:
+            for key in [key for key in self._windows if source is None or key[0] == source]:
+                del self._windows[key]
+
+
+# Instance partagée par l'application et l'API des nœuds
+sensor_windows = RollingAggregates()
@@ -0,0 +1,176 @@
+"""
+Moteur de règles des scénarios
+Les lignes d'un scénario ("> 60", "35-55", "< 20" pour le sol, la température
+et l'humidité de l'air) sont compilées une fois par version de la
+configuration en intervalles numériques. Un index sur l'humidité du sol
+découpe l'axe en segments élémentaires : une évaluation se réduit à une
+recherche dichotomique puis à quelques comparaisons.
+
+L'humidité du sol est obligatoire ; parmi les lignes qui la satisfont, la
+première dont l'air correspond aussi est préférée, à défaut la première ligne
+sur le sol seul. Une valeur d'air absente ne bloque pas, et une condition
+d'air vide ou absente accepte toute valeur.
+"""
+import json
+from bisect import bisect_left
+
+SOIL_KEY = "Humidity of soil (%)"
+TEMPERATURE_KEY = "Air temperature (°C)"
+AIR_HUMIDITY_KEY = "Air humidity (%)"
+
+INFINITY = float('inf')
+
+
+class Interval:
+    """Intervalle numérique, bornes incluses ou exclues"""
+
+    def __init__(self, low=-INFINITY, high=INFINITY, low_inclusive=False, high_inclusive=False):
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+
+    def contains(self, value):
+        if value < self.low or (value == self.low and not self.low_inclusive):
+            return False
+        if value > self.high or (value == self.high and not self.high_inclusive):
+            return False
+        return True
+
+    def bounds(self):
+        return [bound for bound in (self.low, self.high) if bound not in (-INFINITY, INFINITY)]
+
+
+def parse_condition(condition):
+    """Intervalle d'une condition "a-b", "> x" ou "< x" (None si invalide : jamais satisfaite)"""
+    if not isinstance(condition, str):
+        return None
+    condition = condition.strip()
+    try:
+        if '-' in condition:
+            parts = condition.split('-')
+            if len(parts) == 2:
+                return Interval(float(parts[0].strip()), float(parts[1].strip()), True, True)
+        elif '>' in condition:
+            parts = condition.split('>')
+            if len(parts) == 2:
+                return Interval(low=float(parts[1].strip()))
+        elif '<' in condition:
+            parts = condition.split('<')
+            if len(parts) == 2:
+                return Interval(high=float(parts[1].strip()))
+    except ValueError:
+        pass
+    return None
+
+
+def parse_air_condition(condition):
+    """Comme parse_condition, mais une condition vide ou absente accepte toute valeur"""
+    if condition is None or (isinstance(condition, str) and not condition.strip()):
+        return Interval()
+    return parse_condition(condition)
+
+
+class CompiledRule:
+    """Ligne de scénario compilée"""
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+        self.soil = parse_condition(scenario.get(SOIL_KEY))
+        self.temperature = parse_air_condition(scenario.get(TEMPERATURE_KEY))
+        self.air_humidity = parse_air_condition(scenario.get(AIR_HUMIDITY_KEY))
+
+    def air_matches(self, air_temperature, air_humidity):
+        """Conditions d'air : une valeur absente ne bloque pas la règle"""
+        if air_temperature is not None and (self.temperature is None or not self.temperature.contains(air_temperature)):
+            return False
+        if air_humidity is not None and (self.air_humidity is None or not self.air_humidity.contains(air_humidity)):
+            return False
+        return True
+
+
+class RuleSet:
+    """Règles compilées d'un scénario, indexées par humidité du sol
+
+    Les bornes de toutes les conditions de sol découpent l'axe en segments
+    (bornes elles-mêmes et intervalles ouverts entre elles). Chaque segment
+    garde la liste ordonnée des règles dont la condition de sol le contient.
+    """
+
+    def __init__(self, scenarios):
+        self.rules = [CompiledRule(scenario) for scenario in scenarios]
+        self._bounds = sorted({bound for rule in self.rules if rule.soil for bound in rule.soil.bounds()})
+        self._segments = [
+            [rule for rule in self.rules if rule.soil is not None and rule.soil.contains(value)]
+            for value in self._segment_values()
+        ]
+
+    def _segment_values(self):
+        """Une valeur représentative par segment, dans l'ordre de _segment_index"""
+        bounds = self._bounds
+        if not bounds:
+            return [0.0]
+        values = [bounds[0] - 1.0]
+        for i, bound in enumerate(bounds):
+            values.append(bound)
+            values.append((bound + bounds[i + 1]) / 2 if i + 1 < len(bounds) else bound + 1.0)
+        return values
+
+    def _segment_index(self, value):
+        i = bisect_left(self._bounds, value)
+        if i < len(self._bounds) and self._bounds[i] == value:
+            return 2 * i + 1
+        return 2 * i
+
+    def candidates(self, soil_moisture):
+        """Règles dont la condition de sol est satisfaite, dans l'ordre du scénario"""
+        if soil_moisture is None or soil_moisture != soil_moisture or not self.rules:  # absente ou NaN
+            return []
+        return self._segments[self._segment_index(soil_moisture)]
+
+    def match(self, soil_moisture, air_temperature=None, air_humidity=None):
+        """Règle retenue : la première dont toutes les conditions sont satisfaites,
+        à défaut la première dont la condition de sol (obligatoire) l'est
+
+        Returns:
+            tuple: (ligne du scénario ou None, True si les conditions d'air correspondent aussi)
+        """
+        candidates = self.candidates(soil_moisture)
+        for rule in candidates:
+            if rule.air_matches(air_temperature, air_humidity):
+                return rule.scenario, True
+        if candidates:
+            return candidates[0].scenario, False
+        return None, False
+
+
+class RuleCache:
+    """Règles compilées par plante, recompilées quand leur scénario change
+
+    La liste n'est resérialisée que lorsque la configuration a été rechargée
+    (nouvel objet) ; un rechargement sans modification garde les règles.
+    """
+
+    def __init__(self):
+        self._entries = {}  # plante -> (liste source, version, RuleSet)
+        self.compilations = 0
+
+    def get(self, plant, scenarios):
+        entry = self._entries.get(plant)
+        if entry is not None and entry[0] is scenarios:
+            return entry[2]
+        version = json.dumps(scenarios, sort_keys=True)
+        if entry is not None and entry[1] == version:
+            rules = entry[2]
+        else:
+            rules = RuleSet(scenarios)
+            self.compilations += 1
+        self._entries[plant] = (scenarios, version, rules)
+        return rules
+
+    def match(self, plant, scenarios, soil_moisture, air_temperature=None, air_humidity=None):
+        return self.get(plant, scenarios).match(soil_moisture, air_temperature, air_humidity)
+
+
+# Instance unique partagée par la boucle de contrôle et les routes des nœuds
+scenario_rules = RuleCache()
@@ -0,0 +1,238 @@
+"""
+Service d'acquisition des capteurs du hub
+Le service possède le DHT11 et l'ADS1115 : chaque capteur est échantillonné
+par son propre thread, à sa cadence et avec un délai de lecture borné, et les
+valeurs sont publiées dans des instantanés horodatés. La boucle de contrôle,
+les enregistrements et les routes Flask lisent le dernier instantané et son
+âge, sans jamais toucher au matériel. En simulation (temps virtuel), les
+lectures sont faites pas à pas par run_due(), sans thread
+"""
+import queue
+import datetime
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from clock import clock
+
+# Cadences de lecture (secondes) : le DHT11 ne supporte pas plus d'une lecture
+# toutes les ~2 s
+DHT_INTERVAL = 2.5
+SOIL_INTERVAL = 1.0
+# Durée maximale d'une lecture (secondes) : au-delà, elle est abandonnée
+DHT_TIMEOUT = 2.0
+SOIL_TIMEOUT = 0.5
+# Débitmètre : simple lecture du compteur d'impulsions
+FLOW_INTERVAL = 1.0
+FLOW_TIMEOUT = 0.5
+# Âge au-delà duquel une valeur n'est plus considérée comme actuelle
+SENSOR_MAX_AGE = 30
+
+
+class SensorSnapshot:
+    """Dernières valeurs connues des capteurs et l'heure de leur lecture
+
+    Instantané immuable : chaque nouvelle lecture publie un nouvel objet.
+    """
+
+    def __init__(self, values=None, read_at=None, sequence=0):
+        self.values = dict(values or {})    # métrique -> valeur
+        self.read_at = dict(read_at or {})  # métrique -> (datetime, clock.monotonic())
+        self.sequence = sequence
+
+    def age(self, metric):
+        """Secondes depuis la dernière lecture réussie de la métrique (None si jamais lue)"""
+        read_at = self.read_at.get(metric)
+        if read_at is None:
+            return None
+        return clock.monotonic() - read_at[1]
+
+    def timestamp(self, metric):
+        """Heure (datetime) de la dernière lecture réussie de la métrique"""
+        read_at = self.read_at.get(metric)
+        return read_at[0] if read_at else None
+
+    def get(self, metric, max_age=SENSOR_MAX_AGE):
+        """Valeur de la métrique, ou None si elle est absente ou trop ancienne"""
+        age = self.age(metric)
+        if age is None or (max_age is not None and age > max_age):
+            return None
+        return self.values.get(metric)
+
+    def readings(self, max_age=SENSOR_MAX_AGE):
+        """Dictionnaire des valeurs actuelles (None si absentes ou trop anciennes)"""
+        return {metric: self.get(metric, max_age) for metric in self.values}
+
+    def status(self, metric, max_age=SENSOR_MAX_AGE):
+        """'ok', 'stale' (dernière valeur trop ancienne) ou 'missing' (jamais lue)"""
+        age = self.age(metric)
+        if age is None:
+            return 'missing'
+        return 'stale' if max_age is not None and age > max_age else 'ok'
+
+    def to_message(self):
+        """Instantané pour un autre processus : le temps monotone est commun à
+        tous les processus de la machine, les âges restent justes"""
+        return {
+            'values': self.values,
+            'read_at': {metric: (read_at[0].isoformat(), read_at[1]) for metric, read_at in self.read_at.items()},
+            'sequence': self.sequence
+        }
+
+    @classmethod
+    def from_message(cls, message):
+        read_at = {metric: (datetime.datetime.fromisoformat(timestamp), monotonic)
+                   for metric, (timestamp, monotonic) in message['read_at'].items()}
+        return cls(message['values'], read_at, message['sequence'])
+
+
+class SensorService:
+    """Échantillonneurs concurrents des capteurs
+
+    Args:
+        readers: {nom: (fonction de lecture, intervalle, délai maximal)} en
+            secondes. Chaque fonction retourne un dictionnaire métrique -> valeur ;
+            une valeur None, une exception ou un délai dépassé signifie une
+            lecture ratée : l'ancienne valeur est conservée et vieillit.
+        metrics: métriques toujours présentes dans les instantanés
+    """
+
+    def __init__(self, readers, metrics=()):
+        self.readers = readers
+        self._snapshot = SensorSnapshot({metric: None for metric in metrics})
+        self._condition = threading.Condition()
+        self._threads = []
+        self._read_requests = {}  # nom -> file des lectures demandées à son thread de lecture
+        self._pending_reads = {}  # nom -> lecture (Future) abandonnée au-delà du délai
+        self._next_reads = {}     # mode pas à pas : nom -> échéance de la prochaine lecture
+        self._interval_scale = 1.0
+        self._running = False
+        self.failures = {name: 0 for name in readers}
+        self.timeouts = {name: 0 for name in readers}
+
+    def start(self):
+        if self._threads:
+            return
+        self._running = True
+        for name in self.readers:
+            # Un thread de lecture par capteur, pour toute la durée du service
+            requests = self._read_requests[name] = queue.Queue()
+            reader = threading.Thread(target=self._read_loop, args=(name, requests), name=f'sensor-read-{name}',
+                                      daemon=True)
+            thread = threading.Thread(target=self._sample, args=(name,), name=f'sensor-{name}', daemon=True)
+            self._threads.extend((reader, thread))
+            reader.start()
+            thread.start()
+
+    def start_stepping(self, interval_scale=1.0):
+        """Mode pas à pas (simulation en temps virtuel) : chaque capteur est lu
+        par run_due() à son échéance, intervalles multipliés par 'interval_scale'"""
+        self._running = True
+        self._interval_scale = interval_scale
+        now = clock.monotonic()
+        self._next_reads = {name: now for name in self.readers}
+
+    def next_deadline(self):
+        return min(self._next_reads.values(), default=None)
+
+    def run_due(self):
+        for name, next_read in list(self._next_reads.items()):
+            if clock.monotonic() < next_read or name not in self.readers:
+                continue
+            _, interval, timeout = self.readers[name]
+            started = clock.monotonic()
+            values = self._read(name)
+            # La latence simulée du capteur fait avancer l'horloge virtuelle
+            if clock.monotonic() - started > timeout:
+                self.timeouts[name] += 1
+                print(f"Lecture du capteur {name} sans réponse après {timeout} s, abandonnée")
+                values = {}
+            if values:
+                self._publish(values)
+            self._next_reads[name] = max(next_read + interval * self._interval_scale, clock.monotonic())
+
+    def stop(self):
+        self._running = False
+
+    def latest(self):
+        """Dernier instantané publié (lecture sans verrou ni accès matériel)"""
+        return self._snapshot
+
+    def wait_for_update(self, sequence, timeout=None):
+        """Attend un instantané plus récent que 'sequence' et le retourne"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._snapshot.sequence > sequence, timeout=timeout)
+            return self._snapshot
+
+    def mirror(self, snapshot):
+        """Publie un instantané reçu du service d'un autre processus (sans capteurs ici)"""
+        with self._condition:
+            self._snapshot = snapshot
+            self._condition.notify_all()
+
+    def stats(self):
+        return {'failures': dict(self.failures), 'timeouts': dict(self.timeouts)}
+
+    def _read(self, name):
+        reader = self.readers[name][0]
+        try:
+            values = reader()
+        except RuntimeError as e:
+            # Lecture ratée fréquente sur le DHT11 : on réessaiera au prochain tour
+            self.failures[name] += 1
+            print(f"Lecture du capteur {name} ratée : {e}")
+            return {}
+        except Exception as e:
+            self.failures[name] += 1
+            print(f"Erreur inattendue lors de la lecture du capteur {name} : {e}")
+            return {}
+        return {metric: value for metric, value in values.items() if value is not None}
+
+    def _read_loop(self, name, requests):
+        """Thread de lecture d'un capteur : exécute les lectures demandées une à une"""
+        while True:
+            future = requests.get()
+            future.set_result(self._read(name))
+
+    def _read_with_timeout(self, name, timeout):
+        """Lecture par le thread de lecture du capteur, abandonnée si elle dépasse 'timeout'
+
+        Une lecture abandonnée n'est pas relancée tant qu'elle n'est pas terminée
+        (jamais deux accès simultanés au même capteur) ; son résultat est ignoré.
+        """
+        pending = self._pending_reads.get(name)
+        if pending is not None:
+            if not pending.done():
+                return {}
+            del self._pending_reads[name]
+
+        future = Future()
+        self._read_requests[name].put(future)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self._pending_reads[name] = future
+            self.timeouts[name] += 1
+            print(f"Lecture du capteur {name} sans réponse après {timeout} s, abandonnée")
+            return {}
+
+    def _publish(self, values):
+        now = (clock.now(), clock.monotonic())
+        with self._condition:
+            current = self._snapshot
+            self._snapshot = SensorSnapshot(
+                {**current.values, **values},
+                {**current.read_at, **{metric: now for metric in values}},
+                current.sequence + 1
+            )
+            self._condition.notify_all()
+
+    def _sample(self, name):
+        """Boucle d'un capteur : une lecture par intervalle, sans dérive"""
+        _, interval, timeout = self.readers[name]
+        next_read = clock.monotonic()
+        while self._running:
+            values = self._read_with_timeout(name, timeout)
+            if values:
+                self._publish(values)
+            next_read = max(next_read + interval, clock.monotonic())
+            clock.sleep(next_read - clock.monotonic())
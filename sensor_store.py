@@ -0,0 +1,138 @@
+"""
+Point d'entrée unique pour les échantillons des capteurs
+Chaque mesure enregistrée (hub ou nœud) est répercutée dans les structures
+en mémoire (tampons circulaires 48h, fenêtres glissantes 24h, esquisses de
+quantiles, cubes heure de la semaine / jour de l'année) et la génération de la source est incrémentée pour invalider le
+cache des requêtes
+"""
+import datetime
+
+from log_reader import read_recent_rows
+from rolling_stats import sensor_windows
+from quantile_sketch import sensor_sketches, DAILY_RETENTION_DAYS
+from aggregate_cubes import sensor_cubes
+from ring_buffer import sensor_rings, HOT_WINDOW_HOURS
+from query_cache import bump_generation
+from clock import clock
+
+# Séries des capteurs : nom -> métriques dans l'ordre des colonnes du log
+SENSOR_SERIES = {
+    'temp_humidity': ('temperature', 'air_humidity'),
+    'soil_moisture': ('soil_moisture',),
+}
+
+# Sauvegarde des esquisses de quantiles et des cubes d'agrégats
+SKETCH_FILE = "sensor_sketches.json"
+CUBE_FILE = "sensor_cubes.json"
+SAVE_INTERVAL = 600  # secondes
+
+_last_save = clock.time()
+
+
+def record_row(source, series, timestamp, values):
+    """Enregistre une ligne de log en mémoire : tampon circulaire puis agrégats
+
+    Args:
+        series: clé de SENSOR_SERIES ('temp_humidity' ou 'soil_moisture')
+        values: valeurs dans l'ordre des métriques de la série (None si manquante)
+    """
+    values = [_to_float(value) for value in values]
+    sensor_rings.append(source, series, timestamp, values)
+    for metric, value in zip(SENSOR_SERIES[series], values):
+        if value is not None:
+            sensor_windows.record(source, metric, value, timestamp)
+            sensor_sketches.record(source, metric, value, timestamp)
+            sensor_cubes.record(source, metric, value, timestamp)
+    bump_generation(source)
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def save_aggregates(force=False):
+    """Sauvegarde périodique des esquisses et des cubes (au plus toutes les SAVE_INTERVAL secondes)"""
+    global _last_save
+    now = clock.time()
+    if not force and now - _last_save < SAVE_INTERVAL:
+        return
+    _last_save = now
+    for store, filename, label in ((sensor_sketches, SKETCH_FILE, "esquisses de quantiles"),
+                                   (sensor_cubes, CUBE_FILE, "cubes d'agrégats")):
+        try:
+            store.save(filename)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des {label} : {e}")
+
+
+def _replay_since(store, source, metric, default):
+    """Heure après laquelle les lignes d'un log manquent à 'store' (sa sauvegarde
+    s'arrête au dernier échantillon enregistré ; 'default' s'il n'en a aucun)"""
+    recorded_until = store.recorded_until(source, metric)
+    if recorded_until is None:
+        return default
+    return datetime.datetime.fromtimestamp(recorded_until)
+
+
+def warm_from_logs(log_sources):
+    """Reconstruit les structures en mémoire au démarrage, en lisant chaque log
+    une seule fois depuis la fin
+
+    - tampons circulaires : dernières HOT_WINDOW_HOURS heures ;
+    - fenêtres glissantes : dernières 24h ;
+    - esquisses et cubes : rechargés depuis leur sauvegarde et complétés par les
+      lignes postérieures au dernier échantillon qu'elle contient, par source et
+      par métrique ; sans sauvegarde, construits une fois depuis les logs.
+
+    Les tampons et les fenêtres ne sont complets que si les logs couvrent
+    HOT_WINDOW_HOURS heures (voir la rotation des logs dans app.py).
+
+    Args:
+        log_sources: [(source, série, fichier), ...]
+    """
+    now = clock.now()
+    ring_since = now - datetime.timedelta(hours=HOT_WINDOW_HOURS)
+    window_since = now - datetime.timedelta(seconds=sensor_windows.window_seconds)
+    sensor_sketches.load(SKETCH_FILE)
+    sensor_cubes.load(CUBE_FILE)
+
+    sensor_rings.clear()
+    sensor_windows.clear()
+    counts = {'ring': 0, 'window': 0, 'sketch': 0, 'cube': 0}
+    for source, series, filename in log_sources:
+        metrics = SENSOR_SERIES[series]
+        # Lignes déjà comptées dans la sauvegarde : jusqu'à son dernier échantillon
+        sketch_since = {metric: _replay_since(sensor_sketches, source, metric,
+                                              now - datetime.timedelta(days=DAILY_RETENTION_DAYS))
+                        for metric in metrics}
+        cube_since = {metric: _replay_since(sensor_cubes, source, metric, datetime.datetime.min)
+                      for metric in metrics}
+        since = min([ring_since] + list(sketch_since.values()) + list(cube_since.values()))
+        for timestamp, values in read_recent_rows(filename, since):
+            values = [_to_float(value) for value in values[:len(metrics)]]
+            if timestamp >= ring_since:
+                sensor_rings.append(source, series, timestamp, values)
+                counts['ring'] += 1
+            for metric, value in zip(metrics, values):
+                if value is None:
+                    continue
+                if timestamp >= window_since:
+                    sensor_windows.record(source, metric, value, timestamp)
+                if timestamp > sketch_since[metric]:
+                    sensor_sketches.record(source, metric, value, timestamp)
+                    counts['sketch'] += 1
+                if timestamp > cube_since[metric]:
+                    sensor_cubes.record(source, metric, value, timestamp)
+                    counts['cube'] += 1
+            counts['window'] += timestamp >= window_since
+        bump_generation(source)
+
+    sensor_rings.mark_covered(ring_since)
+    save_aggregates(force=True)
+    print(f"Données en mémoire reconstruites : {counts['ring']} lignes (tampons {HOT_WINDOW_HOURS}h), "
+          f"{counts['window']} lignes (fenêtres 24h), {counts['sketch']} valeurs (esquisses), "
+          f"{counts['cube']} valeurs (cubes)")
@@ -0,0 +1,128 @@
+"""
+Sondes d'humidité du sol multiples sur un ou plusieurs ADS1115
+Chaque entrée (P0 à P3, à une adresse I2C donnée) correspond à une zone avec
+sa propre série de mesures et son propre scénario. Les sondes sont lues en
+tourniquet, regroupées par convertisseur pour limiter les échanges sur le bus
+"""
+import re
+
+from adc_sampling import BurstSampler
+
+# Adresse I2C par défaut de l'ADS1115 (ADDR relié à GND)
+DEFAULT_ADDRESS = 0x48
+ADS1115_ADDRESSES = (0x48, 0x49, 0x4A, 0x4B)
+# Zone de la sonde historique (P0 à l'adresse par défaut) : logs du hub
+PRIMARY_ZONE = 'hub'
+
+_ZONE_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def probe_metric(zone):
+    """Nom de la métrique d'une zone dans les instantanés du service d'acquisition"""
+    return 'soil_moisture' if zone == PRIMARY_ZONE else f'soil_moisture:{zone}'
+
+
+def probe_settings(config):
+    """Liste validée des sondes (clé "soil_probes" de data.json)
+
+    Chaque sonde : {"zone": ..., "address": 72 ou "0x48", "channel": 0-3,
+    "scenario": nom du scénario (scénario courant par défaut)}. Sans
+    configuration, seule la sonde P0 de l'adresse par défaut est lue.
+    """
+    probes = []
+    seen = set()
+    for entry in (config or {}).get('soil_probes') or [{'address': DEFAULT_ADDRESS, 'channel': 0}]:
+        try:
+            address = entry.get('address', DEFAULT_ADDRESS)
+            address = int(address, 0) if isinstance(address, str) else int(address)
+            channel = int(entry.get('channel', 0))
+        except (TypeError, ValueError):
+            print(f"Sonde d'humidité ignorée (adresse ou entrée invalide) : {entry}")
+            continue
+        if address not in ADS1115_ADDRESSES or channel not in range(4):
+            print(f"Sonde d'humidité ignorée (adresse 0x{address:02x}, entrée P{channel}) : hors limites")
+            continue
+        if (address, channel) == (DEFAULT_ADDRESS, 0):
+            zone = PRIMARY_ZONE
+        else:
+            zone = str(entry.get('zone') or f"hub_{address:02x}_p{channel}")
+        if not _ZONE_NAME.match(zone) or zone in seen or (zone == PRIMARY_ZONE and (address, channel) != (DEFAULT_ADDRESS, 0)):
+            print(f"Sonde d'humidité ignorée (nom de zone invalide ou en double) : {zone}")
+            continue
+        seen.add(zone)
+        probes.append({
+            'zone': zone,
+            'address': address,
+            'channel': channel,
+            'scenario': entry.get('scenario')
+        })
+    return probes
+
+
+class SoilProbeScanner:
+    """Lecture en tourniquet de toutes les sondes configurées
+
+    Les convertisseurs et entrées sont créés par les fabriques fournies par
+    l'application (aucun import matériel ici). Une lecture parcourt les
+    sondes groupées par adresse : une rafale par sonde, convertisseur après
+    convertisseur.
+
+    Args:
+        make_ads: fonction adresse -> ADS1115
+        make_channel: fonction (ADS1115, numéro d'entrée) -> AnalogIn
+        existing: {(adresse, entrée): (ads, canal)} déjà créés par l'application
+    """
+
+    def __init__(self, probes, sampling, make_ads, make_channel, existing=None):
+        self.probes = sorted(probes, key=lambda probe: (probe['address'], probe['channel']))
+        self._converters = {}
+        self.samplers = {}
+        for (address, channel), (ads, analog_in) in (existing or {}).items():
+            self._converters[address] = ads
+            self.samplers[(address, channel)] = BurstSampler(ads, analog_in, sampling)
+        for probe in self.probes:
+            key = (probe['address'], probe['channel'])
+            if key in self.samplers:
+                continue
+            try:
+                ads = self._converters.get(probe['address'])
+                if ads is None:
+                    ads = self._converters[probe['address']] = make_ads(probe['address'])
+                self.samplers[key] = BurstSampler(ads, make_channel(ads, probe['channel']), sampling)
+            except Exception as e:
+                print(f"ADS1115 0x{probe['address']:02x} indisponible, zone {probe['zone']} ignorée : {e}")
+        self.probes = [probe for probe in self.probes if (probe['address'], probe['channel']) in self.samplers]
+
+    def zones(self):
+        return [probe['zone'] for probe in self.probes]
+
+    def configure(self, modes):
+        configured = set()
+        for (address, _), sampler in self.samplers.items():
+            if address not in configured:
+                sampler.configure(modes)
+                configured.add(address)
+
+    def scan(self, to_value):
+        """Lit toutes les sondes une fois
+
+        Args:
+            to_value: fonction tension -> valeur publiée (pourcentage d'humidité)
+
+        Returns:
+            dict: {métrique: valeur, métrique_noise: bruit} pour chaque zone lue
+        """
+        values = {}
+        for probe in self.probes:
+            metric = probe_metric(probe['zone'])
+            try:
+                voltage, noise = self.samplers[(probe['address'], probe['channel'])].read()
+            except Exception as e:
+                print(f"Erreur lors de la lecture de la sonde {probe['zone']} : {e}")
+                continue
+            if voltage is None:
+                continue
+            moisture, noise = to_value(voltage, noise)
+            values[metric] = moisture
+            values[f'{metric}_noise'] = noise
+        return values
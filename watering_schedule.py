@@ -0,0 +1,240 @@
+"""
+Index des arrosages programmés
+Les planifications ("scheduled_waterings" de data.json) sont compilées une
+fois par version de la configuration en un tas trié des prochains
+déclenchements : un tour de contrôle ne consulte que le sommet du tas. Les
+créneaux dépassés pendant un blocage de la boucle sont rattrapés (dans une
+limite de retard) ou signalés comme manqués, jamais perdus en silence.
+
+Une planification est soit horaire :
+    {"time": "07:30", "days": ["monday", "thursday"], "duration": 2, "enabled": true}
+soit une expression cron à 5 champs (minute heure jour mois jour-de-semaine) :
+    {"cron": "*/30 6-9 * * mon-fri", "duration": 1}
+"""
+import heapq
+import json
+import itertools
+import datetime
+from bisect import bisect_left
+from collections import deque
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+# Noms cron des jours (0 = dimanche) et des mois
+CRON_DAY_NAMES = {'sun': 0, 'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6}
+CRON_MONTH_NAMES = {name: i + 1 for i, name in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'))}
+
+# Retard maximal (minutes) pour rattraper un créneau dépassé, surchargeable
+# par la clé "catch_up" de chaque planification
+MISSED_SLOT_CATCH_UP = 30
+# Délai avant de représenter un créneau qui n'a pas pu démarrer (pompe occupée)
+RETRY_SECONDS = 30
+# Horizon de recherche du prochain créneau (une expression comme "0 0 29 2 *"
+# ne se déclenche que les années bissextiles)
+MAX_LOOKAHEAD_DAYS = 366 * 8
+
+
+def _parse_cron_field(field, minimum, maximum, names=None):
+    """Ensemble des valeurs d'un champ cron : *, listes, plages et pas"""
+    values = set()
+    for part in field.lower().split(','):
+        part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if part == '*':
+            start, end = minimum, maximum
+        else:
+            start, _, end = part.partition('-')
+            start = names[start] if names and start in names else int(start)
+            end = (names[end] if names and end in names else int(end)) if end else (maximum if step > 1 else start)
+        if step < 1 or start < minimum or end > maximum or start > end:
+            raise ValueError(f"champ cron hors limites : {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Expression cron à 5 champs, en heure locale"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"expression cron invalide (5 champs attendus) : {expression}")
+        self.expression = expression
+        self.minutes = sorted(_parse_cron_field(fields[0], 0, 59))
+        self.hours = sorted(_parse_cron_field(fields[1], 0, 23))
+        self.days = _parse_cron_field(fields[2], 1, 31)
+        self.months = _parse_cron_field(fields[3], 1, 12, CRON_MONTH_NAMES)
+        # 7 est aussi accepté pour dimanche
+        self.weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7, CRON_DAY_NAMES)}
+        # Comme cron : si le jour du mois et le jour de semaine sont restreints, l'un OU l'autre suffit
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        in_month = day.day in self.days
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, after):
+        """Premier créneau strictement postérieur à 'after' (None si aucun)"""
+        start = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = start.date()
+        for _ in range(MAX_LOOKAHEAD_DAYS):
+            if self._day_matches(day):
+                first_day = day == start.date()
+                for hour in self.hours[bisect_left(self.hours, start.hour) if first_day else 0:]:
+                    minute_index = bisect_left(self.minutes, start.minute) if first_day and hour == start.hour else 0
+                    if minute_index < len(self.minutes):
+                        return datetime.datetime.combine(day, datetime.time(hour, self.minutes[minute_index]))
+            day += datetime.timedelta(days=1)
+        return None
+
+
+def compile_schedule(schedule):
+    """Expression cron d'une planification (horaire ou cron), None si désactivée ou vide"""
+    if not schedule.get('enabled', True):
+        return None
+    if schedule.get('cron'):
+        return CronExpression(schedule['cron'])
+    days = schedule.get('days', [])
+    if not days:
+        return None
+    hour, minute = map(int, schedule.get('time', '').split(':'))
+    weekdays = ','.join(str((WEEKDAYS.index(day) + 1) % 7) for day in days)
+    return CronExpression(f"{minute} {hour} * * {weekdays}")
+
+
+class ScheduledFiring:
+    """Créneau arrivé à échéance : planification, heure prévue et retard"""
+
+    def __init__(self, index, schedule, fire_time, now, skipped=0):
+        self.index = index
+        self.schedule = schedule
+        self.fire_time = fire_time
+        self.lateness = (now - fire_time).total_seconds()
+        self.skipped = skipped  # créneaux plus anciens de la même planification regroupés dans celui-ci
+        catch_up = schedule.get('catch_up', MISSED_SLOT_CATCH_UP)
+        self.missed = self.lateness > catch_up * 60
+
+    def to_dict(self):
+        return {
+            'schedule': self.index,
+            'time': self.fire_time.strftime("%Y-%m-%d %H:%M"),
+            'lateness_seconds': round(self.lateness, 1),
+            'skipped': self.skipped
+        }
+
+
+class ScheduleIndex:
+    """Tas des prochains déclenchements, reconstruit quand la configuration change
+
+    Le tas contient (heure de présentation, ordre, planification, heure prévue) :
+    un créneau reporté garde son heure prévue (pour le retard) mais n'est
+    représenté qu'après RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._expressions = []   # planification -> CronExpression (ou None)
+        self._schedules = []
+        self._source = None      # liste de la configuration déjà indexée
+        self._version = None
+        self._counter = itertools.count()
+        self.last_checked = None
+        self.missed = deque(maxlen=50)  # créneaux manqués récents (retard au-delà du rattrapage)
+
+    def update(self, schedules, now):
+        """Recompile l'index si les planifications ont changé
+
+        La liste n'est resérialisée que lorsque la configuration a été rechargée.
+        Les créneaux sont recalculés depuis la dernière vérification : un créneau
+        tombé entre celle-ci et le rechargement n'est pas perdu.
+        """
+        if schedules is self._source:
+            return False
+        self._source = schedules
+        version = json.dumps(schedules, sort_keys=True)
+        if version == self._version:
+            return False
+        self._version = version
+        self._schedules = list(schedules)
+        self._expressions = []
+        for schedule in self._schedules:
+            try:
+                self._expressions.append(compile_schedule(schedule))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"Planification d'arrosage ignorée ({schedule}) : {e}")
+                self._expressions.append(None)
+
+        # Au premier chargement, la minute en cours compte encore (comme l'ancienne fenêtre d'une minute)
+        since = self.last_checked or now - datetime.timedelta(minutes=1)
+        self._heap = []
+        for index, expression in enumerate(self._expressions):
+            if expression is not None:
+                self._push_next(index, since)
+        print(f"Index des arrosages programmés : {len(self._heap)} planification(s) active(s)")
+        return True
+
+    def _push_next(self, index, after):
+        fire_time = self._expressions[index].next_after(after)
+        if fire_time is not None:
+            heapq.heappush(self._heap, (fire_time, next(self._counter), index, fire_time))
+
+    def next_fire(self):
+        """Heure du prochain créneau à présenter (None si aucun)"""
+        return self._heap[0][0] if self._heap else None
+
+    def due(self, now):
+        """Créneaux arrivés à échéance, un par planification
+
+        Si la boucle a été bloquée au point de dépasser plusieurs créneaux d'une
+        même planification, seul le plus récent est présenté (les autres sont
+        comptés dans 'skipped'). Les créneaux trop en retard sont marqués manqués.
+        """
+        firings = {}
+        while self._heap and self._heap[0][0] <= now:
+            present_at, _, index, fire_time = heapq.heappop(self._heap)
+            skipped = 0
+            if present_at == fire_time:
+                # Créneau régulier : avancer jusqu'au dernier créneau dépassé et indexer le suivant
+                expression = self._expressions[index]
+                next_time = expression.next_after(fire_time)
+                while next_time is not None and next_time <= now:
+                    fire_time, next_time = next_time, expression.next_after(next_time)
+                    skipped += 1
+                if next_time is not None:
+                    heapq.heappush(self._heap, (next_time, next(self._counter), index, next_time))
+            current = firings.get(index)
+            if current is not None:
+                # Créneau reporté et créneau régulier de la même planification : garder le plus récent
+                skipped += current.skipped + 1
+                fire_time = max(fire_time, current.fire_time)
+            firings[index] = ScheduledFiring(index, self._schedules[index], fire_time, now, skipped)
+        self.last_checked = now
+        for firing in firings.values():
+            if firing.missed:
+                self.missed.append(firing.to_dict())
+        return sorted(firings.values(), key=lambda firing: firing.fire_time)
+
+    def retry(self, firing, now):
+        """Représente un créneau qui n'a pas pu démarrer, dans la limite du rattrapage"""
+        present_at = now + datetime.timedelta(seconds=RETRY_SECONDS)
+        catch_up = firing.schedule.get('catch_up', MISSED_SLOT_CATCH_UP)
+        if (present_at - firing.fire_time).total_seconds() > catch_up * 60:
+            self.missed.append(firing.to_dict())
+            return False
+        heapq.heappush(self._heap, (present_at, next(self._counter), firing.index, firing.fire_time))
+        return True
+
+    def upcoming(self, limit=10):
+        """Prochains créneaux réguliers (pour l'affichage)"""
+        entries = sorted(entry for entry in self._heap if entry[0] == entry[3])[:limit]
+        return [{
+            'schedule': index,
+            'time': fire_time.strftime("%Y-%m-%d %H:%M"),
+            'duration': self._schedules[index].get('duration', 1)
+        } for _, _, index, fire_time in entries]
@@ -0,0 +1,197 @@
+"""
+Compteurs d'arrosage persistants
+Totaux, dernier arrosage et cumuls par jour (nombre, durée, volume d'eau),
+mis à jour à chaque arrosage et
+sauvegardés dans un petit fichier de reprise. Au redémarrage, seules les lignes
+du log écrites après la dernière sauvegarde sont relues
+"""
+import os
+import json
+import datetime
+import threading
+
+from log_reader import parse_log_timestamp
+from flow_meter import ESTIMATED_FLOW_RATE
+from clock import clock
+
+# Nombre de jours conservés dans les cumuls journaliers
+DAILY_RETENTION_DAYS = 400
+
+
+class WateringCounters:
+    """Compteurs cumulés des arrosages du hub"""
+
+    def __init__(self, checkpoint_file, log_file):
+        self.checkpoint_file = checkpoint_file
+        self.log_file = log_file
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.total_waterings = 0
+        self.total_duration = 0.0
+        self.total_volume = 0.0     # litres : mesurés par le débitmètre, sinon estimés
+        self.metered_waterings = 0  # arrosages dont le volume a été mesuré
+        self.last_watering = None   # timestamp tel qu'écrit dans le log
+        self.daily = {}             # 'YYYY-MM-DD' -> {'count': n, 'duration': secondes, 'volume': litres}
+        self.log_offset = 0         # octets du log déjà comptabilisés
+        self._last_watering_time = None
+
+    def _add(self, timestamp_str, duration, volume=None):
+        timestamp = parse_log_timestamp(timestamp_str)
+        if volume is None:
+            volume = duration * ESTIMATED_FLOW_RATE / 60
+        else:
+            self.metered_waterings += 1
+        self.total_waterings += 1
+        self.total_duration += duration
+        self.total_volume += volume
+        if timestamp is None:
+            return
+        day = self.daily.setdefault(timestamp.date().isoformat(), {'count': 0, 'duration': 0.0, 'volume': 0.0})
+        day['count'] += 1
+        day['duration'] += duration
+        day['volume'] = day.get('volume', 0.0) + volume
+        if self._last_watering_time is None or timestamp > self._last_watering_time:
+            self._last_watering_time = timestamp
+            self.last_watering = timestamp_str
+
+    def _prune(self):
+        cutoff = (clock.today() - datetime.timedelta(days=DAILY_RETENTION_DAYS)).isoformat()
+        for day in [d for d in self.daily if d < cutoff]:
+            del self.daily[day]
+
+    def catch_up(self):
+        """Comptabilise les arrosages écrits dans le log depuis le dernier appel
+        (volume en litres si mesuré, estimé sinon)
+
+        Lit le log à partir de log_offset : un arrosage dont la notification a
+        été perdue est compté au suivant, jamais sauté ni compté deux fois.
+
+        Returns:
+            int: nombre d'arrosages ajoutés
+        """
+        with self._lock:
+            added = self._read_log_tail()
+            if added:
+                self._save()
+            return added
+
+    def last_watering_time(self):
+        with self._lock:
+            return self._last_watering_time
+
+    def snapshot(self):
+        """Retourne les compteurs sous forme de dictionnaire"""
+        today = clock.today().isoformat()
+        with self._lock:
+            return {
+                'total_waterings': self.total_waterings,
+                'total_duration': self.total_duration,
+                'total_volume': self.total_volume,
+                'metered_waterings': self.metered_waterings,
+                'today_waterings': self.daily.get(today, {}).get('count', 0),
+                'today_duration': self.daily.get(today, {}).get('duration', 0.0),
+                'today_volume': self._day_volume(self.daily.get(today, {})),
+                'last_watering': self.last_watering
+            }
+
+    @staticmethod
+    def _day_volume(day):
+        # Cumuls sauvegardés avant le suivi des volumes : estimés depuis la durée
+        if 'volume' in day:
+            return day['volume']
+        return day.get('duration', 0.0) * ESTIMATED_FLOW_RATE / 60
+
+    def daily_series(self, days=30):
+        """Cumuls des 'days' derniers jours, du plus ancien au plus récent"""
+        today = clock.today()
+        series = []
+        with self._lock:
+            for day in ((today - datetime.timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)):
+                totals = self.daily.get(day, {'count': 0, 'duration': 0.0})
+                series.append({'date': day, 'count': totals['count'], 'duration': totals['duration'],
+                               'volume': round(self._day_volume(totals), 3)})
+        return series
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.log_file)
+        except OSError:
+            return 0
+
+    def _save(self):
+        self._prune()
+        data = {
+            'total_waterings': self.total_waterings,
+            'total_duration': self.total_duration,
+            'total_volume': self.total_volume,
+            'metered_waterings': self.metered_waterings,
+            'last_watering': self.last_watering,
+            'daily': self.daily,
+            'log_offset': self.log_offset
+        }
+        temp_filename = self.checkpoint_file + '.tmp'
+        try:
+            with open(temp_filename, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_filename, self.checkpoint_file)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des compteurs d'arrosage : {e}")
+
+    def load(self):
+        """Recharge la sauvegarde puis relit la fin du log non comptabilisée
+
+        Sans sauvegarde exploitable, le log est parcouru une seule fois.
+        """
+        with self._lock:
+            try:
+                with open(self.checkpoint_file, 'r') as f:
+                    data = json.load(f)
+                self.total_waterings = data['total_waterings']
+                self.total_duration = data['total_duration']
+                self.total_volume = data.get('total_volume', self.total_duration * ESTIMATED_FLOW_RATE / 60)
+                self.metered_waterings = data.get('metered_waterings', 0)
+                self.last_watering = data.get('last_watering')
+                self._last_watering_time = parse_log_timestamp(self.last_watering) if self.last_watering else None
+                self.daily = data.get('daily', {})
+                self.log_offset = data.get('log_offset', 0)
+            except FileNotFoundError:
+                self.log_offset = 0
+            except (ValueError, KeyError) as e:
+                print(f"Sauvegarde des compteurs d'arrosage illisible, recalcul complet : {e}")
+                self._reset()
+
+            added = self._read_log_tail()
+            self._save()
+            return added
+
+    def _read_log_tail(self):
+        """Ajoute les lignes complètes du log après log_offset (verrou tenu)"""
+        if self.log_offset > self._log_size():
+            # Log remplacé ou tronqué (rotation) : on ne peut pas savoir quelles
+            # lignes sont déjà comptées, on repart de la fin pour ne rien compter deux fois
+            print("Log d'arrosage plus court que la sauvegarde, compteurs conservés tels quels")
+            self.log_offset = self._log_size()
+
+        added = 0
+        try:
+            with open(self.log_file, 'rb') as f:
+                f.seek(self.log_offset)
+                for raw_line in f:
+                    if not raw_line.endswith(b'\n'):
+                        break  # Ligne en cours d'écriture
+                    self.log_offset += len(raw_line)
+                    parts = raw_line.decode('utf-8', errors='replace').strip().split(", ")
+                    if len(parts) < 2:
+                        continue
+                    try:
+                        # Troisième colonne facultative : volume mesuré (L)
+                        volume = float(parts[2]) if len(parts) > 2 else None
+                        self._add(parts[0], float(parts[1]), volume)
+                        added += 1
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return added
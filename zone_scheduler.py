@@ -0,0 +1,193 @@
+"""
+Planificateur des arrosages multi-zones
+Le hub et les nœuds ESP32 partagent la même alimentation en eau : chaque
+demande d'arrosage (zone, durée, débit, priorité) reçoit un créneau tel que
+le nombre de pompes simultanées et le débit total restent sous les plafonds
+configurés. Les demandes en attente sont replanifiées par priorité à chaque
+changement ; une zone qui n'a pas encore démarré peut être devancée par une
+zone plus prioritaire, jamais une zone en cours d'arrosage.
+"""
+import datetime
+import threading
+
+from clock import clock
+
+# Réglages par défaut, surchargés par la clé "zone_scheduler" de data.json
+DEFAULT_ZONE_SCHEDULER = {
+    'max_concurrent': 2,     # pompes simultanées
+    'flow_budget': None,     # débit total maximal (L/min), None = sans limite
+    'default_flow': 2.0,     # débit supposé d'une zone sans réglage (L/min)
+    'zones': {}              # zone -> {"priority": n (plus grand = prioritaire), "flow": L/min}
+}
+# Une demande en attente non renouvelée pendant ce délai est abandonnée
+# (nœud hors ligne ou besoin disparu)
+REQUEST_TTL = datetime.timedelta(minutes=15)
+
+
+class Slot:
+    """Créneau attribué à une zone"""
+
+    def __init__(self, zone, start, end, granted, started=False):
+        self.zone = zone
+        self.start = start
+        self.end = end
+        self.granted = granted   # l'arrosage peut commencer maintenant
+        self.started = started   # la zone arrosait déjà avant cette demande
+
+    def to_dict(self, now=None):
+        now = now or clock.now()
+        return {
+            'zone': self.zone,
+            'start_at': self.start.strftime("%Y-%m-%d %H:%M:%S"),
+            'end_at': self.end.strftime("%Y-%m-%d %H:%M:%S"),
+            'start_in': max(0, round((self.start - now).total_seconds())),
+            'granted': self.granted
+        }
+
+
+class _Request:
+    def __init__(self, zone, duration, flow, priority, requested_at):
+        self.zone = zone
+        self.duration = duration   # timedelta
+        self.flow = flow
+        self.priority = priority
+        self.requested_at = requested_at
+        self.refreshed_at = requested_at
+        self.start = None          # début effectif (zone en cours d'arrosage)
+
+
+class ZoneScheduler:
+    """File des demandes d'arrosage et zones en cours, sous plafonds de
+    simultanéité et de débit (appelé depuis la boucle de contrôle et les routes)"""
+
+    def __init__(self, settings=None):
+        self._lock = threading.Lock()
+        self._active = {}   # zone -> _Request démarrée
+        self._queued = {}   # zone -> _Request en attente
+        self.settings = dict(DEFAULT_ZONE_SCHEDULER)
+        self.configure(settings)
+
+    def configure(self, settings):
+        """Applique les réglages (clé "zone_scheduler" de data.json)"""
+        merged = dict(DEFAULT_ZONE_SCHEDULER)
+        merged.update(settings or {})
+        try:
+            merged['max_concurrent'] = max(1, int(merged['max_concurrent']))
+            merged['flow_budget'] = float(merged['flow_budget']) if merged['flow_budget'] else None
+            merged['default_flow'] = float(merged['default_flow'])
+        except (TypeError, ValueError) as e:
+            print(f"Réglages du planificateur de zones invalides, valeurs par défaut : {e}")
+            merged = dict(DEFAULT_ZONE_SCHEDULER)
+        self.settings = merged
+
+    def _zone_setting(self, zone, key, default):
+        value = (self.settings.get('zones') or {}).get(zone, {}).get(key)
+        return default if value is None else value
+
+    def _expire(self, now):
+        for zone in [zone for zone, request in self._active.items() if request.start + request.duration <= now]:
+            del self._active[zone]
+        for zone in [zone for zone, request in self._queued.items() if now - request.refreshed_at > REQUEST_TTL]:
+            print(f"Demande d'arrosage de la zone {zone} abandonnée (non renouvelée)")
+            del self._queued[zone]
+
+    def _fits(self, timeline, start, end, flow):
+        """Vrai si [start, end) respecte les plafonds avec les réservations 'timeline'"""
+        overlapping = [entry for entry in timeline if entry[0] < end and entry[1] > start]
+        # La charge ne peut augmenter qu'au début du créneau ou au début d'une autre réservation
+        for point in [start] + [entry[0] for entry in overlapping if entry[0] > start]:
+            running = [entry for entry in overlapping if entry[0] <= point < entry[1]]
+            if len(running) + 1 > self.settings['max_concurrent']:
+                return False
+            budget = self.settings['flow_budget']
+            # Une zone seule peut dépasser le budget : elle passe quand tout est libre
+            if budget is not None and running and sum(entry[2] for entry in running) + flow > budget:
+                return False
+        return True
+
+    def _plan(self, now):
+        """Début prévu de chaque demande en attente, par priorité puis ancienneté"""
+        timeline = [(request.start, request.start + request.duration, request.flow)
+                    for request in self._active.values()]
+        plan = {}
+        for request in sorted(self._queued.values(), key=lambda r: (-r.priority, r.requested_at)):
+            candidates = sorted({now} | {entry[1] for entry in timeline if entry[1] > now})
+            start = next((t for t in candidates if self._fits(timeline, t, t + request.duration, request.flow)),
+                         candidates[-1])
+            plan[request.zone] = start
+            timeline.append((start, start + request.duration, request.flow))
+        return plan
+
+    def request(self, zone, duration_minutes, priority=None, flow=None, now=None):
+        """Demande (ou renouvelle) un arrosage et retourne son créneau
+
+        Si le créneau commence maintenant, la zone passe en cours d'arrosage
+        (Slot.granted) : l'appelant démarre sa pompe, ou appelle release() s'il
+        ne peut pas.
+        """
+        now = now or clock.now()
+        with self._lock:
+            self._expire(now)
+            active = self._active.get(zone)
+            if active is not None:
+                return Slot(zone, active.start, active.start + active.duration, False, started=True)
+            duration = datetime.timedelta(minutes=float(duration_minutes))
+            if priority is None:
+                priority = self._zone_setting(zone, 'priority', 0)
+            if flow is None:
+                flow = float(self._zone_setting(zone, 'flow', self.settings['default_flow']))
+            request = self._queued.get(zone)
+            if request is None:
+                request = self._queued[zone] = _Request(zone, duration, flow, priority, now)
+            else:
+                request.duration, request.flow, request.priority = duration, flow, priority
+                request.refreshed_at = now
+            start = self._plan(now)[zone]
+            if start <= now:
+                del self._queued[zone]
+                request.start = now
+                self._active[zone] = request
+                return Slot(zone, now, now + duration, True)
+            return Slot(zone, start, start + duration, False)
+
+    def occupy(self, zone, duration_minutes, flow=None, now=None):
+        """Zone démarrée hors planification (commande manuelle) : comptée dans les plafonds"""
+        now = now or clock.now()
+        with self._lock:
+            self._queued.pop(zone, None)
+            if flow is None:
+                flow = float(self._zone_setting(zone, 'flow', self.settings['default_flow']))
+            request = _Request(zone, datetime.timedelta(minutes=float(duration_minutes)), flow, 0, now)
+            request.start = now
+            self._active[zone] = request
+
+    def release(self, zone):
+        """La zone a fini d'arroser (ou n'a pas pu démarrer)"""
+        with self._lock:
+            self._active.pop(zone, None)
+            self._queued.pop(zone, None)
+
+    def cancel(self, zone):
+        """Retire une demande en attente (le besoin a disparu)"""
+        with self._lock:
+            self._queued.pop(zone, None)
+
+    def status(self, now=None):
+        now = now or clock.now()
+        with self._lock:
+            self._expire(now)
+            plan = self._plan(now)
+            active = [Slot(zone, request.start, request.start + request.duration, True, started=True).to_dict(now)
+                      for zone, request in self._active.items()]
+            queued = [Slot(zone, start, start + self._queued[zone].duration, False).to_dict(now)
+                      for zone, start in sorted(plan.items(), key=lambda item: item[1])]
+        return {
+            'max_concurrent': self.settings['max_concurrent'],
+            'flow_budget': self.settings['flow_budget'],
+            'active': active,
+            'queued': queued
+        }
+
+
+# Instance unique partagée par la boucle de contrôle et les routes des nœuds
+zone_scheduler = ZoneScheduler()